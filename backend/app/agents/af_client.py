@@ -1,37 +1,24 @@
-import os
-from pathlib import Path
 from functools import lru_cache
 
+from app.agents.agent_pool import AgentProfile, Deployment
+from app.core.settings import Settings, get_settings, on_reload
 
-def _get_required_env(name: str) -> str:
-    value = os.getenv(name)
-    if value is None or not value.strip():
-        raise RuntimeError(f"Missing required env var: {name}")
-    return value.strip()
 
+def _required(value: str, name: str) -> str:
+    if not value:
+        raise RuntimeError(f"Missing required env var: {name}")
+    return value
 
-@lru_cache(maxsize=1)
-def create_azure_responses_agent():
-    # Load local env files (dev convenience). Priority:
-    # 1) config/azure_openai.env
-    # 2) .env
-    try:
-        from dotenv import load_dotenv  # type: ignore
-
-        project_root = Path(__file__).resolve().parents[3]
-        load_dotenv(dotenv_path=project_root / "config" / "azure_openai.env", override=True)
-        load_dotenv(dotenv_path=project_root / ".env", override=True)
-    except Exception:
-        pass
 
+@lru_cache(maxsize=32)
+def _azure_agent(deployment: Deployment, agent_name: str, instructions: str, tenant_id: str):
     # Import lazily so the main FastAPI app can still start without agent deps installed.
     from agent_framework.azure import AzureOpenAIResponsesClient  # type: ignore
 
-    endpoint = _get_required_env("AZURE_OPENAI_ENDPOINT")
-    deployment_name = _get_required_env("AZURE_OPENAI_RESPONSES_DEPLOYMENT_NAME")
-    api_version = os.getenv("AZURE_OPENAI_API_VERSION")
-    tenant_id = os.getenv("AZURE_TENANT_ID", "").strip()
-    api_key = os.getenv("AZURE_OPENAI_API_KEY", "").strip()
+    endpoint = _required(deployment.endpoint, "AZURE_OPENAI_ENDPOINT")
+    deployment_name = _required(deployment.deployment_name, "AZURE_OPENAI_RESPONSES_DEPLOYMENT_NAME")
+    api_version = deployment.api_version
+    api_key = deployment.api_key
 
     kwargs: dict = {
         "endpoint": endpoint,
@@ -40,41 +27,81 @@ def create_azure_responses_agent():
     if api_version:
         kwargs["api_version"] = api_version
 
+    # Auth is passed to each client explicitly; the process environment is left alone, since
+    # other deployments (and the settings snapshot) may still rely on AZURE_OPENAI_API_KEY.
     if api_key:
-        # Key auth
-        # Keep AZURE_OPENAI_API_KEY as-is, and avoid inheriting other OpenAI key env vars.
-        os.environ.pop("OPENAI_API_KEY", None)
         kwargs["api_key"] = api_key
     else:
         # Entra ID auth via Azure Identity (recommended for local dev + production).
-        # Some SDK layers auto-detect API keys from env vars even if a credential is supplied.
-        # Since we're using Entra ID in this branch, explicitly remove them.
-        os.environ.pop("AZURE_OPENAI_API_KEY", None)
-        os.environ.pop("OPENAI_API_KEY", None)
-
-        # NOTE: Some Azure OpenAI resources disable key auth; this avoids that issue.
-        try:
-            from azure.identity import DefaultAzureCredential  # type: ignore
-        except Exception as exc:
-            raise RuntimeError(
-                "Entra ID auth requires azure-identity. Install with: "
-                "py -m pip install -r backend\\requirements-agent.txt"
-            ) from exc
-
-        if tenant_id:
-            # Prefer Azure CLI token from the specified tenant (prevents tenant mismatch).
-            from azure.identity import AzureCliCredential  # type: ignore
-
-            kwargs["credential"] = AzureCliCredential(tenant_id=tenant_id)
-        else:
-            kwargs["credential"] = DefaultAzureCredential(exclude_interactive_browser_credential=False)
+        # A token provider takes precedence over any key the SDK picks up from the environment.
+        # The credential (and its token cache) is shared with the knowledge embedding client.
+        from app.core.credentials import COGNITIVE_SERVICES_SCOPE, get_shared_credential
+
+        credential = get_shared_credential(tenant_id)
+
+        def _token_provider() -> str:
+            return credential.get_token(COGNITIVE_SERVICES_SCOPE).token
+
+        kwargs["ad_token_provider"] = _token_provider
 
     client = AzureOpenAIResponsesClient(**kwargs)
 
     return client.create_agent(
-        name=os.getenv("AGENT_NAME", "Assistant"),
-        instructions=os.getenv(
-            "AGENT_INSTRUCTIONS",
-            "You are a helpful assistant.",
-        ),
+        name=agent_name,
+        instructions=instructions,
     )
+
+
+_agent_override = None
+
+
+def set_agent_override(agent) -> None:
+    """Inject an agent instance (e.g. `FakeAgent`) used by all routes; pass None to clear."""
+    global _agent_override
+    _agent_override = agent
+
+
+@lru_cache(maxsize=1)
+def _create_fake_agent():
+    from app.agents.fake_agent import FakeAgent, FakeAgentConfig
+
+    return FakeAgent(FakeAgentConfig.from_env())
+
+
+@lru_cache(maxsize=32)
+def _fake_profile_agent(profile_name: str, deployment_key: str):
+    from dataclasses import replace
+
+    from app.agents.fake_agent import FakeAgent, FakeAgentConfig
+
+    return FakeAgent(replace(FakeAgentConfig.from_env(), model_name=deployment_key))
+
+
+def build_agent(profile: AgentProfile, deployment: Deployment):
+    """Agent for one deployment of a profile; one instance (and client) per deployment."""
+    if _agent_override is not None:
+        return _agent_override
+    if get_settings().agent_backend == "fake":
+        if len(profile.deployments) == 1 and profile.name == "default":
+            return _create_fake_agent()
+        # Distinct instances per deployment, reporting the deployment as model name.
+        return _fake_profile_agent(profile.name, deployment.key or "fake-agent")
+    return _azure_agent(deployment, profile.agent_name, profile.instructions, get_settings().tenant_id)
+
+
+def get_agent():
+    """Agent of the default profile: an injected override, the offline fake (AGENT_BACKEND=fake) or Azure.
+
+    For calls that should be load balanced and health tracked, use `get_agent_pool().pick()`.
+    """
+    from app.agents.agent_pool import get_agent_pool
+
+    return get_agent_pool().pick().agent
+
+
+@on_reload
+def _rebuild_agents(old: Settings, new: Settings) -> None:
+    # Conversations holding a live thread of the old agent rebuild it from their snapshot.
+    _azure_agent.cache_clear()
+    _create_fake_agent.cache_clear()
+    _fake_profile_agent.cache_clear()
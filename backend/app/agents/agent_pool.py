@@ -0,0 +1,355 @@
+"""Agent profiles served by pools of equivalent deployments, with load balancing and health tracking.
+
+A *profile* is an agent configuration (name, instructions) backed by one or more equivalent
+deployments (endpoint + deployment name, e.g. the same model in two regions). Each deployment
+gets its own agent/client, built once and reused. Profiles come from `AGENT_PROFILES` (JSON);
+without it there is a single `default` profile built from the `AZURE_OPENAI_*` settings:
+
+    AGENT_PROFILES={"default": {"deployments": [{"deployment_name": "gpt-4o", "weight": 2},
+        {"endpoint": "https://eastus2.openai.azure.com/", "deployment_name": "gpt-4o",
+         "api_key_env": "AZURE_OPENAI_API_KEY_EASTUS2"}]},
+        "coder": {"instructions": "You are a senior engineer.", "deployments": [{"deployment_name": "gpt-4.1"}]}}
+
+Deployment fields default to the `AZURE_OPENAI_*` settings; a deployment on another endpoint
+uses Entra ID unless it names its own key (`api_key_env`).
+
+Per call, `AgentPool.pick()` chooses a deployment:
+
+- `least_outstanding` (default): fewest in-flight calls relative to `weight`; ties rotate
+- `weighted_round_robin`: smooth weighted round robin (`"strategy"` in the profile)
+- a conversation sticks to the deployment of its previous turn while that one is healthy, so its
+  live thread is reused
+- a throttled (429) or failing (5xx, timeout, connection) call puts the deployment in cooldown
+  for `Retry-After` or an exponential backoff (2 s .. 60 s); traffic goes to the others, and
+  if every deployment is cooling down the one that recovers first is used
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable
+from urllib.parse import urlparse
+
+from app.core.metrics import AGENT_DEPLOYMENT_COOLDOWNS, AGENT_DEPLOYMENT_IN_FLIGHT, AGENT_DEPLOYMENT_REQUESTS
+from app.core.resilience import _retry_after, _status_code, is_transient
+from app.core.settings import Settings, get_settings, on_reload
+
+STRATEGIES = ("least_outstanding", "weighted_round_robin")
+_COOLDOWN_BASE = 2.0
+_COOLDOWN_MAX = 60.0
+_AFFINITY_SIZE = 10_000
+
+
+@dataclass(frozen=True)
+class Deployment:
+    endpoint: str
+    deployment_name: str
+    api_version: str = ""
+    api_key: str = ""
+    weight: int = 1
+
+    @property
+    def key(self) -> str:
+        """`host/deployment`, used in metrics and `/api/agent/profiles`."""
+        host = urlparse(self.endpoint).netloc or self.endpoint
+        return f"{host}/{self.deployment_name}" if host else self.deployment_name
+
+
+@dataclass(frozen=True)
+class AgentProfile:
+    name: str
+    deployments: tuple[Deployment, ...]
+    agent_name: str = "Assistant"
+    instructions: str = "You are a helpful assistant."
+    strategy: str = "least_outstanding"
+
+
+def load_profiles(config: Settings) -> dict[str, AgentProfile]:
+    base = Deployment(
+        endpoint=config.azure_openai_endpoint,
+        deployment_name=config.responses_deployment_name,
+        api_version=config.api_version,
+        api_key=config.api_key,
+    )
+    profiles = {"default": AgentProfile("default", (base,), config.agent_name, config.agent_instructions)}
+    if not config.agent_profiles:
+        return profiles
+
+    try:
+        raw = json.loads(config.agent_profiles)
+    except ValueError as exc:
+        raise RuntimeError(f"AGENT_PROFILES is not valid JSON: {exc}") from exc
+    if not isinstance(raw, dict):
+        raise RuntimeError("AGENT_PROFILES must be a JSON object of profile name -> settings")
+
+    for name, spec in raw.items():
+        spec = spec or {}
+        strategy = str(spec.get("strategy") or "least_outstanding")
+        if strategy not in STRATEGIES:
+            raise RuntimeError(f"Agent profile {name!r}: strategy must be one of {', '.join(STRATEGIES)}")
+        deployments = []
+        for item in spec.get("deployments") or [{}]:
+            endpoint = str(item.get("endpoint") or base.endpoint)
+            if item.get("api_key_env"):
+                api_key = (os.getenv(str(item["api_key_env"])) or "").strip()
+            else:
+                # The default key only belongs to the default endpoint; elsewhere use Entra ID.
+                api_key = base.api_key if endpoint == base.endpoint else ""
+            deployments.append(
+                Deployment(
+                    endpoint=endpoint,
+                    deployment_name=str(item.get("deployment_name") or base.deployment_name),
+                    api_version=str(item.get("api_version") or base.api_version),
+                    api_key=api_key,
+                    weight=max(1, int(item.get("weight") or 1)),
+                )
+            )
+        profiles[name] = AgentProfile(
+            name=name,
+            deployments=tuple(deployments),
+            agent_name=str(spec.get("agent_name") or config.agent_name),
+            instructions=str(spec.get("instructions") or config.agent_instructions),
+            strategy=strategy,
+        )
+    return profiles
+
+
+@dataclass
+class _DeploymentState:
+    deployment: Deployment
+    outstanding: int = 0
+    failures: int = 0
+    cooldown_until: float = 0.0
+    # Smooth weighted round robin state.
+    current_weight: int = 0
+    requests: int = 0
+    last_error: str | None = None
+
+    def healthy(self, now: float) -> bool:
+        return self.cooldown_until <= now
+
+
+class Lease:
+    """One call on a chosen deployment. `begin()`/`end(exc)` bracket the upstream call."""
+
+    def __init__(self, pool: "AgentPool", state: _DeploymentState, agent: Any) -> None:
+        self.pool = pool
+        self.agent = agent
+        self.deployment = state.deployment
+        self._state = state
+        self._started: float | None = None
+        self._ended = False
+
+    @property
+    def model_name(self) -> str | None:
+        return self.deployment.deployment_name or None
+
+    def begin(self) -> "Lease":
+        if self._started is None:
+            self._started = time.monotonic()
+            self.pool._begin(self._state)
+        return self
+
+    def end(self, exc: BaseException | None = None) -> None:
+        if self._started is None or self._ended:
+            return
+        self._ended = True
+        self.pool._end(self._state, exc)
+
+    def __enter__(self) -> "Lease":
+        return self.begin()
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end(exc)
+        return False
+
+
+class AgentPool:
+    def __init__(
+        self,
+        profile: AgentProfile,
+        factory: Callable[[AgentProfile, Deployment], Any],
+        *,
+        affinity_size: int = _AFFINITY_SIZE,
+    ) -> None:
+        if not profile.deployments:
+            raise RuntimeError(f"Agent profile {profile.name!r} has no deployments")
+        self.profile = profile
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._states = [_DeploymentState(d) for d in profile.deployments]
+        self._tick = itertools.count()
+        self._affinity: OrderedDict[str, int] = OrderedDict()
+        self._affinity_size = affinity_size
+
+    def pick(self, affinity: str | None = None) -> Lease:
+        """Choose a deployment (sticky per `affinity`, e.g. the conversation id) and its agent."""
+        now = time.monotonic()
+        with self._lock:
+            idx = self._affinity.get(affinity) if affinity else None
+            if idx is None or not self._states[idx].healthy(now):
+                idx = self._choose(now)
+            if affinity:
+                self._affinity[affinity] = idx
+                self._affinity.move_to_end(affinity)
+                while len(self._affinity) > self._affinity_size:
+                    self._affinity.popitem(last=False)
+            state = self._states[idx]
+        return Lease(self, state, self._factory(self.profile, state.deployment))
+
+    def _choose(self, now: float) -> int:
+        healthy = [i for i, s in enumerate(self._states) if s.healthy(now)]
+        if not healthy:
+            return min(range(len(self._states)), key=lambda i: self._states[i].cooldown_until)
+        if len(healthy) == 1:
+            return healthy[0]
+
+        if self.profile.strategy == "weighted_round_robin":
+            total = 0
+            for i in healthy:
+                state = self._states[i]
+                state.current_weight += state.deployment.weight
+                total += state.deployment.weight
+            best = max(healthy, key=lambda i: self._states[i].current_weight)
+            self._states[best].current_weight -= total
+            return best
+
+        def load(i: int) -> float:
+            state = self._states[i]
+            return state.outstanding / state.deployment.weight
+
+        lowest = min(load(i) for i in healthy)
+        candidates = [i for i in healthy if load(i) == lowest]
+        return candidates[next(self._tick) % len(candidates)]
+
+    def _begin(self, state: _DeploymentState) -> None:
+        with self._lock:
+            state.outstanding += 1
+            state.requests += 1
+        AGENT_DEPLOYMENT_IN_FLIGHT.inc(self.profile.name, state.deployment.key)
+
+    def _end(self, state: _DeploymentState, exc: BaseException | None) -> None:
+        outcome = "ok"
+        with self._lock:
+            state.outstanding -= 1
+            if exc is None:
+                state.failures = 0
+            elif not isinstance(exc, Exception):
+                # Cancelled (client went away): says nothing about the deployment.
+                outcome = "cancelled"
+            else:
+                cause = _upstream_cause(exc)
+                if cause is None:
+                    outcome = "error"
+                else:
+                    outcome = "throttled" if _status_code(cause) == 429 else "failed"
+                    state.failures += 1
+                    delay = _retry_after(cause)
+                    if delay is None:
+                        delay = min(_COOLDOWN_MAX, _COOLDOWN_BASE * 2 ** (state.failures - 1))
+                    state.cooldown_until = max(state.cooldown_until, time.monotonic() + delay)
+                    state.last_error = f"{type(cause).__name__}: {cause}"[:200]
+        AGENT_DEPLOYMENT_IN_FLIGHT.dec(self.profile.name, state.deployment.key)
+        AGENT_DEPLOYMENT_REQUESTS.inc(self.profile.name, state.deployment.key, outcome)
+        if outcome in ("throttled", "failed"):
+            AGENT_DEPLOYMENT_COOLDOWNS.inc(self.profile.name, state.deployment.key)
+
+    def snapshot(self) -> dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            deployments = [
+                {
+                    "deployment": s.deployment.key,
+                    "weight": s.deployment.weight,
+                    "healthy": s.healthy(now),
+                    "cooldown_s": round(max(0.0, s.cooldown_until - now), 1),
+                    "outstanding": s.outstanding,
+                    "requests": s.requests,
+                    "last_error": s.last_error,
+                }
+                for s in self._states
+            ]
+        return {
+            "profile": self.profile.name,
+            "agent_name": self.profile.agent_name,
+            "strategy": self.profile.strategy,
+            "deployments": deployments,
+        }
+
+
+def _upstream_cause(exc: BaseException) -> BaseException | None:
+    """The throttling/transient error in `exc`'s cause chain (SDKs wrap the HTTP error), if any."""
+    seen: set[int] = set()
+    node: BaseException | None = exc
+    while node is not None and id(node) not in seen:
+        seen.add(id(node))
+        if is_transient(node):
+            return node
+        node = node.__cause__ or node.__context__
+    return None
+
+
+class AgentRegistry:
+    """Profile name -> `AgentPool`, built from the settings snapshot on first use."""
+
+    def __init__(self, factory: Callable[[AgentProfile, Deployment], Any] | None = None) -> None:
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._profiles: dict[str, AgentProfile] | None = None
+        self._pools: dict[str, AgentPool] = {}
+
+    def _build_agent(self, profile: AgentProfile, deployment: Deployment) -> Any:
+        if self._factory is not None:
+            return self._factory(profile, deployment)
+        from app.agents.af_client import build_agent
+
+        return build_agent(profile, deployment)
+
+    def profiles(self) -> dict[str, AgentProfile]:
+        with self._lock:
+            if self._profiles is None:
+                self._profiles = load_profiles(get_settings())
+            return self._profiles
+
+    def pool(self, profile: str | None = None) -> AgentPool:
+        name = (profile or "").strip() or "default"
+        profiles = self.profiles()
+        if name not in profiles:
+            raise RuntimeError(f"Unknown agent profile: {name} (available: {', '.join(sorted(profiles))})")
+        with self._lock:
+            pool = self._pools.get(name)
+            if pool is None:
+                pool = self._pools[name] = AgentPool(profiles[name], self._build_agent)
+            return pool
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        return [self.pool(name).snapshot() for name in sorted(self.profiles())]
+
+    def warm_up(self) -> None:
+        """Build the agent (and client) of every deployment of every profile."""
+        for profile in self.profiles().values():
+            for deployment in profile.deployments:
+                self._build_agent(profile, deployment)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles = None
+            self._pools = {}
+
+
+AGENT_POOLS = AgentRegistry()
+
+
+def get_agent_pool(profile: str | None = None) -> AgentPool:
+    return AGENT_POOLS.pool(profile)
+
+
+@on_reload
+def _reload_profiles(old: Settings, new: Settings) -> None:
+    AGENT_POOLS.clear()
@@ -0,0 +1,181 @@
+"""Bulk agent runs (`POST /api/agent/batch`) for offline evaluation and backfill jobs.
+
+A `BatchRun` executes its items with at most `concurrency` turns in flight. Items sharing a
+`conversation_id` form a chain that runs strictly in submission order (a turn starts only after
+the previous one committed); when a turn fails, the rest of its chain is `skipped`. Results are
+published in completion order, each tagged with the item's index.
+
+Usage rows are collected while the batch runs and written in one transaction when it ends,
+including after a cancel, so finished turns are always accounted for. A batch is cancelled by
+`cancel()` (the cancel endpoint, or the client disconnecting): nothing new starts, in-flight
+turns are cancelled and every unfinished item is reported as `cancelled`.
+
+Configuration: `AGENT_BATCH_CONCURRENCY` (default 4) when the request does not set one,
+`AGENT_BATCH_MAX_CONCURRENCY` (default 16) and `AGENT_BATCH_MAX_ITEMS` (default 5000).
+Every turn still goes through agent admission control, under its own `batch:<client>` key.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import uuid
+from typing import Any, Awaitable, Callable
+
+from app.core.metrics import AGENT_BATCH_ITEMS, AGENT_BATCHES_IN_FLIGHT
+from app.core.settings import env_int
+
+# (conversation_id, turn_index, usage, model_name), as taken by `record_turn_usage_many`.
+UsageRow = tuple[str, int, dict[str, int], str | None]
+# (index, message, conversation_id) -> (result fields, usage row)
+RunTurn = Callable[[int, str, str], Awaitable[tuple[dict[str, Any], UsageRow]]]
+
+
+def batch_limits() -> tuple[int, int, int]:
+    """(default concurrency, max concurrency, max items)."""
+    max_concurrency = max(1, env_int("AGENT_BATCH_MAX_CONCURRENCY", 16))
+    default = min(max_concurrency, max(1, env_int("AGENT_BATCH_CONCURRENCY", 4)))
+    return default, max_concurrency, max(1, env_int("AGENT_BATCH_MAX_ITEMS", 5000))
+
+
+def error_fields(exc: BaseException) -> dict[str, Any]:
+    retry_after = getattr(exc, "retry_after", None)
+    message = str(exc) if isinstance(exc, RuntimeError) or retry_after is not None else f"Agent error: {exc}"
+    fields: dict[str, Any] = {"status": "error", "error": message}
+    if retry_after is not None:
+        fields["retry_after"] = retry_after
+    return fields
+
+
+class BatchRun:
+    def __init__(
+        self,
+        items: list[tuple[str, str | None]],
+        run_turn: RunTurn,
+        persist: Callable[[list[UsageRow]], Awaitable[None]],
+        *,
+        concurrency: int,
+    ) -> None:
+        self.id = uuid.uuid4().hex
+        self.items = [(message, (conversation_id or "").strip() or str(uuid.uuid4())) for message, conversation_id in items]
+        self.concurrency = max(1, concurrency)
+        self.cancelled = False
+        self.counts = {"ok": 0, "error": 0, "skipped": 0, "cancelled": 0}
+        self._run_turn = run_turn
+        self._persist = persist
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._results: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue()
+        self._usage: list[UsageRow] = []
+        self._chains: list[asyncio.Task] = []
+        self._task: asyncio.Task | None = None
+
+    def chains(self) -> list[list[int]]:
+        """Item indexes grouped by conversation, each in submission order."""
+        by_conversation: dict[str, list[int]] = {}
+        for index, (_, conversation_id) in enumerate(self.items):
+            by_conversation.setdefault(conversation_id, []).append(index)
+        return list(by_conversation.values())
+
+    def start(self) -> "BatchRun":
+        self._chains = [asyncio.create_task(self._run_chain(chain)) for chain in self.chains()]
+        self._task = asyncio.create_task(self._finish())
+        return self
+
+    def cancel(self) -> None:
+        if self.cancelled or self._task is None or self._task.done():
+            return
+        self.cancelled = True
+        for task in self._chains:
+            task.cancel()
+
+    async def results(self):
+        """Result dicts in completion order, then the summary."""
+        while True:
+            result = await self._results.get()
+            if result is None:
+                return
+            yield result
+
+    def _publish(self, index: int, fields: dict[str, Any]) -> None:
+        status = fields["status"]
+        self.counts[status] += 1
+        AGENT_BATCH_ITEMS.inc(status)
+        self._results.put_nowait({"index": index, "conversation_id": self.items[index][1], **fields})
+
+    async def _run_chain(self, chain: list[int]) -> None:
+        failed = False
+        for index in chain:
+            if self.cancelled:
+                self._publish(index, {"status": "cancelled"})
+                continue
+            if failed:
+                self._publish(index, {"status": "skipped", "error": "an earlier turn of this conversation failed"})
+                continue
+            message, conversation_id = self.items[index]
+            try:
+                async with self._semaphore:
+                    if self.cancelled:
+                        self._publish(index, {"status": "cancelled"})
+                        continue
+                    fields, usage_row = await self._run_turn(index, message, conversation_id)
+            except asyncio.CancelledError:
+                if not self.cancelled:
+                    raise
+                self._publish(index, {"status": "cancelled"})
+                continue
+            except Exception as exc:
+                failed = True
+                self._publish(index, error_fields(exc))
+                continue
+            self._usage.append(usage_row)
+            self._publish(index, {"status": "ok", **fields})
+
+    async def _finish(self) -> None:
+        AGENT_BATCHES_IN_FLIGHT.inc()
+        usage_recorded = 0
+        try:
+            await asyncio.gather(*self._chains, return_exceptions=True)
+        finally:
+            if self._usage:
+                try:
+                    await self._persist(self._usage)
+                    usage_recorded = len(self._usage)
+                except Exception:
+                    # Best-effort persistence, as for single runs.
+                    pass
+            AGENT_BATCHES_IN_FLIGHT.dec()
+            self._results.put_nowait(
+                {
+                    "batch_id": self.id,
+                    "done": True,
+                    "cancelled": self.cancelled,
+                    "counts": dict(self.counts),
+                    "usage_recorded": usage_recorded,
+                }
+            )
+            self._results.put_nowait(None)
+
+
+class BatchRegistry:
+    """Batches currently running in this process, so they can be cancelled by id."""
+
+    def __init__(self) -> None:
+        self._runs: dict[str, BatchRun] = {}
+
+    def __len__(self) -> int:
+        return len(self._runs)
+
+    def start(self, run: BatchRun) -> BatchRun:
+        run.start()
+        self._runs[run.id] = run
+        run._task.add_done_callback(lambda _: self._runs.pop(run.id, None))
+        return run
+
+    def cancel(self, batch_id: str) -> bool:
+        run = self._runs.get(batch_id)
+        if run is None:
+            return False
+        run.cancel()
+        return True
+
+
+AGENT_BATCHES = BatchRegistry()
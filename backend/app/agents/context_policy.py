@@ -0,0 +1,71 @@
+"""How much conversation history is sent to the model each turn.
+
+Modes (`AGENT_CONTEXT_POLICY`, or a `context_policy` attribute on the agent instance):
+
+- `full` (default): the whole thread, unbounded
+- `last_n`: the last `AGENT_CONTEXT_MAX_TURNS` turns
+- `token_budget`: as many recent turns as fit in `AGENT_CONTEXT_MAX_TOKENS`
+- `summary`: once the window exceeds `AGENT_CONTEXT_MAX_TOKENS`, turns older than the last
+  `AGENT_CONTEXT_KEEP_TURNS` are folded into a rolling summary in the background; the next
+  turn sends the summary plus the recent turns
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Any
+
+from app.core.settings import env_int
+
+CONTEXT_POLICY_MODES = ("full", "last_n", "token_budget", "summary")
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+@dataclass(frozen=True)
+class ContextPolicy:
+    mode: str = "full"
+    max_turns: int = 20
+    max_tokens: int = 4000
+    keep_turns: int = 4
+
+    def __post_init__(self) -> None:
+        if self.mode not in CONTEXT_POLICY_MODES:
+            raise ValueError(f"context policy must be one of {CONTEXT_POLICY_MODES}, got {self.mode!r}")
+
+    @property
+    def bounded(self) -> bool:
+        return self.mode != "full"
+
+    @classmethod
+    def from_env(cls) -> "ContextPolicy":
+        mode = (os.getenv("AGENT_CONTEXT_POLICY") or "full").strip().lower()
+        if mode not in CONTEXT_POLICY_MODES:
+            mode = "full"
+        return cls(
+            mode=mode,
+            max_turns=max(1, env_int("AGENT_CONTEXT_MAX_TURNS", 20)),
+            max_tokens=max(1, env_int("AGENT_CONTEXT_MAX_TOKENS", 4000)),
+            keep_turns=max(1, env_int("AGENT_CONTEXT_KEEP_TURNS", 4)),
+        )
+
+
+def policy_for(agent: Any, default: ContextPolicy) -> ContextPolicy:
+    """The agent's own `context_policy` if it declares one, else `default`."""
+    policy = getattr(agent, "context_policy", None)
+    return policy if isinstance(policy, ContextPolicy) else default
+
+
+def summary_prompt(previous_summary: str | None, messages: list[dict[str, str]]) -> str:
+    lines = [
+        "Summarize the conversation below for your own future reference.",
+        "Keep facts, names, decisions, open questions and user preferences; drop small talk.",
+        "Reply with the summary only.",
+        "",
+    ]
+    if previous_summary:
+        lines.extend(["Earlier summary:", previous_summary, ""])
+    lines.append("Conversation:")
+    lines.extend(f"{m.get('role', 'user')}: {m.get('text', '')}" for m in messages)
+    return "\n".join(lines)
@@ -0,0 +1,305 @@
+"""Shared storage for conversation state, so follow-up turns can land on any worker or pod.
+
+`ConversationStore` keeps working in-process by default (`CONVERSATION_BACKEND=memory`). With a
+shared backend it becomes a per-worker read-through cache in front of it:
+
+- `sqlite`: a local SQLite file in WAL mode (`CONVERSATION_DB_PATH`), for `uvicorn --workers N`
+  on one host; see `app.db.conversations`
+- `http`: any network key-value service speaking the small protocol of `app.db.kv_server`
+  (`CONVERSATION_KV_URL`), for several hosts/pods
+
+Every conversation carries a version number. Writers pass the version they read and the write
+fails with `VersionConflict` if someone else committed first (optimistic concurrency), so the
+store can reload and re-apply its turn instead of silently dropping the other writer's turn.
+
+A conversation is stored as a small header (stats, context window, version), the thread
+snapshot from the last compaction, and an append-only message log, so a turn appends only its
+own messages instead of rewriting the history.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import uuid
+from urllib.parse import quote
+from dataclasses import dataclass, field
+from typing import Any, Protocol
+
+
+class VersionConflict(Exception):
+    """The conversation changed since it was read."""
+
+
+@dataclass(frozen=True)
+class StoredConversation:
+    version: int
+    header: dict[str, Any]
+    snapshot: dict[str, Any] | None = None
+    log: list[dict[str, str]] = field(default_factory=list)
+
+
+class ConversationBackend(Protocol):
+    # True when calls do I/O and should run off the event loop.
+    blocking: bool
+
+    def version(self, conversation_id: str) -> int | None:
+        """Current version, or None if the conversation does not exist."""
+        ...
+
+    def load(self, conversation_id: str) -> StoredConversation | None:
+        ...
+
+    def write(
+        self,
+        conversation_id: str,
+        *,
+        expected_version: int,
+        header: dict[str, Any],
+        append: list[dict[str, str]] | None = None,
+        replace_log: list[dict[str, str]] | None = None,
+        snapshot: dict[str, Any] | None = None,
+    ) -> int:
+        """Compare-and-set write; returns the new version.
+
+        `expected_version=0` creates the conversation. Without `replace_log` the messages in
+        `append` are added to the log and the snapshot is left alone; with it, the log is
+        replaced and the snapshot set to `snapshot` (compaction or a context-window reset).
+        Raises `VersionConflict` if the stored version is not `expected_version`.
+        """
+        ...
+
+    def count(self) -> int:
+        ...
+
+
+# --- Network key-value backend -------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class KVEntry:
+    value: str
+    version: int
+
+
+class KeyValueClient(Protocol):
+    """Minimal versioned KV interface (etcd/Consul/Redis-with-Lua all fit it)."""
+
+    def get(self, key: str) -> KVEntry | None:
+        ...
+
+    def mget(self, keys: list[str]) -> list[KVEntry | None]:
+        ...
+
+    def put(self, key: str, value: str, *, expected_version: int | None = None) -> int:
+        """Store `value`; with `expected_version` (0 = must not exist) raise `VersionConflict` on mismatch."""
+        ...
+
+    def delete(self, keys: list[str]) -> None:
+        ...
+
+    def count(self, prefix: str) -> int:
+        ...
+
+
+class MemoryKeyValueClient:
+    """Thread-safe in-process implementation; also the storage behind the stand-in KV server."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._data: dict[str, KVEntry] = {}
+
+    def get(self, key: str) -> KVEntry | None:
+        return self._data.get(key)
+
+    def mget(self, keys: list[str]) -> list[KVEntry | None]:
+        return [self._data.get(k) for k in keys]
+
+    def put(self, key: str, value: str, *, expected_version: int | None = None) -> int:
+        with self._lock:
+            current = self._data.get(key)
+            current_version = current.version if current else 0
+            if expected_version is not None and expected_version != current_version:
+                raise VersionConflict(f"{key}: expected version {expected_version}, found {current_version}")
+            entry = KVEntry(value=value, version=current_version + 1)
+            self._data[key] = entry
+            return entry.version
+
+    def delete(self, keys: list[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def count(self, prefix: str) -> int:
+        return sum(1 for k in list(self._data) if k.startswith(prefix))
+
+
+class HttpKeyValueClient:
+    """Client for the KV HTTP protocol served by `app.db.kv_server`.
+
+    `client` may be any `httpx.Client` (e.g. FastAPI's `TestClient` in tests); by default one
+    keep-alive client is created for `base_url`.
+    """
+
+    def __init__(self, base_url: str = "", *, client: Any = None, timeout: float = 5.0) -> None:
+        if client is None:
+            import httpx
+
+            client = httpx.Client(base_url=base_url.rstrip("/"), timeout=timeout)
+        self._client = client
+
+    def get(self, key: str) -> KVEntry | None:
+        res = self._client.get(f"/kv/{quote(key, safe='/')}")
+        if res.status_code == 404:
+            return None
+        res.raise_for_status()
+        body = res.json()
+        return KVEntry(value=body["value"], version=int(body["version"]))
+
+    def mget(self, keys: list[str]) -> list[KVEntry | None]:
+        if not keys:
+            return []
+        res = self._client.post("/kv/_mget", json={"keys": keys})
+        res.raise_for_status()
+        return [KVEntry(value=i["value"], version=int(i["version"])) if i else None for i in res.json()["items"]]
+
+    def put(self, key: str, value: str, *, expected_version: int | None = None) -> int:
+        body: dict[str, Any] = {"value": value}
+        if expected_version is not None:
+            body["expected_version"] = int(expected_version)
+        res = self._client.put(f"/kv/{quote(key, safe='/')}", json=body)
+        if res.status_code == 409:
+            raise VersionConflict(key)
+        res.raise_for_status()
+        return int(res.json()["version"])
+
+    def delete(self, keys: list[str]) -> None:
+        if keys:
+            self._client.post("/kv/_delete", json={"keys": keys}).raise_for_status()
+
+    def count(self, prefix: str) -> int:
+        res = self._client.get("/kv/_count", params={"prefix": prefix})
+        res.raise_for_status()
+        return int(res.json()["count"])
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class KVConversationBackend:
+    """Conversation state on a `KeyValueClient`.
+
+    Layout per conversation `c` (`<p>` is the key prefix):
+
+    - `<p>/h/c`: header JSON plus the list of log segments and the snapshot key; its KV version
+      is the conversation version and it is the only key written with compare-and-set
+    - `<p>/l/c/<token>`: the messages appended by one commit
+    - `<p>/s/c/<token>`: a snapshot
+
+    Segment and snapshot keys get a random token and are written before the header CAS, so a
+    writer that loses the race leaves only unreferenced garbage and never clobbers live data.
+    The segment list grows by one short entry per turn and is cleared on compaction.
+    """
+
+    blocking = True
+
+    def __init__(self, client: KeyValueClient, *, prefix: str = "conv") -> None:
+        self.client = client
+        self.prefix = prefix.rstrip("/")
+
+    def _header_key(self, conversation_id: str) -> str:
+        return f"{self.prefix}/h/{conversation_id}"
+
+    def _segment_key(self, conversation_id: str, token: str) -> str:
+        return f"{self.prefix}/l/{conversation_id}/{token}"
+
+    def _snapshot_key(self, conversation_id: str, token: str) -> str:
+        return f"{self.prefix}/s/{conversation_id}/{token}"
+
+    def version(self, conversation_id: str) -> int | None:
+        entry = self.client.get(self._header_key(conversation_id))
+        return entry.version if entry else None
+
+    def load(self, conversation_id: str) -> StoredConversation | None:
+        entry = self.client.get(self._header_key(conversation_id))
+        if entry is None:
+            return None
+        meta = json.loads(entry.value)
+        keys = [self._segment_key(conversation_id, token) for token in meta["segments"]]
+        if meta.get("snapshot"):
+            keys.append(self._snapshot_key(conversation_id, meta["snapshot"]))
+        entries = self.client.mget(keys)
+        snapshot = None
+        if meta.get("snapshot"):
+            snap_entry = entries.pop()
+            snapshot = json.loads(snap_entry.value) if snap_entry else None
+        log: list[dict[str, str]] = []
+        for segment in entries:
+            if segment is not None:
+                log.extend(json.loads(segment.value))
+        return StoredConversation(version=entry.version, header=meta["header"], snapshot=snapshot, log=log)
+
+    def write(
+        self,
+        conversation_id: str,
+        *,
+        expected_version: int,
+        header: dict[str, Any],
+        append: list[dict[str, str]] | None = None,
+        replace_log: list[dict[str, str]] | None = None,
+        snapshot: dict[str, Any] | None = None,
+    ) -> int:
+        header_key = self._header_key(conversation_id)
+        current = self.client.get(header_key)
+        current_version = current.version if current else 0
+        if current_version != expected_version:
+            raise VersionConflict(conversation_id)
+        meta = json.loads(current.value) if current else {"segments": [], "snapshot": None}
+        stale: list[str] = []
+
+        messages = append or []
+        if replace_log is not None:
+            stale = [self._segment_key(conversation_id, token) for token in meta["segments"]]
+            if meta.get("snapshot"):
+                stale.append(self._snapshot_key(conversation_id, meta["snapshot"]))
+            meta["segments"] = []
+            meta["snapshot"] = None
+            messages = replace_log
+            if snapshot is not None:
+                token = uuid.uuid4().hex[:16]
+                self.client.put(self._snapshot_key(conversation_id, token), _dumps(snapshot))
+                meta["snapshot"] = token
+        if messages:
+            token = uuid.uuid4().hex[:16]
+            self.client.put(self._segment_key(conversation_id, token), _dumps(messages))
+            meta["segments"].append(token)
+        meta["header"] = header
+
+        version = self.client.put(header_key, _dumps(meta), expected_version=expected_version)
+        if stale:
+            try:
+                self.client.delete(stale)
+            except Exception:
+                # Garbage only; the header no longer references these keys.
+                pass
+        return version
+
+    def count(self) -> int:
+        return self.client.count(f"{self.prefix}/h/")
+
+
+def backend_from_env() -> ConversationBackend | None:
+    """The configured shared backend, or None for the in-process default."""
+    kind = (os.getenv("CONVERSATION_BACKEND") or "memory").strip().lower()
+    if kind == "sqlite":
+        from app.db.conversations import SqliteConversationBackend
+
+        return SqliteConversationBackend()
+    if kind == "http":
+        url = (os.getenv("CONVERSATION_KV_URL") or "").strip()
+        if not url:
+            raise RuntimeError("CONVERSATION_BACKEND=http requires CONVERSATION_KV_URL")
+        return KVConversationBackend(HttpKeyValueClient(url))
+    return None
@@ -0,0 +1,551 @@
+"""Conversation state: a thread snapshot plus an append-only message log.
+
+Serializing the whole thread after every turn (and deserializing it on the next) makes each
+turn O(history), so a long conversation costs O(turns²) server CPU. Instead each record keeps:
+
+- `snapshot`: `thread.serialize()` output taken at the last compaction (None before the first)
+- `log`: messages appended since the snapshot, two small dicts per turn
+- the live thread object from the last turn, so the next turn normally reuses it as-is
+
+A thread is rebuilt (deserialize snapshot + replay log via `thread.on_new_messages`) only when
+no live thread is available: it was evicted (`AGENT_LIVE_THREADS_MAX`), a concurrent request on
+the same conversation holds it, or the agent instance changed. Compaction re-serializes the live
+thread once the log grows past `max(AGENT_THREAD_COMPACT_MIN, messages in snapshot)`, so the
+snapshot is rewritten geometrically rarely and the amortized per-turn cost stays constant.
+
+A service-managed thread (one with a `service_thread_id`) keeps its messages on the service and
+ignores `on_new_messages`, so replaying a log into it would silently drop those turns. Its
+serialized form is just the id, so it is snapshotted on every turn (O(1)) and never replayed.
+
+With a bounded `ContextPolicy` the record also tracks the turns currently in the model's window
+(plus an optional rolling summary). When the window is trimmed or a background summary lands,
+the record is reset to `log = summary + kept turns` and the next turn rebuilds a small thread.
+
+Records live in process memory unless a shared `ConversationBackend` is configured (see
+`app.agents.conversation_backend`); they are then a per-worker read-through cache, validated
+against the backend version on every checkout and written with compare-and-set on commit.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import inspect
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Awaitable, Callable
+
+from app.agents.context_policy import SUMMARY_PREFIX, ContextPolicy, policy_for, summary_prompt
+from app.agents.conversation_backend import ConversationBackend, StoredConversation, VersionConflict
+from app.core.metrics import (
+    CONVERSATION_BACKEND_CONFLICTS,
+    CONVERSATION_COMPACTIONS,
+    CONVERSATION_SUMMARIES,
+    CONVERSATION_THREAD_LOADS,
+)
+from app.core.settings import env_int
+from app.core.timing import phase
+from app.core.tokens import token_count
+
+# (agent, prompt) -> summary text. Runs the model outside any conversation thread.
+Summarizer = Callable[[Any, str], Awaitable[str]]
+
+# Optimistic writes are retried this many times before giving up on a hot conversation.
+_MAX_WRITE_ATTEMPTS = 5
+
+
+def empty_stats() -> dict[str, Any]:
+    return {
+        "turns": 0,
+        "total": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0},
+        "last": None,
+    }
+
+
+def apply_usage(stats: dict[str, Any], usage: dict[str, int] | None) -> dict[str, Any]:
+    if not usage:
+        stats["last"] = None
+        return stats
+
+    total = stats.get("total")
+    if not isinstance(total, dict):
+        total = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+
+    for key in ("input_tokens", "output_tokens", "total_tokens"):
+        if key in usage:
+            total[key] = int(total.get(key, 0)) + int(usage[key])
+
+    stats["total"] = total
+    stats["last"] = usage
+    stats["turns"] = int(stats.get("turns", 0)) + 1
+    return stats
+
+
+@dataclass(frozen=True)
+class WindowTurn:
+    messages: tuple[dict[str, str], ...]
+    tokens: int
+
+
+def _window_messages(summary: str | None, window: list[WindowTurn]) -> list[dict[str, str]]:
+    messages: list[dict[str, str]] = []
+    if summary:
+        messages.append({"role": "system", "text": SUMMARY_PREFIX + summary})
+    for turn in window:
+        messages.extend(dict(m) for m in turn.messages)
+    return messages
+
+
+def _window_to_json(window: list[WindowTurn]) -> list[dict[str, Any]]:
+    return [{"messages": list(t.messages), "tokens": t.tokens} for t in window]
+
+
+@dataclass
+class ConversationRecord:
+    stats: dict[str, Any] = field(default_factory=empty_stats)
+    snapshot: dict[str, Any] | None = None
+    # Messages represented by `snapshot` (as far as this store has seen them).
+    snapshot_messages: int = 0
+    log: list[dict[str, str]] = field(default_factory=list)
+    live_thread: Any = None
+    live_agent: Any = None
+    # Bumped whenever the history is reset to a trimmed/summarized window; threads checked out
+    # under an older generation still hold the untrimmed history and are not kept live.
+    generation: int = 0
+    # Backend version this record reflects; without a shared backend, a local commit counter.
+    version: int = 0
+    # Bounded context policies only.
+    window: list[WindowTurn] = field(default_factory=list)
+    summary: str | None = None
+    summary_tokens: int = 0
+    summarized_turns: int = 0
+    summarizing: bool = False
+
+    def window_tokens(self) -> int:
+        return self.summary_tokens + sum(t.tokens for t in self.window)
+
+    def window_messages(self) -> list[dict[str, str]]:
+        return _window_messages(self.summary, self.window)
+
+    def header(self) -> dict[str, Any]:
+        return {
+            "stats": self.stats,
+            "snapshot_messages": self.snapshot_messages,
+            "generation": self.generation,
+            "window": _window_to_json(self.window),
+            "summary": self.summary,
+            "summary_tokens": self.summary_tokens,
+            "summarized_turns": self.summarized_turns,
+        }
+
+    @classmethod
+    def from_stored(cls, stored: StoredConversation) -> "ConversationRecord":
+        h = stored.header
+        window = [WindowTurn(messages=tuple(t["messages"]), tokens=int(t["tokens"])) for t in h.get("window") or []]
+        return cls(
+            stats=h.get("stats") or empty_stats(),
+            snapshot=stored.snapshot,
+            snapshot_messages=int(h.get("snapshot_messages") or 0),
+            log=list(stored.log),
+            generation=int(h.get("generation") or 0),
+            version=stored.version,
+            window=window,
+            summary=h.get("summary"),
+            summary_tokens=int(h.get("summary_tokens") or 0),
+            summarized_turns=int(h.get("summarized_turns") or 0),
+        )
+
+
+@dataclass
+class CheckedOutThread:
+    thread: Any
+    stats: dict[str, Any]
+    # "live" (reused in place), "rebuilt" (snapshot + log replay) or "new".
+    source: str
+    generation: int = 0
+    version: int = 0
+
+
+@dataclass
+class _Update:
+    """One change to a record (new field values + log operation), planned without mutating it."""
+
+    fields: dict[str, Any]
+    append: list[dict[str, str]] | None = None
+    # Replaces the whole log; the snapshot is set to `snapshot` at the same time.
+    replace_log: list[dict[str, str]] | None = None
+    snapshot: dict[str, Any] | None = None
+    # Window turns to fold into a rolling summary in the background.
+    fold: list[WindowTurn] | None = None
+
+    @property
+    def resets_thread(self) -> bool:
+        return self.replace_log is not None and self.snapshot is None
+
+
+@lru_cache(maxsize=1)
+def _chat_message_factory():
+    try:
+        from agent_framework import ChatMessage  # type: ignore
+    except Exception:
+        return None
+    return ChatMessage
+
+
+def _replay_messages(log: list[dict[str, str]]) -> list[Any]:
+    factory = _chat_message_factory()
+    if factory is None:
+        return [dict(m) for m in log]
+    return [factory(role=m["role"], text=m["text"]) for m in log]
+
+
+def _is_service_thread(serialized: Any) -> bool:
+    return isinstance(serialized, dict) and bool(serialized.get("service_thread_id"))
+
+
+async def _maybe_await(value: Any) -> Any:
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+class ConversationStore:
+    def __init__(
+        self,
+        *,
+        compact_min: int | None = None,
+        max_live_threads: int | None = None,
+        context_policy: ContextPolicy | None = None,
+        summarizer: Summarizer | None = None,
+        backend: ConversationBackend | None = None,
+    ) -> None:
+        if compact_min is None:
+            compact_min = env_int("AGENT_THREAD_COMPACT_MIN", 16)
+        if max_live_threads is None:
+            max_live_threads = env_int("AGENT_LIVE_THREADS_MAX", 1000)
+        self.compact_min = max(1, compact_min)
+        self.max_live_threads = max(0, max_live_threads)
+        self.context_policy = context_policy or ContextPolicy.from_env()
+        self.summarizer = summarizer
+        self.backend = backend
+        self._lock = asyncio.Lock()
+        self._records: dict[str, ConversationRecord] = {}
+        # Conversation ids holding a live thread, least recently used first.
+        self._live: OrderedDict[str, None] = OrderedDict()
+        self._background: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def get(self, conversation_id: str) -> ConversationRecord | None:
+        return self._records.get(conversation_id)
+
+    def clear(self) -> None:
+        self._records.clear()
+        self._live.clear()
+
+    async def drain(self) -> None:
+        """Wait for background summaries scheduled so far (tests, shutdown)."""
+        while self._background:
+            await asyncio.gather(*list(self._background), return_exceptions=True)
+
+    async def _backend_call(self, fn, *args, **kwargs):
+        if getattr(self.backend, "blocking", True):
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        return fn(*args, **kwargs)
+
+    async def _refresh(self, conversation_id: str) -> None:
+        """Make the cached record match the shared backend (version check, full load on mismatch)."""
+        with phase("conversation_backend_read"):
+            version = await self._backend_call(self.backend.version, conversation_id)
+            cached = self._records.get(conversation_id)
+            if cached is not None and version is not None and cached.version == version:
+                return
+            stored = None
+            if version is not None:
+                stored = await self._backend_call(self.backend.load, conversation_id)
+        async with self._lock:
+            self._drop(conversation_id)
+            if stored is not None:
+                self._records[conversation_id] = ConversationRecord.from_stored(stored)
+
+    async def checkout(self, conversation_id: str, agent: Any) -> CheckedOutThread:
+        """Take the conversation's thread for one turn; return it with `commit` when the turn succeeds."""
+        if self.backend is not None:
+            await self._refresh(conversation_id)
+        with phase("lock_wait"):
+            async with self._lock:
+                record = self._records.get(conversation_id)
+                if record is None:
+                    snapshot, log, stats = None, [], empty_stats()
+                    generation = version = 0
+                else:
+                    stats = copy.deepcopy(record.stats)
+                    generation, version = record.generation, record.version
+                    if record.live_thread is not None and record.live_agent is agent:
+                        thread = record.live_thread
+                        record.live_thread = None
+                        record.live_agent = None
+                        self._live.pop(conversation_id, None)
+                        CONVERSATION_THREAD_LOADS.inc("live")
+                        return CheckedOutThread(
+                            thread=thread, stats=stats, source="live", generation=generation, version=version
+                        )
+                    snapshot, log = record.snapshot, list(record.log)
+
+        with phase("deserialize_thread"):
+            if snapshot is not None:
+                thread = await _maybe_await(agent.deserialize_thread(snapshot))
+            else:
+                thread = await _maybe_await(agent.get_new_thread())
+            if log and not _is_service_thread(snapshot):
+                await _maybe_await(thread.on_new_messages(_replay_messages(log)))
+        source = "rebuilt" if record is not None else "new"
+        CONVERSATION_THREAD_LOADS.inc(source)
+        return CheckedOutThread(thread=thread, stats=stats, source=source, generation=generation, version=version)
+
+    async def commit(
+        self,
+        conversation_id: str,
+        agent: Any,
+        thread: Any,
+        stats: dict[str, Any],
+        new_messages: list[dict[str, str]],
+        *,
+        generation: int = 0,
+        version: int = 0,
+        usage: dict[str, int] | None = None,
+    ) -> None:
+        """Append this turn's messages, compacting when due, and keep `thread` live for the next turn.
+
+        With a shared backend, a commit from another request or worker since checkout makes the
+        write conflict; the turn is then re-applied on top of the latest state (`usage` is added
+        to the latest stats) and the thread, which lacks the other turn, is not kept live.
+        """
+        record = self._records.get(conversation_id)
+        current = record is None or (record.generation == generation and record.version == version)
+        pending = (len(record.log) if record else 0) + len(new_messages)
+        base = record.snapshot_messages if record else 0
+        snapshot = None
+        service = bool(getattr(thread, "service_thread_id", None))
+        if current and (service or pending >= max(self.compact_min, base)):
+            with phase("serialize_thread"):
+                snapshot = await _maybe_await(thread.serialize())
+            CONVERSATION_COMPACTIONS.inc()
+
+        policy = policy_for(agent, self.context_policy)
+        for attempt in range(_MAX_WRITE_ATTEMPTS):
+            with phase("lock_wait"):
+                async with self._lock:
+                    record = self._records.get(conversation_id) or ConversationRecord()
+                    current = record.generation == generation and record.version == version
+                    if attempt > 0 and usage is not None:
+                        stats = apply_usage(copy.deepcopy(record.stats), usage)
+                    update = self._plan_turn(record, stats, new_messages, snapshot if current else None, policy)
+                    if self.backend is None:
+                        # Bump the local version so turns checked out before this one see it as stale.
+                        self._apply(conversation_id, record, update, record.version + 1)
+                        break
+                    expected = record.version
+                    header = self._header(record, update)
+            try:
+                with phase("conversation_backend_write"):
+                    new_version = await self._write(conversation_id, expected, header, update)
+            except VersionConflict:
+                CONVERSATION_BACKEND_CONFLICTS.inc()
+                await self._refresh(conversation_id)
+                continue
+            async with self._lock:
+                record = self._records.get(conversation_id)
+                if record is None and expected == 0:
+                    record = ConversationRecord()
+                if record is not None and record.version == expected:
+                    self._apply(conversation_id, record, update, new_version)
+            break
+        else:
+            raise VersionConflict(f"{conversation_id}: too many concurrent writers")
+
+        async with self._lock:
+            record = self._records.get(conversation_id)
+            if record is None:
+                return
+            if current and not update.resets_thread and self.max_live_threads > 0:
+                record.live_thread = thread
+                record.live_agent = agent
+                self._live[conversation_id] = None
+                self._live.move_to_end(conversation_id)
+                self._evict_live()
+            else:
+                if not current and record.live_thread is not None:
+                    # The live thread belongs to the turn committed since checkout and lacks this one.
+                    record.live_thread = None
+                    record.live_agent = None
+                    self._live.pop(conversation_id, None)
+                if self.backend is not None and record.live_thread is None:
+                    # Nothing worth caching: the next turn reloads from the backend anyway.
+                    self._drop(conversation_id)
+            if update.fold and self.summarizer is not None and not record.summarizing:
+                record.summarizing = True
+                task = asyncio.get_running_loop().create_task(
+                    self._summarize(conversation_id, agent, record.summary, update.fold)
+                )
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+
+    @staticmethod
+    def _header(record: ConversationRecord, update: _Update) -> dict[str, Any]:
+        header = record.header()
+        for name, value in update.fields.items():
+            header[name] = _window_to_json(value) if name == "window" else value
+        return header
+
+    async def _write(self, conversation_id: str, expected: int, header: dict[str, Any], update: _Update) -> int:
+        return await self._backend_call(
+            self.backend.write,
+            conversation_id,
+            expected_version=expected,
+            header=header,
+            append=update.append,
+            replace_log=update.replace_log,
+            snapshot=update.snapshot,
+        )
+
+    def _plan_turn(
+        self,
+        record: ConversationRecord,
+        stats: dict[str, Any],
+        new_messages: list[dict[str, str]],
+        snapshot: dict[str, Any] | None,
+        policy: ContextPolicy,
+    ) -> _Update:
+        fields: dict[str, Any] = {"stats": stats}
+        update = _Update(fields=fields, append=[dict(m) for m in new_messages])
+        if snapshot is not None:
+            # The thread already contains every logged message, so the log restarts empty.
+            fields["snapshot_messages"] = record.snapshot_messages + len(record.log) + len(new_messages)
+            update.append = None
+            update.replace_log = []
+            update.snapshot = snapshot
+        if not policy.bounded:
+            return update
+
+        tokens = sum(token_count(m.get("text", "")) for m in new_messages)
+        window = list(record.window) + [WindowTurn(messages=tuple(dict(m) for m in new_messages), tokens=tokens)]
+        window_tokens = record.summary_tokens + sum(t.tokens for t in window)
+        trimmed = False
+        if policy.mode == "last_n" and len(window) > policy.max_turns:
+            window = window[len(window) - policy.max_turns :]
+            trimmed = True
+        elif policy.mode == "token_budget":
+            while len(window) > 1 and window_tokens > policy.max_tokens:
+                window_tokens -= window.pop(0).tokens
+                trimmed = True
+        elif (
+            policy.mode == "summary"
+            and not record.summarizing
+            and len(window) > policy.keep_turns
+            and window_tokens > policy.max_tokens
+        ):
+            update.fold = window[: len(window) - policy.keep_turns]
+        fields["window"] = window
+        if trimmed:
+            self._plan_reset(update, record.generation, record.summary, window)
+        return update
+
+    @staticmethod
+    def _plan_reset(update: _Update, generation: int, summary: str | None, window: list[WindowTurn]) -> None:
+        # The next checkout rebuilds a fresh thread from just the window.
+        update.fields["generation"] = generation + 1
+        update.fields["snapshot_messages"] = 0
+        update.append = None
+        update.replace_log = _window_messages(summary, window)
+        update.snapshot = None
+
+    def _apply(self, conversation_id: str, record: ConversationRecord, update: _Update, version: int) -> None:
+        for name, value in update.fields.items():
+            setattr(record, name, list(value) if name == "window" else value)
+        if update.replace_log is not None:
+            record.log = [dict(m) for m in update.replace_log]
+            record.snapshot = update.snapshot
+        elif update.append:
+            record.log.extend(update.append)
+        record.version = version
+        if update.resets_thread:
+            record.live_thread = None
+            record.live_agent = None
+            self._live.pop(conversation_id, None)
+        self._records.setdefault(conversation_id, record)
+
+    async def _summarize(
+        self,
+        conversation_id: str,
+        agent: Any,
+        previous_summary: str | None,
+        folded: list[WindowTurn],
+    ) -> None:
+        outcome = "error"
+        try:
+            messages = [m for turn in folded for m in turn.messages]
+            summary = (await self.summarizer(agent, summary_prompt(previous_summary, messages))).strip()
+            outcome = "discarded"
+            for _ in range(_MAX_WRITE_ATTEMPTS):
+                if self.backend is not None:
+                    await self._refresh(conversation_id)
+                async with self._lock:
+                    record = self._records.get(conversation_id)
+                    # Only fold if the window still starts with the turns that were summarized.
+                    if not summary or record is None or record.window[: len(folded)] != folded:
+                        return
+                    window = record.window[len(folded) :]
+                    update = _Update(
+                        fields={
+                            "window": window,
+                            "summary": summary,
+                            "summary_tokens": token_count(SUMMARY_PREFIX + summary),
+                            "summarized_turns": record.summarized_turns + len(folded),
+                        }
+                    )
+                    self._plan_reset(update, record.generation, summary, window)
+                    if self.backend is None:
+                        self._apply(conversation_id, record, update, record.version + 1)
+                        outcome = "ok"
+                        return
+                    expected = record.version
+                    header = self._header(record, update)
+                try:
+                    new_version = await self._write(conversation_id, expected, header, update)
+                except VersionConflict:
+                    CONVERSATION_BACKEND_CONFLICTS.inc()
+                    continue
+                async with self._lock:
+                    record = self._records.get(conversation_id)
+                    if record is not None and record.version == expected:
+                        self._apply(conversation_id, record, update, new_version)
+                outcome = "ok"
+                return
+        finally:
+            CONVERSATION_SUMMARIES.inc(outcome)
+            record = self._records.get(conversation_id)
+            if record is not None:
+                record.summarizing = False
+
+    def _drop(self, conversation_id: str) -> None:
+        self._records.pop(conversation_id, None)
+        self._live.pop(conversation_id, None)
+
+    def _evict_live(self) -> None:
+        while len(self._live) > self.max_live_threads:
+            conversation_id, _ = self._live.popitem(last=False)
+            if self.backend is not None:
+                # The backend holds the state; only the cache entry goes.
+                self._records.pop(conversation_id, None)
+                continue
+            record = self._records.get(conversation_id)
+            if record is not None:
+                record.live_thread = None
+                record.live_agent = None
+
+
+def turn_messages(user_text: str, assistant_text: str) -> list[dict[str, str]]:
+    return [{"role": "user", "text": user_text}, {"role": "assistant", "text": assistant_text}]
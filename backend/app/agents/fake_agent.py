@@ -0,0 +1,139 @@
+"""Offline stand-in for the agent-framework agent, used for tests and load benchmarks.
+
+It implements the subset of the agent/thread API the routes use (`run`, `run_stream`,
+`get_new_thread`, `deserialize_thread`, `thread.serialize`) with configurable latency,
+token rate and synthetic history size, so server overhead can be measured without Azure.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator
+
+from app.core.settings import env_float
+
+
+@dataclass(frozen=True)
+class FakeAgentConfig:
+    # Delay before the first output token (models queueing + prompt processing).
+    latency_ms: float = 0.0
+    # Output token rate; 0 disables per-token delays.
+    tokens_per_second: float = 0.0
+    output_tokens: int = 16
+    # Synthetic messages pre-filled into every new thread (models long conversations).
+    history_size: int = 0
+    model_name: str = "fake-agent"
+
+    @classmethod
+    def from_env(cls) -> "FakeAgentConfig":
+        return cls(
+            latency_ms=env_float("FAKE_AGENT_LATENCY_MS", 0.0),
+            tokens_per_second=env_float("FAKE_AGENT_TOKENS_PER_SEC", 0.0),
+            output_tokens=int(env_float("FAKE_AGENT_OUTPUT_TOKENS", 16)),
+            history_size=int(env_float("FAKE_AGENT_HISTORY_SIZE", 0)),
+        )
+
+
+def _message_role(message: Any) -> str:
+    if isinstance(message, dict):
+        role = message.get("role")
+    else:
+        role = getattr(message, "role", None)
+    role = getattr(role, "value", role)
+    return str(role or "user")
+
+
+def _message_text(message: Any) -> str:
+    if isinstance(message, dict):
+        return str(message.get("text") or "")
+    return str(getattr(message, "text", "") or "")
+
+
+@dataclass
+class FakeThread:
+    messages: list[dict[str, str]] = field(default_factory=list)
+
+    def serialize(self) -> dict[str, Any]:
+        return {"messages": [dict(m) for m in self.messages]}
+
+    async def on_new_messages(self, new_messages: Any) -> None:
+        if not isinstance(new_messages, (list, tuple)):
+            new_messages = [new_messages]
+        for message in new_messages:
+            self.messages.append({"role": _message_role(message), "text": _message_text(message)})
+
+
+@dataclass(frozen=True)
+class FakeRunResult:
+    text: str
+    usage: dict[str, int]
+    model: str
+
+
+@dataclass(frozen=True)
+class FakeUpdate:
+    text: str = ""
+    usage: dict[str, int] | None = None
+    model: str | None = None
+
+
+class FakeAgent:
+    def __init__(self, config: FakeAgentConfig | None = None) -> None:
+        self.config = config or FakeAgentConfig()
+
+    def get_new_thread(self) -> FakeThread:
+        history = [
+            {"role": "user" if i % 2 == 0 else "assistant", "text": f"synthetic history message {i}"}
+            for i in range(self.config.history_size)
+        ]
+        return FakeThread(messages=history)
+
+    def deserialize_thread(self, serialized: dict[str, Any]) -> FakeThread:
+        messages = serialized.get("messages") if isinstance(serialized, dict) else None
+        return FakeThread(messages=[dict(m) for m in (messages or [])])
+
+    def _prompt_tokens(self, thread: FakeThread, message: str) -> int:
+        # Whole thread is "sent" every turn, like the real Responses client with local history.
+        return sum(len(m.get("text", "").split()) for m in thread.messages) + len(message.split())
+
+    def _output_words(self) -> list[str]:
+        return [f"tok{i}" for i in range(max(0, self.config.output_tokens))]
+
+    async def _sleep_latency(self) -> None:
+        if self.config.latency_ms > 0:
+            await asyncio.sleep(self.config.latency_ms / 1000.0)
+
+    def _usage(self, input_tokens: int) -> dict[str, int]:
+        output_tokens = max(0, self.config.output_tokens)
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+    async def run(self, message: str, *, thread: FakeThread | None = None) -> FakeRunResult:
+        thread = thread if thread is not None else self.get_new_thread()
+        input_tokens = self._prompt_tokens(thread, message)
+        await self._sleep_latency()
+        words = self._output_words()
+        if self.config.tokens_per_second > 0 and words:
+            await asyncio.sleep(len(words) / self.config.tokens_per_second)
+        text = " ".join(words)
+        thread.messages.append({"role": "user", "text": message})
+        thread.messages.append({"role": "assistant", "text": text})
+        return FakeRunResult(text=text, usage=self._usage(input_tokens), model=self.config.model_name)
+
+    async def run_stream(self, message: str, *, thread: FakeThread | None = None) -> AsyncIterator[FakeUpdate]:
+        thread = thread if thread is not None else self.get_new_thread()
+        input_tokens = self._prompt_tokens(thread, message)
+        await self._sleep_latency()
+        delay = 1.0 / self.config.tokens_per_second if self.config.tokens_per_second > 0 else 0.0
+        words = self._output_words()
+        for idx, word in enumerate(words):
+            if delay:
+                await asyncio.sleep(delay)
+            yield FakeUpdate(text=word if idx == 0 else f" {word}")
+        thread.messages.append({"role": "user", "text": message})
+        thread.messages.append({"role": "assistant", "text": " ".join(words)})
+        yield FakeUpdate(usage=self._usage(input_tokens), model=self.config.model_name)
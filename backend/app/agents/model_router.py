@@ -0,0 +1,205 @@
+"""Prompt-size routing: send short, simple turns to a small/fast profile and the rest to a large one.
+
+Enabled by naming the small profile (profiles come from `AGENT_PROFILES`, see
+`app.agents.agent_pool`):
+
+- `AGENT_ROUTE_SMALL_PROFILE`: profile for short turns (routing is off when unset)
+- `AGENT_ROUTE_LARGE_PROFILE`: profile for everything else (default `default`)
+- `AGENT_ROUTE_SMALL_MAX_TOKENS` (default 1000): estimated prompt tokens (message + the
+  previous turn's prompt and answer, i.e. the history resent with it) allowed on the small route
+- `AGENT_ROUTE_SMALL_MAX_TURNS` (default 8): conversations with more turns go large
+
+A conversation that has been routed large stays large, so it does not flip between deployments
+(and rebuild its thread) as turn sizes vary. Requests naming a `profile` are not routed.
+
+Routed turns are recorded in the usage DB as `<route>:<model>` (e.g. `small:gpt-4o-mini`).
+Per-route latency and token stats are kept in memory for `GET /api/agent/routing` and exported
+as metrics, to tune the thresholds.
+
+The rules are read from the settings snapshot (`app.core.settings`) on first use and again
+after a settings reload that changed anything.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any
+
+from app.core.metrics import AGENT_ROUTE_DECISIONS, AGENT_ROUTE_SECONDS, AGENT_ROUTE_TOKENS
+from app.core.settings import Settings, get_settings, on_reload
+
+_STICKY_SIZE = 10_000
+_LATENCY_WINDOW = 1000
+
+
+@dataclass(frozen=True)
+class RoutingRules:
+    small_profile: str = ""
+    large_profile: str = "default"
+    small_max_tokens: int = 1000
+    small_max_turns: int = 8
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.small_profile)
+
+    @classmethod
+    def from_settings(cls, config: Settings) -> "RoutingRules":
+        return cls(
+            small_profile=config.agent_route_small_profile,
+            large_profile=config.agent_route_large_profile,
+            small_max_tokens=config.agent_route_small_max_tokens,
+            small_max_turns=config.agent_route_small_max_turns,
+        )
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    # small | large (routed), explicit (request named a profile), default (routing off)
+    route: str
+    profile: str | None
+    reason: str
+    prompt_tokens: int
+    turns: int
+
+    @property
+    def routed(self) -> bool:
+        return self.route in ("small", "large")
+
+    def model_label(self, model_name: str | None) -> str | None:
+        """`model_name` as recorded in the usage DB: prefixed with the route when routed."""
+        if not self.routed:
+            return model_name
+        return f"{self.route}:{model_name or 'unknown'}"
+
+
+class _RouteStats:
+    __slots__ = ("calls", "errors", "latencies", "input_tokens", "output_tokens", "estimated_tokens")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.latencies: deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.estimated_tokens = 0
+
+    def report(self) -> dict[str, Any]:
+        ok = self.calls - self.errors
+        ordered = sorted(self.latencies)
+
+        def pct(q: float) -> float | None:
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "p50_ms": pct(0.5),
+            "p95_ms": pct(0.95),
+            "avg_input_tokens": round(self.input_tokens / ok, 1) if ok else None,
+            "avg_output_tokens": round(self.output_tokens / ok, 1) if ok else None,
+            "avg_estimated_prompt_tokens": round(self.estimated_tokens / ok, 1) if ok else None,
+        }
+
+
+class ModelRouter:
+    def __init__(self, rules: RoutingRules | None = None, *, sticky_size: int = _STICKY_SIZE) -> None:
+        # Rules passed in are fixed; otherwise they follow the settings snapshot.
+        self._fixed = rules is not None
+        self._rules = rules
+        self._lock = threading.Lock()
+        self._large: OrderedDict[str, None] = OrderedDict()
+        self._sticky_size = sticky_size
+        self._stats: dict[str, _RouteStats] = {}
+
+    @property
+    def rules(self) -> RoutingRules:
+        rules = self._rules
+        if rules is None:
+            rules = self._rules = RoutingRules.from_settings(get_settings())
+        return rules
+
+    def reset_rules(self) -> None:
+        """Re-read the rules from the settings on next use."""
+        if not self._fixed:
+            self._rules = None
+
+    def decide(
+        self,
+        *,
+        prompt_tokens: int,
+        turns: int,
+        conversation_id: str | None = None,
+        requested_profile: str | None = None,
+    ) -> RouteDecision:
+        rules = self.rules
+        if (requested_profile or "").strip():
+            decision = RouteDecision("explicit", requested_profile, "explicit", prompt_tokens, turns)
+        elif not rules.enabled:
+            decision = RouteDecision("default", None, "disabled", prompt_tokens, turns)
+        else:
+            with self._lock:
+                sticky = conversation_id is not None and conversation_id in self._large
+            if sticky:
+                reason = "sticky"
+            elif prompt_tokens > rules.small_max_tokens:
+                reason = "prompt_tokens"
+            elif turns >= rules.small_max_turns:
+                reason = "turns"
+            else:
+                reason = "short"
+            if reason == "short":
+                decision = RouteDecision("small", rules.small_profile, reason, prompt_tokens, turns)
+            else:
+                decision = RouteDecision("large", rules.large_profile, reason, prompt_tokens, turns)
+                if conversation_id:
+                    with self._lock:
+                        self._large[conversation_id] = None
+                        self._large.move_to_end(conversation_id)
+                        while len(self._large) > self._sticky_size:
+                            self._large.popitem(last=False)
+        AGENT_ROUTE_DECISIONS.inc(decision.route, decision.reason)
+        return decision
+
+    def observe(self, decision: RouteDecision, seconds: float, usage: dict[str, int] | None) -> None:
+        """Record a finished call; `usage` None means it failed."""
+        with self._lock:
+            stats = self._stats.setdefault(decision.route, _RouteStats())
+            stats.calls += 1
+            if usage is None:
+                stats.errors += 1
+                return
+            stats.latencies.append(seconds)
+            stats.input_tokens += int(usage.get("input_tokens", 0) or 0)
+            stats.output_tokens += int(usage.get("output_tokens", 0) or 0)
+            stats.estimated_tokens += decision.prompt_tokens
+        AGENT_ROUTE_SECONDS.observe(seconds, decision.route)
+        AGENT_ROUTE_TOKENS.inc(decision.route, "input", amount=float(usage.get("input_tokens", 0) or 0))
+        AGENT_ROUTE_TOKENS.inc(decision.route, "output", amount=float(usage.get("output_tokens", 0) or 0))
+
+    def report(self) -> dict[str, Any]:
+        with self._lock:
+            routes = {route: stats.report() for route, stats in sorted(self._stats.items())}
+        rules = self.rules
+        return {
+            "enabled": rules.enabled,
+            "rules": {
+                "small_profile": rules.small_profile or None,
+                "large_profile": rules.large_profile,
+                "small_max_tokens": rules.small_max_tokens,
+                "small_max_turns": rules.small_max_turns,
+            },
+            "routes": routes,
+        }
+
+
+MODEL_ROUTER = ModelRouter()
+
+
+@on_reload
+def _reset_routing_rules(old: Settings, new: Settings) -> None:
+    MODEL_ROUTER.reset_rules()
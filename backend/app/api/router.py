@@ -1,12 +1,21 @@
 from fastapi import APIRouter
 
+from app.api.routes.admin import router as admin_router
 from app.api.routes.agent import router as agent_router
 from app.api.routes.health import router as health_router
 from app.api.routes.hello import router as hello_router
-from app.api.routes.knowledge import router as knowledge_router
+from app.api.routes.metrics import router as metrics_router
+from app.api.routes.usage import router as usage_router
+from app.core.settings import get_settings
 
 api_router = APIRouter()
 api_router.include_router(health_router, tags=["health"])
 api_router.include_router(hello_router, tags=["hello"])
 api_router.include_router(agent_router, tags=["agent-framework"])
-api_router.include_router(knowledge_router, tags=["knowledge"])
+if get_settings().knowledge_enabled:
+    from app.api.routes.knowledge import router as knowledge_router
+
+    api_router.include_router(knowledge_router, tags=["knowledge"])
+api_router.include_router(usage_router, tags=["usage"])
+api_router.include_router(metrics_router, tags=["metrics"])
+api_router.include_router(admin_router, tags=["admin"])
@@ -0,0 +1,20 @@
+import hmac
+
+from fastapi import APIRouter, Header, HTTPException
+
+from app.core.settings import get_settings, reload_settings
+
+router = APIRouter()
+
+
+@router.post("/admin/reload")
+def reload_config(x_admin_token: str | None = Header(default=None)) -> dict:
+    """Re-read env files/environment into a new settings snapshot and rebuild dependent clients."""
+    token = get_settings().admin_token
+    if not token:
+        raise HTTPException(status_code=403, detail="admin endpoints are disabled; set ADMIN_TOKEN")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, token):
+        raise HTTPException(status_code=401, detail="invalid admin token")
+
+    _, changed = reload_settings()
+    return {"reloaded": True, "changed": changed}
@@ -1,29 +1,65 @@
 import asyncio
-import inspect
-import json
-import os
+import time
 import uuid
+from contextlib import AsyncExitStack
 from typing import Any
-import re
 from urllib.parse import urlparse
-from pathlib import Path
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from app.agents.af_client import create_azure_responses_agent
-from app.db.token_usage import record_turn_usage, list_turn_usage_page, count_turn_usage, list_conversations_page, count_conversations
+from app.agents.agent_pool import AGENT_POOLS, get_agent_pool
+from app.agents.batch import AGENT_BATCHES, BatchRun, batch_limits
+from app.agents.model_router import MODEL_ROUTER
+from app.agents.conversation_backend import backend_from_env
+from app.agents.conversation_store import ConversationStore, apply_usage, turn_messages
+from app.core.admission import AGENT_ADMISSION, AdmissionRejected, client_key, too_busy
+from app.core.fastjson import FastJSONResponse, dumps as json_dumps
+from app.core.singleflight import SingleFlight
+from app.core.metrics import (
+    AGENT_RUN_SECONDS,
+    AGENT_STREAM_TOKENS_PER_SECOND,
+    AGENT_STREAM_TTFD_SECONDS,
+    AGENT_STREAMS_IN_FLIGHT,
+    CONVERSATION_STORE_SIZE,
+)
+from app.core.settings import get_settings
+from app.core.timing import current_timing, phase
+from app.core.tokens import token_count as _token_count
+from app.db.token_usage import record_operation_usage, record_turn_usage, record_turn_usage_many, list_turn_usage_page, count_turn_usage, list_conversations_page, count_conversations
 
 router = APIRouter()
 
-_conversation_lock = asyncio.Lock()
-_conversation_threads: dict[str, dict[str, Any]] = {}
+
+async def _summarize_with_agent(agent, prompt: str) -> str:
+    # Fresh thread: the summary request must not land in any conversation's history.
+    async with AGENT_ADMISSION.slot("summarize", tokens=_token_count(prompt)) as slot:
+        result = await agent.run(prompt)
+    text = _extract_text(result)
+    usage = _extract_usage(result) or _compute_usage_from_texts(prompt, text)
+    model_name = _extract_model_name(result) or _fallback_model_name()
+    slot.settle(usage.get("total_tokens"))
+    try:
+        await asyncio.to_thread(record_operation_usage, "agent:summarize", usage, model_name)
+    except Exception:
+        # Best-effort; a missing stats row must not discard the summary.
+        pass
+    return text
+
+
+_usage_flight = SingleFlight("agent_usage")
+_conversations_flight = SingleFlight("agent_conversations")
+
+_conversations = ConversationStore(summarizer=_summarize_with_agent, backend=backend_from_env())
+CONVERSATION_STORE_SIZE.set_callback(lambda: len(_conversations))
 
 
 class AgentRunRequest(BaseModel):
     message: str
     conversation_id: str | None = None
+    # Agent profile (AGENT_PROFILES); default: "default".
+    profile: str | None = None
 
 
 class AgentRunResponse(BaseModel):
@@ -34,27 +70,8 @@ class AgentRunResponse(BaseModel):
 
 @router.get("/agent/info")
 def agent_info() -> dict:
-    # Load local env files (dev convenience), matching agent client behavior.
-    # Priority:
-    # 1) config/azure_openai.env
-    # 2) .env
-    try:
-        from dotenv import load_dotenv  # type: ignore
-
-        project_root = Path(__file__).resolve().parents[4]
-        load_dotenv(dotenv_path=project_root / "config" / "azure_openai.env", override=True)
-        load_dotenv(dotenv_path=project_root / ".env", override=True)
-    except Exception:
-        pass
-
-    endpoint = (os.getenv("AZURE_OPENAI_ENDPOINT") or "").strip()
-    deployment_name = (os.getenv("AZURE_OPENAI_RESPONSES_DEPLOYMENT_NAME") or "").strip()
-    embedding_deployment = (os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME") or "").strip()
-    api_version = (os.getenv("AZURE_OPENAI_API_VERSION") or "").strip()
-    tenant_id = (os.getenv("AZURE_TENANT_ID") or "").strip()
-
-    api_key_present = bool((os.getenv("AZURE_OPENAI_API_KEY") or "").strip())
-    auth_mode = "api_key" if api_key_present else "entra_id"
+    config = get_settings()
+    endpoint = config.azure_openai_endpoint
 
     endpoint_host = ""
     if endpoint:
@@ -65,23 +82,38 @@ def agent_info() -> dict:
             endpoint_host = endpoint
 
     return {
-        "deployment_name": deployment_name or None,
-        "embedding_deployment_name": embedding_deployment or None,
-        "api_version": api_version or None,
+        "deployment_name": config.responses_deployment_name or None,
+        "embedding_deployment_name": config.embedding_deployment_name or None,
+        "api_version": config.api_version or None,
         "endpoint": endpoint or None,
         "endpoint_host": endpoint_host or None,
-        "auth_mode": auth_mode,
-        "tenant_id": tenant_id or None,
+        "auth_mode": config.auth_mode,
+        "tenant_id": config.tenant_id or None,
     }
 
 
 
+@router.get("/agent/profiles")
+def agent_profiles() -> dict:
+    """Agent profiles with per-deployment load and health (cooldown after throttling/failures)."""
+    try:
+        return {"items": AGENT_POOLS.snapshot()}
+    except RuntimeError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.get("/agent/routing")
+def agent_routing() -> dict:
+    """Prompt-size routing rules and per-route latency/token stats (for tuning the thresholds)."""
+    return MODEL_ROUTER.report()
+
+
 @router.get("/agent/usage")
-def agent_usage(
+async def agent_usage(
     conversation_id: str,
     page: int = 1,
     page_size: int = 20,
-) -> dict:
+) -> FastJSONResponse:
     conv_id = (conversation_id or "").strip()
     if not conv_id:
         raise HTTPException(status_code=400, detail="conversation_id is required")
@@ -90,9 +122,11 @@ def agent_usage(
     if page_size < 1 or page_size > 200:
         raise HTTPException(status_code=400, detail="page_size must be between 1 and 200")
 
-    total = count_turn_usage(conv_id)
     offset = (page - 1) * page_size
-    rows = list_turn_usage_page(conv_id, limit=page_size, offset=offset)
+    total, rows = await _usage_flight.run(
+        (conv_id, page_size, offset),
+        lambda: (count_turn_usage(conv_id), list_turn_usage_page(conv_id, limit=page_size, offset=offset)),
+    )
 
     items = [
         {
@@ -106,29 +140,33 @@ def agent_usage(
         for r in rows
     ]
 
-    return {
-        "conversation_id": conv_id,
-        "page": page,
-        "page_size": page_size,
-        "total": total,
-        "items": items,
-    }
+    return FastJSONResponse(
+        {
+            "conversation_id": conv_id,
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "items": items,
+        }
+    )
 
 
 
 @router.get("/agent/conversations")
-def agent_conversations(
+async def agent_conversations(
     page: int = 1,
     page_size: int = 20,
-) -> dict:
+) -> FastJSONResponse:
     if page < 1:
         raise HTTPException(status_code=400, detail="page must be >= 1")
     if page_size < 1 or page_size > 200:
         raise HTTPException(status_code=400, detail="page_size must be between 1 and 200")
 
-    total = count_conversations()
     offset = (page - 1) * page_size
-    rows = list_conversations_page(limit=page_size, offset=offset)
+    total, rows = await _conversations_flight.run(
+        (page_size, offset),
+        lambda: (count_conversations(), list_conversations_page(limit=page_size, offset=offset)),
+    )
 
     items = [
         {
@@ -140,17 +178,43 @@ def agent_conversations(
         for r in rows
     ]
 
-    return {
-        "page": page,
-        "page_size": page_size,
-        "total": total,
-        "items": items,
-    }
+    return FastJSONResponse(
+        {
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "items": items,
+        }
+    )
+
+
+
+def _estimate_tokens(message: str, stats: dict) -> int:
+    # The previous turn's prompt plus its answer is roughly the history resent with this turn.
+    last = stats.get("last") or {}
+    history = int(last.get("input_tokens", 0) or 0) + int(last.get("output_tokens", 0) or 0)
+    return history + _token_count(message)
+
 
+def _cached_stats(conversation_id: str) -> dict:
+    # The locally cached stats are enough to size the prompt; checkout needs the chosen agent
+    # and, taken before admission, would hold the live thread while the request queues.
+    record = _conversations.get(conversation_id)
+    return record.stats if record is not None else {}
+
+
+def _route(payload: "AgentRunRequest", conversation_id: str):
+    stats = _cached_stats(conversation_id)
+    return MODEL_ROUTER.decide(
+        prompt_tokens=_estimate_tokens(payload.message, stats),
+        turns=int(stats.get("turns", 0) or 0),
+        conversation_id=conversation_id,
+        requested_profile=payload.profile,
+    )
 
 
 def _sse(event: str, data) -> str:
-    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return f"event: {event}\ndata: {json_dumps(data)}\n\n"
 
 
 def _as_int(value) -> int | None:
@@ -245,44 +309,10 @@ def _extract_model_name(obj) -> str | None:
     return None
 
 
-def _fallback_model_name() -> str | None:
-    return (os.getenv("AZURE_OPENAI_RESPONSES_DEPLOYMENT_NAME") or "").strip() or None
-
-
-_CJK_RE = re.compile(r"[\u4e00-\u9fff]")
-_WORD_RE = re.compile(r"[A-Za-z0-9_]+")
-
-
-def _token_count_fallback(text: str) -> int:
-    text = (text or "").strip()
-    if not text:
-        return 0
-
-    # Rough but stable: count CJK chars + word-ish chunks + remaining punctuation.
-    cjk = len(_CJK_RE.findall(text))
-    words = len(_WORD_RE.findall(text))
-    # Remaining non-space chars excluding counted word chars.
-    stripped = re.sub(_WORD_RE, "", text)
-    rest = sum(1 for ch in stripped if not ch.isspace())
-    return max(1, cjk + words + rest)
-
-
-def _token_count(text: str) -> int:
-    text = text or ""
-    if not text.strip():
-        return 0
-
-    # Prefer tiktoken if available (more accurate), otherwise fallback.
-    try:
-        import tiktoken  # type: ignore
-
-        try:
-            enc = tiktoken.get_encoding("o200k_base")
-        except Exception:
-            enc = tiktoken.get_encoding("cl100k_base")
-        return len(enc.encode(text))
-    except Exception:
-        return _token_count_fallback(text)
+def _fallback_model_name(lease=None) -> str | None:
+    if lease is not None and lease.model_name:
+        return lease.model_name
+    return get_settings().responses_deployment_name or None
 
 
 def _compute_usage_from_texts(input_text: str, output_text: str) -> dict[str, int]:
@@ -295,42 +325,6 @@ def _compute_usage_from_texts(input_text: str, output_text: str) -> dict[str, in
     }
 
 
-def _get_stats(record: dict[str, Any] | None) -> dict[str, Any]:
-    if not record:
-        return {
-            "turns": 0,
-            "total": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0},
-            "last": None,
-        }
-    stats = record.get("stats")
-    if isinstance(stats, dict):
-        return stats
-    return {
-        "turns": 0,
-        "total": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0},
-        "last": None,
-    }
-
-
-def _apply_usage(stats: dict[str, Any], usage: dict[str, int] | None) -> dict[str, Any]:
-    if not usage:
-        stats["last"] = None
-        return stats
-
-    total = stats.get("total")
-    if not isinstance(total, dict):
-        total = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
-
-    for key in ("input_tokens", "output_tokens", "total_tokens"):
-        if key in usage:
-            total[key] = int(total.get(key, 0)) + int(usage[key])
-
-    stats["total"] = total
-    stats["last"] = usage
-    stats["turns"] = int(stats.get("turns", 0)) + 1
-    return stats
-
-
 def _extract_text(result) -> str:
     if result is None:
         return ""
@@ -427,60 +421,73 @@ def _extract_delta(update) -> str:
     return find_text(obj)
 
 
-@router.post("/agent/run", response_model=AgentRunResponse)
-async def run_agent(payload: AgentRunRequest) -> AgentRunResponse:
-    try:
-        agent = create_azure_responses_agent()
-
-        conversation_id = (payload.conversation_id or "").strip() or str(uuid.uuid4())
-
-        async with _conversation_lock:
-            record = _conversation_threads.get(conversation_id)
-
-        serialized_thread = None
-        stats = _get_stats(record if isinstance(record, dict) else None)
-        if isinstance(record, dict):
-            serialized_thread = record.get("thread")
-            # Back-compat: older values stored the thread dict directly
-            if serialized_thread is None and "thread" not in record:
-                serialized_thread = record
-
-        if isinstance(serialized_thread, dict):
-            thread = agent.deserialize_thread(serialized_thread)
-            if inspect.isawaitable(thread):
-                thread = await thread
-        else:
-            thread = agent.get_new_thread()
-            if inspect.isawaitable(thread):
-                thread = await thread
-
-        result = await agent.run(payload.message, thread=thread)
-
-        output_text = _extract_text(result)
-        usage = _extract_usage(result) or _compute_usage_from_texts(payload.message, output_text)
-        model_name = _extract_model_name(result) or _fallback_model_name()
-        stats = _apply_usage(stats, usage)
+async def _run_turn(payload: AgentRunRequest, key: str, *, record_usage: bool = True) -> tuple[AgentRunResponse, tuple]:
+    """One non-streaming turn; returns the response and its usage row.
 
+    With `record_usage=False` the caller persists the returned
+    `(conversation_id, turn_index, usage, model_name)` row itself (bulk runs write them together).
+    """
+    conversation_id = (payload.conversation_id or "").strip() or str(uuid.uuid4())
+    with phase("agent_init"):
+        decision = _route(payload, conversation_id)
+        lease = get_agent_pool(decision.profile).pick(conversation_id)
+        agent = lease.agent
+
+    tokens = _estimate_tokens(payload.message, _cached_stats(conversation_id))
+    async with AGENT_ADMISSION.slot(key, tokens=tokens) as slot:
+        checked_out = await _conversations.checkout(conversation_id, agent)
+        thread = checked_out.thread
+        stats = checked_out.stats
+        run_start = time.perf_counter()
+        outcome = "error"
         try:
-            await asyncio.to_thread(
-                record_turn_usage,
-                conversation_id,
-                int(stats.get("turns", 0)),
-                usage,
-                model_name,
-            )
+            with phase("agent_run"), lease:
+                result = await agent.run(payload.message, thread=thread)
+            outcome = "ok"
+        finally:
+            run_seconds = time.perf_counter() - run_start
+            AGENT_RUN_SECONDS.observe(run_seconds, "run", outcome)
+            if outcome != "ok":
+                MODEL_ROUTER.observe(decision, run_seconds, None)
+
+    output_text = _extract_text(result)
+    usage = _extract_usage(result) or _compute_usage_from_texts(payload.message, output_text)
+    model_name = decision.model_label(_extract_model_name(result) or _fallback_model_name(lease))
+    MODEL_ROUTER.observe(decision, run_seconds, usage)
+    slot.settle(usage.get("total_tokens"))
+    stats = apply_usage(stats, usage)
+    usage_row = (conversation_id, int(stats.get("turns", 0)), usage, model_name)
+
+    if record_usage:
+        try:
+            with phase("usage_write"):
+                await asyncio.to_thread(record_turn_usage, *usage_row)
         except Exception:
             # Best-effort persistence; do not fail the request if DB is unavailable.
             pass
 
-        serialized = thread.serialize()
-        if inspect.isawaitable(serialized):
-            serialized = await serialized
+    await _conversations.commit(
+        conversation_id,
+        agent,
+        thread,
+        stats,
+        turn_messages(payload.message, output_text),
+        generation=checked_out.generation,
+        version=checked_out.version,
+        usage=usage,
+    )
+
+    return AgentRunResponse(output=output_text, conversation_id=conversation_id, stats=stats), usage_row
 
-        async with _conversation_lock:
-            _conversation_threads[conversation_id] = {"thread": serialized, "stats": stats}
 
-        return AgentRunResponse(output=output_text, conversation_id=conversation_id, stats=stats)
+@router.post("/agent/run", response_model=AgentRunResponse)
+async def run_agent(payload: AgentRunRequest, request: Request) -> AgentRunResponse:
+    try:
+        AGENT_ADMISSION.check()
+        response, _ = await _run_turn(payload, client_key(request))
+        return response
+    except AdmissionRejected as exc:
+        raise too_busy(exc) from exc
     except ImportError as exc:
         raise HTTPException(
             status_code=500,
@@ -495,52 +502,153 @@ async def run_agent(payload: AgentRunRequest) -> AgentRunResponse:
         raise HTTPException(status_code=500, detail=f"Agent error: {exc}") from exc
 
 
+class AgentBatchItem(BaseModel):
+    message: str
+    conversation_id: str | None = None
+
+
+class AgentBatchRequest(BaseModel):
+    items: list[AgentBatchItem]
+    # Concurrent turns; default AGENT_BATCH_CONCURRENCY, capped at AGENT_BATCH_MAX_CONCURRENCY.
+    concurrency: int | None = None
+    profile: str | None = None
+
+
+@router.post("/agent/batch")
+async def batch_agent(payload: AgentBatchRequest, request: Request):
+    """Run many turns and stream results as NDJSON, one line per item in completion order.
+
+    Lines:
+      - { batch_id, items, concurrency }  (first)
+      - { index, conversation_id, status: "ok", output, stats }
+      - { index, conversation_id, status: "error" | "skipped" | "cancelled", error?, retry_after? }
+      - { batch_id, done: true, cancelled, counts, usage_recorded }  (last)
+
+    Items with the same `conversation_id` run in order; usage rows are written in bulk at the end.
+    Cancel with `POST /api/agent/batch/{batch_id}/cancel` or by closing the connection.
+    """
+    default_concurrency, max_concurrency, max_items = batch_limits()
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="items must not be empty")
+    if len(payload.items) > max_items:
+        raise HTTPException(status_code=400, detail=f"at most {max_items} items per batch")
+    concurrency = payload.concurrency or default_concurrency
+    if concurrency < 1 or concurrency > max_concurrency:
+        raise HTTPException(status_code=400, detail=f"concurrency must be between 1 and {max_concurrency}")
+    try:
+        AGENT_ADMISSION.check()
+        get_agent_pool(payload.profile)
+    except AdmissionRejected as exc:
+        raise too_busy(exc) from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    key = f"batch:{client_key(request)}"
+
+    async def run_turn(index: int, message: str, conversation_id: str):
+        response, usage_row = await _run_turn(
+            AgentRunRequest(message=message, conversation_id=conversation_id, profile=payload.profile),
+            key,
+            record_usage=False,
+        )
+        return {"output": response.output, "stats": response.stats}, usage_row
+
+    async def persist(rows) -> None:
+        await asyncio.to_thread(record_turn_usage_many, rows)
+
+    run = AGENT_BATCHES.start(
+        BatchRun(
+            [(item.message, item.conversation_id) for item in payload.items],
+            run_turn,
+            persist,
+            concurrency=concurrency,
+        )
+    )
+
+    async def lines():
+        try:
+            yield json_dumps({"batch_id": run.id, "items": len(run.items), "concurrency": run.concurrency}) + "\n"
+            async for result in run.results():
+                yield json_dumps(result) + "\n"
+        finally:
+            # Client went away: stop the batch; finished turns are still recorded.
+            run.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+
+@router.post("/agent/batch/{batch_id}/cancel")
+def cancel_batch(batch_id: str) -> dict:
+    if not AGENT_BATCHES.cancel(batch_id):
+        raise HTTPException(status_code=404, detail="Unknown or finished batch")
+    return {"batch_id": batch_id, "cancelled": True}
+
+
 @router.post("/agent/stream")
-async def stream_agent(payload: AgentRunRequest):
+async def stream_agent(payload: AgentRunRequest, request: Request):
     """Stream assistant output as Server-Sent Events (SSE).
 
     Event types:
       - meta: { conversation_id }
       - delta: { delta }
+      - stats: { turns, total, last }
+      - timing: { total_ms, phases }  (Server-Timing equivalent; headers are sent before the stream)
       - done: { conversation_id }
-      - error: { message }
+      - error: { message, retry_after? }
+
+    A full admission queue is rejected up front with 429; a call that then times out waiting
+    for admission ends with an `error` event carrying `retry_after`.
     """
 
     try:
-        agent = create_azure_responses_agent()
-
+        AGENT_ADMISSION.check()
         conversation_id = (payload.conversation_id or "").strip() or str(uuid.uuid4())
+        with phase("agent_init"):
+            decision = _route(payload, conversation_id)
+            lease = get_agent_pool(decision.profile).pick(conversation_id)
+            agent = lease.agent
 
-        async with _conversation_lock:
-            record = _conversation_threads.get(conversation_id)
-
-        serialized_thread = None
-        stats = _get_stats(record if isinstance(record, dict) else None)
-        if isinstance(record, dict):
-            serialized_thread = record.get("thread")
-            if serialized_thread is None and "thread" not in record:
-                serialized_thread = record
-
-        if isinstance(serialized_thread, dict):
-            thread = agent.deserialize_thread(serialized_thread)
-            if inspect.isawaitable(thread):
-                thread = await thread
-        else:
-            thread = agent.get_new_thread()
-            if inspect.isawaitable(thread):
-                thread = await thread
+        cached_stats = _cached_stats(conversation_id)
+        key = client_key(request)
 
         async def event_generator():
-            yield _sse("meta", {"conversation_id": conversation_id, "stats": stats})
+            yield _sse("meta", {"conversation_id": conversation_id, "stats": cached_stats})
 
+            admission = AsyncExitStack()
+            try:
+                slot = await admission.enter_async_context(
+                    AGENT_ADMISSION.slot(key, tokens=_estimate_tokens(payload.message, cached_stats))
+                )
+            except AdmissionRejected as exc:
+                yield _sse("error", {"message": str(exc), "retry_after": exc.retry_after})
+                return
+            try:
+                checked_out = await _conversations.checkout(conversation_id, agent)
+            except Exception as exc:
+                await admission.aclose()
+                yield _sse("error", {"message": f"Agent error: {exc}"})
+                return
+            thread = checked_out.thread
+            stats = checked_out.stats
+
+            AGENT_STREAMS_IN_FLIGHT.inc()
+            lease.begin()
+            run_start = time.perf_counter()
+            first_delta_at: float | None = None
+            outcome = "error"
             try:
                 last_usage: dict[str, int] | None = None
                 last_model_name: str | None = None
                 output_acc = ""
+                timing = current_timing()
+                stream_phase_start = time.perf_counter()
                 if hasattr(agent, "run_stream"):
                     async for update in agent.run_stream(payload.message, thread=thread):
                         delta = _extract_delta(update)
                         if delta:
+                            if first_delta_at is None:
+                                first_delta_at = time.perf_counter()
+                                AGENT_STREAM_TTFD_SECONDS.observe(first_delta_at - run_start)
                             output_acc += delta
                             yield _sse("delta", {"delta": delta})
 
@@ -560,34 +668,64 @@ async def stream_agent(payload: AgentRunRequest):
                     last_usage = _extract_usage(result)
                     last_model_name = _extract_model_name(result)
 
+                run_seconds = time.perf_counter() - run_start
+                # The upstream call is over; let the next caller in before persisting.
+                lease.end()
+                await admission.aclose()
+                if timing is not None:
+                    # Not a `with phase(...)` block: the generator yields inside the loop.
+                    timing.add("agent_stream", time.perf_counter() - stream_phase_start)
+                outcome = "ok"
+                AGENT_RUN_SECONDS.observe(run_seconds, "stream", outcome)
+
                 usage = last_usage or _compute_usage_from_texts(payload.message, output_acc)
-                model_name = last_model_name or _fallback_model_name()
-                stats_updated = _apply_usage(stats, usage)
+                model_name = decision.model_label(last_model_name or _fallback_model_name(lease))
+                MODEL_ROUTER.observe(decision, run_seconds, usage)
+                slot.settle(usage.get("total_tokens"))
+                stats_updated = apply_usage(stats, usage)
+                if run_seconds > 0 and usage.get("output_tokens"):
+                    AGENT_STREAM_TOKENS_PER_SECOND.observe(usage["output_tokens"] / run_seconds)
 
                 try:
-                    await asyncio.to_thread(
-                        record_turn_usage,
-                        conversation_id,
-                        int(stats_updated.get("turns", 0)),
-                        usage,
-                        model_name,
-                    )
+                    with phase("usage_write"):
+                        await asyncio.to_thread(
+                            record_turn_usage,
+                            conversation_id,
+                            int(stats_updated.get("turns", 0)),
+                            usage,
+                            model_name,
+                        )
                 except Exception:
                     # Best-effort persistence; do not break streaming if DB is unavailable.
                     pass
 
-                serialized = thread.serialize()
-                if inspect.isawaitable(serialized):
-                    serialized = await serialized
-
-                async with _conversation_lock:
-                    _conversation_threads[conversation_id] = {"thread": serialized, "stats": stats_updated}
+                await _conversations.commit(
+                    conversation_id,
+                    agent,
+                    thread,
+                    stats_updated,
+                    turn_messages(payload.message, output_acc),
+                    generation=checked_out.generation,
+                    version=checked_out.version,
+                    usage=usage,
+                )
 
                 yield _sse("stats", stats_updated)
+                if timing is not None:
+                    yield _sse("timing", timing.snapshot())
 
                 yield _sse("done", {"conversation_id": conversation_id})
             except Exception as exc:
+                lease.end(exc)
                 yield _sse("error", {"message": f"Agent error: {exc}"})
+            finally:
+                # Still open only if the client went away mid-stream.
+                lease.end(asyncio.CancelledError())
+                await admission.aclose()
+                if outcome != "ok":
+                    AGENT_RUN_SECONDS.observe(time.perf_counter() - run_start, "stream", outcome)
+                    MODEL_ROUTER.observe(decision, time.perf_counter() - run_start, None)
+                AGENT_STREAMS_IN_FLIGHT.dec()
 
         return StreamingResponse(
             event_generator(),
@@ -598,6 +736,8 @@ async def stream_agent(payload: AgentRunRequest):
                 "X-Accel-Buffering": "no",
             },
         )
+    except AdmissionRejected as exc:
+        raise too_busy(exc) from exc
     except ImportError as exc:
         raise HTTPException(
             status_code=500,
@@ -1,8 +1,17 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
 
 router = APIRouter()
 
 
 @router.get("/health")
-def health() -> dict:
-    return {"status": "ok"}
+def health(request: Request, ready: bool = False):
+    """Liveness by default; with `?ready=1`, readiness (503 until startup warm-up has finished)."""
+    if not ready:
+        return {"status": "ok"}
+
+    warmup = getattr(request.app.state, "warmup", None)
+    report = warmup.report() if warmup is not None else None
+    if warmup is None or not warmup.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up", "warmup": report})
+    return {"status": "ready", "warmup": report}
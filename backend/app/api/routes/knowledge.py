@@ -1,15 +1,28 @@
 from __future__ import annotations
 
+import asyncio
 import inspect
 from typing import Any
 
-from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi import APIRouter, File, HTTPException, Request, UploadFile
 from pydantic import BaseModel
 
-from app.agents.af_client import create_azure_responses_agent
+from app.agents.agent_pool import get_agent_pool
+from app.core.admission import AGENT_ADMISSION, AdmissionRejected, client_key, too_busy
+from app.core.fastjson import FastJSONResponse
+from app.core.resilience import CircuitOpen, unavailable
+from app.core.settings import env_float, env_int
+from app.core.singleflight import SingleFlight
+from app.core.timing import phase
+from app.core.tokens import token_count
+from app.db.token_usage import list_operation_usage
+from app.knowledge.context import format_passage, pack_context
 from app.knowledge.store import (
+    delete_upload,
     index_file,
+    knowledge_base_name,
     knowledge_stats,
+    list_knowledge_bases,
     list_uploads,
     query_knowledge,
     save_upload,
@@ -20,83 +33,148 @@ from app.knowledge.store import (
 
 router = APIRouter()
 
+# Identical concurrent requests (dashboard reloads, a popular question) share one computation.
+_query_flight = SingleFlight("knowledge_query")
+_stats_flight = SingleFlight("knowledge_stats")
+_uploads_flight = SingleFlight("knowledge_uploads")
+_usage_flight = SingleFlight("knowledge_usage")
+
 
 class KnowledgeQuery(BaseModel):
     question: str
+    # Knowledge bases to search (queried concurrently, hits merged by distance); default: ["default"].
+    knowledge_bases: list[str] | None = None
     top_k: int | None = 4
     use_llm: bool | None = True
+    max_context_tokens: int | None = None
+    max_distance: float | None = None
 
 
 class KnowledgeAnswer(BaseModel):
     answer: str
     sources: list[dict[str, Any]]
+    context: dict[str, Any] | None = None
+
+
+def _kb(name: str | None) -> str:
+    try:
+        return knowledge_base_name(name)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+def _unknown_kb(exc: KeyError) -> HTTPException:
+    return HTTPException(status_code=404, detail=f"Unknown knowledge base: {exc.args[0]}")
 
 
 @router.post("/knowledge/upload")
-async def upload_knowledge(file: UploadFile = File(...)) -> dict:
+async def upload_knowledge(file: UploadFile = File(...), kb: str | None = None) -> dict:
     if not file.filename:
         raise HTTPException(status_code=400, detail="filename is required")
+    kb = _kb(kb)
 
     suffix = file.filename.rsplit(".", 1)[-1].lower() if "." in file.filename else ""
     if suffix and f".{suffix}" not in supported_exts():
         raise HTTPException(status_code=400, detail=f"Unsupported file type: .{suffix}")
 
-    content = await file.read()
-    path = save_upload(file.filename, content)
-    info = index_file(path, source_name=file.filename)
-    write_upload_metadata(
-        path,
-        original_name=file.filename,
-        size_bytes=len(content),
-        chunks_indexed=int(info.get("chunks", 0)),
-        chunk_lengths=list(info.get("chunk_lengths") or []),
-    )
+    with phase("read_upload"):
+        content = await file.read()
+    with phase("save_upload"):
+        path = save_upload(file.filename, content, kb=kb)
+    try:
+        info = await asyncio.to_thread(index_file, path, source_name=file.filename, kb=kb)
+    except AdmissionRejected as exc:
+        raise too_busy(exc) from exc
+    except CircuitOpen as exc:
+        raise unavailable(exc) from exc
+    with phase("write_metadata"):
+        write_upload_metadata(
+            path,
+            original_name=file.filename,
+            size_bytes=len(content),
+            chunks_indexed=int(info.get("chunks", 0)),
+            chunk_lengths=list(info.get("chunk_lengths") or []),
+            content_hash=info.get("content_hash"),
+        )
 
     return {
         "file": file.filename,
+        "knowledge_base": kb,
         "stored_path": str(path),
         "chunks_indexed": info.get("chunks", 0),
         "supported_exts": sorted(supported_exts()),
-        "stats": knowledge_stats(),
+        "stats": knowledge_stats(kb),
     }
 
 
-def _build_prompt(question: str, contexts: list[dict[str, str]]) -> str:
+def _build_prompt(question: str, contexts: list[dict[str, Any]]) -> str:
     lines = ["你是一个基于知识库回答的助手。请只使用提供的上下文回答用户问题。"]
     for idx, ctx in enumerate(contexts, 1):
         source = ctx.get("source", "unknown")
         text = ctx.get("text", "")
-        lines.append(f"[{idx}] 来源:{source}\n{text}")
+        lines.append(format_passage(idx, source, text))
     lines.append(f"\n用户问题: {question}\n请用中文简洁回答，并引用相关来源编号。")
     return "\n\n".join(lines)
 
 
 @router.post("/knowledge/query", response_model=KnowledgeAnswer)
-async def knowledge_query(payload: KnowledgeQuery) -> KnowledgeAnswer:
+async def knowledge_query(payload: KnowledgeQuery, request: Request) -> KnowledgeAnswer:
     q = (payload.question or "").strip()
     if not q:
         raise HTTPException(status_code=400, detail="question is required")
 
+    top_k = payload.top_k or 4
+    kbs = tuple(sorted({_kb(name) for name in payload.knowledge_bases or [None]}))
     try:
-        chunks = query_knowledge(q, top_k=payload.top_k or 4)
+        with phase("retrieve"):
+            chunks = await _query_flight.run((q, top_k, kbs), query_knowledge, q, top_k=top_k, knowledge_bases=kbs)
+    except KeyError as exc:
+        raise _unknown_kb(exc) from exc
+    except AdmissionRejected as exc:
+        raise too_busy(exc) from exc
+    except CircuitOpen as exc:
+        raise unavailable(exc) from exc
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"query failed: {exc}") from exc
 
     if not chunks:
         return KnowledgeAnswer(answer="知识库中没有可用内容。", sources=[])
 
-    sources = [{"text": c.text, "source": c.source, "distance": c.distance} for c in chunks]
+    max_tokens = payload.max_context_tokens
+    if max_tokens is None:
+        max_tokens = env_int("KNOWLEDGE_CONTEXT_MAX_TOKENS", 3000)
+    max_distance = payload.max_distance
+    if max_distance is None:
+        max_distance = env_float("KNOWLEDGE_MAX_DISTANCE", None)
+    with phase("pack_context"):
+        packed = pack_context(
+            chunks,
+            max_tokens=max_tokens if max_tokens and max_tokens > 0 else None,
+            max_distance=max_distance,
+        )
+
+    # Source numbering matches the [n] markers in the prompt, so citations stay resolvable.
+    sources = [p.to_dict() for p in packed.passages]
+    context = packed.report()
+    if not sources:
+        return KnowledgeAnswer(answer="知识库中没有足够相关的内容。", sources=[], context=context)
     if payload.use_llm is False:
-        return KnowledgeAnswer(answer="(仅检索结果，未调用模型)", sources=sources)
+        return KnowledgeAnswer(answer="(仅检索结果，未调用模型)", sources=sources, context=context)
     prompt = _build_prompt(q, sources)
 
     try:
-        agent = create_azure_responses_agent()
-        thread = agent.get_new_thread()
-        if inspect.isawaitable(thread):
-            thread = await thread
-        result = await agent.run(prompt, thread=thread)
+        with phase("agent_init"):
+            lease = get_agent_pool().pick()
+            agent = lease.agent
+            thread = agent.get_new_thread()
+            if inspect.isawaitable(thread):
+                thread = await thread
+        async with AGENT_ADMISSION.slot(client_key(request), tokens=token_count(prompt)):
+            with phase("agent_run"), lease:
+                result = await agent.run(prompt, thread=thread)
         answer = getattr(result, "output_text", None) or getattr(result, "text", None) or str(result)
+    except AdmissionRejected as exc:
+        raise too_busy(exc) from exc
     except ImportError as exc:
         raise HTTPException(
             status_code=500,
@@ -108,14 +186,58 @@ async def knowledge_query(payload: KnowledgeQuery) -> KnowledgeAnswer:
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"agent error: {exc}") from exc
 
-    return KnowledgeAnswer(answer=answer, sources=sources)
+    return KnowledgeAnswer(answer=answer, sources=sources, context=context)
+
+
+@router.get("/knowledge/bases")
+async def knowledge_bases() -> dict:
+    return {"items": await _stats_flight.run("bases", list_knowledge_bases)}
 
 
 @router.get("/knowledge/stats")
-def knowledge_stats_endpoint() -> dict:
-    return knowledge_stats()
+async def knowledge_stats_endpoint(kb: str | None = None) -> dict:
+    kb = _kb(kb)
+    try:
+        return await _stats_flight.run(("stats", kb), knowledge_stats, kb)
+    except KeyError as exc:
+        raise _unknown_kb(exc) from exc
 
 
 @router.get("/knowledge/uploads")
-def knowledge_uploads() -> dict:
-    return {"items": list_uploads()}
+async def knowledge_uploads(kb: str | None = None) -> FastJSONResponse:
+    kb = _kb(kb)
+    # Per-file chunk_lengths make this the largest listing; encode it without validation.
+    return FastJSONResponse({"items": await _uploads_flight.run(("uploads", kb), list_uploads, kb)})
+
+
+@router.delete("/knowledge/uploads/{stored_name}")
+async def delete_knowledge_upload(stored_name: str, kb: str | None = None) -> dict:
+    """Remove an uploaded document: its vectors (by source id), the file and its metadata."""
+    kb = _kb(kb)
+    try:
+        result = await asyncio.to_thread(delete_upload, stored_name, kb=kb)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=f"Unknown upload: {stored_name}") from exc
+    return {**result, "knowledge_base": kb, "stats": knowledge_stats(kb)}
+
+
+@router.get("/knowledge/usage")
+async def knowledge_usage(limit: int = 168) -> FastJSONResponse:
+    if limit < 1 or limit > 2000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 2000")
+
+    rows = await _usage_flight.run(limit, list_operation_usage, "knowledge:query", limit=limit)
+    items = [
+        {
+            "operation": r.operation,
+            "model_name": r.model_name,
+            "bucket_start": r.bucket_start,
+            "calls": r.calls,
+            "input_tokens": r.input_tokens,
+            "output_tokens": r.output_tokens,
+            "total_tokens": r.total_tokens,
+            "last_created_at": r.last_created_at,
+        }
+        for r in rows
+    ]
+    return FastJSONResponse({"items": items})
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import csv
+import io
+from datetime import datetime, timezone
+from typing import Iterator
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.core.fastjson import FastJSONResponse, dumps as json_dumps
+from app.core.singleflight import SingleFlight
+from app.db.token_usage import (
+    EXPORT_COLUMNS,
+    ROLLUP_GRANULARITIES,
+    ROLLUP_GROUP_COLUMNS,
+    iter_turn_usage_export,
+    summarize_usage_buckets,
+)
+
+router = APIRouter()
+
+_summary_flight = SingleFlight("usage_summary")
+
+
+def _parse_ts(name: str, value: str | None) -> datetime | None:
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"{name} must be an ISO-8601 timestamp") from exc
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+def _parse_group_by(value: str | None) -> tuple[str, ...]:
+    cols: list[str] = []
+    for part in (value or "").split(","):
+        col = part.strip()
+        if not col:
+            continue
+        if col not in ROLLUP_GROUP_COLUMNS:
+            allowed = ", ".join(ROLLUP_GROUP_COLUMNS)
+            raise HTTPException(status_code=400, detail=f"group_by must be a subset of: {allowed}")
+        if col not in cols:
+            cols.append(col)
+    return tuple(cols)
+
+
+@router.get("/usage/summary")
+async def usage_summary(
+    from_: str | None = Query(None, alias="from"),
+    to: str | None = None,
+    granularity: str = "hour",
+    group_by: str | None = None,
+) -> FastJSONResponse:
+    if granularity not in ROLLUP_GRANULARITIES:
+        allowed = ", ".join(ROLLUP_GRANULARITIES)
+        raise HTTPException(status_code=400, detail=f"granularity must be one of: {allowed}")
+
+    start = _parse_ts("from", from_)
+    end = _parse_ts("to", to)
+    if start is not None and end is not None and end <= start:
+        raise HTTPException(status_code=400, detail="to must be later than from")
+    cols = _parse_group_by(group_by)
+
+    items = await _summary_flight.run(
+        (granularity, start, end, cols),
+        summarize_usage_buckets,
+        granularity=granularity,
+        start=start,
+        end=end,
+        group_by=cols,
+    )
+    return FastJSONResponse(
+        {
+            "granularity": granularity,
+            "from": start.isoformat() if start else None,
+            "to": end.isoformat() if end else None,
+            "group_by": list(cols),
+            "items": items,
+        }
+    )
+
+
+def _ndjson_chunks(batches: Iterator[list[tuple]]) -> Iterator[str]:
+    for rows in batches:
+        yield "".join(json_dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n" for row in rows)
+
+
+def _csv_chunks(batches: Iterator[list[tuple]]) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buf.getvalue()
+    for rows in batches:
+        buf.seek(0)
+        buf.truncate(0)
+        writer.writerows(rows)
+        yield buf.getvalue()
+
+
+@router.get("/usage/export")
+def usage_export(
+    format: str = "ndjson",
+    from_: str | None = Query(None, alias="from"),
+    to: str | None = None,
+    conversation_prefix: str | None = None,
+    after_id: int = 0,
+    limit: int | None = None,
+):
+    """Stream raw usage rows in id order as NDJSON or CSV.
+
+    Rows come straight from a SQLite cursor in fixed-size batches, so memory stays constant.
+    Every row carries its `id`; pass the last one back as `after_id` to resume an interrupted export.
+    """
+    fmt = (format or "").strip().lower()
+    if fmt not in {"ndjson", "csv"}:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    if after_id < 0:
+        raise HTTPException(status_code=400, detail="after_id must be >= 0")
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be >= 1")
+
+    start = _parse_ts("from", from_)
+    end = _parse_ts("to", to)
+    batches = iter_turn_usage_export(
+        start=start,
+        end=end,
+        conversation_prefix=(conversation_prefix or "").strip() or None,
+        after_id=after_id,
+        limit=limit,
+    )
+
+    if fmt == "csv":
+        return StreamingResponse(
+            _csv_chunks(batches),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="token_usage.csv"'},
+        )
+    return StreamingResponse(_ndjson_chunks(batches), media_type="application/x-ndjson")
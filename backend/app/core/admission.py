@@ -0,0 +1,326 @@
+"""Admission control in front of upstream model calls (agent runs and embeddings).
+
+    async with AGENT_ADMISSION.slot(client_key, tokens=estimate) as slot:
+        result = await agent.run(...)
+        slot.settle(actual_total_tokens)
+
+A call is admitted while fewer than `max_concurrent` calls are running and the token bucket
+(`tokens_per_minute`, refilled continuously, bursting up to 10 seconds' worth) covers its
+estimate. Otherwise it waits in a bounded queue. Waiters are served round-robin across keys
+(a client, or an operation such as ingestion vs. queries), so one busy key cannot starve the
+others. A full queue or a wait longer than `queue_timeout` raises `AdmissionRejected` with a
+`retry_after` hint; routes turn it into 429 + `Retry-After`.
+
+State sits behind a threading lock, so async callers on the event loop and sync callers in
+worker threads (embeddings) share one limit per process. Configuration per controller:
+`<PREFIX>_MAX_CONCURRENCY` (0 = unlimited), `<PREFIX>_TOKENS_PER_MINUTE` (0 = unlimited),
+`<PREFIX>_QUEUE_MAX`, `<PREFIX>_QUEUE_TIMEOUT_S`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Hashable, Iterator
+
+from fastapi import HTTPException, Request
+
+from app.core.metrics import (
+    ADMISSION_IN_FLIGHT,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_REJECTED,
+    ADMISSION_WAIT_SECONDS,
+)
+from app.core.settings import env_float, env_int
+
+# While the token bucket (not concurrency) is the constraint, waiters re-check it this often.
+_TOKEN_POLL_S = 0.1
+_BURST_SECONDS = 10.0
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, name: str, reason: str, retry_after: int) -> None:
+        super().__init__(f"{name} is overloaded ({reason}); retry after {retry_after}s")
+        self.name = name
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def too_busy(exc: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": str(exc.retry_after)})
+
+
+def client_key(request: Request) -> str:
+    """Fairness key for a request: `X-Client-Id` if the caller sends one, else its address."""
+    client_id = (request.headers.get("x-client-id") or "").strip()
+    if client_id:
+        return client_id
+    return request.client.host if request.client else "unknown"
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class _Waiter:
+    __slots__ = ("cost", "granted", "event", "loop", "future")
+
+    def __init__(self, cost: float, loop: asyncio.AbstractEventLoop | None) -> None:
+        self.cost = cost
+        self.granted = False
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def wake(self) -> None:
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+class Slot:
+    """An admitted call. `settle()` corrects the token bucket once the real usage is known."""
+
+    def __init__(self, controller: "AdmissionController", cost: float) -> None:
+        self._controller = controller
+        self.cost = cost
+        self.started = time.monotonic()
+
+    def settle(self, actual_tokens: int | None) -> None:
+        if actual_tokens is None or not self._controller.tokens_per_minute:
+            return
+        self._controller._charge(float(actual_tokens) - self.cost)
+        self.cost = float(actual_tokens)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_concurrent: int = 16,
+        tokens_per_minute: int = 0,
+        max_queue: int = 64,
+        queue_timeout: float = 30.0,
+    ) -> None:
+        self.name = name
+        self.max_concurrent: float = max_concurrent if max_concurrent > 0 else math.inf
+        self.tokens_per_minute = max(0, tokens_per_minute)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._rate = self.tokens_per_minute / 60.0
+        self._capacity = max(1.0, self._rate * _BURST_SECONDS) if self._rate else 0.0
+
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queues: OrderedDict[Hashable, deque[_Waiter]] = OrderedDict()
+        self._queued = 0
+        self._queued_cost = 0.0
+        self._bucket = self._capacity
+        self._bucket_at = time.monotonic()
+        # Smoothed slot hold time, for Retry-After estimates.
+        self._hold_seconds = 1.0
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, *, max_concurrent: int = 16) -> "AdmissionController":
+        return cls(
+            name,
+            max_concurrent=env_int(f"{prefix}_MAX_CONCURRENCY", max_concurrent),
+            tokens_per_minute=env_int(f"{prefix}_TOKENS_PER_MINUTE", 0),
+            max_queue=env_int(f"{prefix}_QUEUE_MAX", 64),
+            queue_timeout=env_float(f"{prefix}_QUEUE_TIMEOUT_S", 30.0),
+        )
+
+    def in_flight(self) -> int:
+        return self._active
+
+    def queued(self) -> int:
+        return self._queued
+
+    def check(self) -> None:
+        """Raise `AdmissionRejected` now if a new call would be turned away (e.g. before streaming)."""
+        with self._lock:
+            if self._queued >= self.max_queue and (self._queues or not self._can_admit_locked(0.0)):
+                raise self._reject_locked("queue_full")
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable = None, *, tokens: int = 0) -> AsyncIterator[Slot]:
+        arrived = time.monotonic()
+        cost = self._cost(tokens)
+        waiter = self._enter(key, cost, asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                while not waiter.granted:
+                    remaining = arrived + self.queue_timeout - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        await asyncio.wait_for(asyncio.shield(waiter.future), self._poll_interval(remaining))
+                    except asyncio.TimeoutError:
+                        pass
+                    self._dispatch()
+            except BaseException:
+                if self._leave_queue(key, waiter):
+                    self._release(None)
+                raise
+            if not self._leave_queue(key, waiter):
+                raise self._reject("timeout")
+        slot = self._admitted(cost, arrived)
+        try:
+            yield slot
+        finally:
+            self._release(slot)
+
+    @contextmanager
+    def slot_sync(self, key: Hashable = None, *, tokens: int = 0) -> Iterator[Slot]:
+        arrived = time.monotonic()
+        cost = self._cost(tokens)
+        waiter = self._enter(key, cost, None)
+        if waiter is not None:
+            try:
+                while not waiter.granted:
+                    remaining = arrived + self.queue_timeout - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    waiter.event.wait(self._poll_interval(remaining))
+                    self._dispatch()
+            except BaseException:
+                if self._leave_queue(key, waiter):
+                    self._release(None)
+                raise
+            if not self._leave_queue(key, waiter):
+                raise self._reject("timeout")
+        slot = self._admitted(cost, arrived)
+        try:
+            yield slot
+        finally:
+            self._release(slot)
+
+    # --- internals (all state changes under self._lock) ----------------------------------------
+
+    def _cost(self, tokens: int) -> float:
+        # A single call larger than the burst would otherwise never be admitted.
+        return min(float(max(0, tokens)), self._capacity) if self._rate else 0.0
+
+    def _poll_interval(self, remaining: float) -> float:
+        return min(remaining, _TOKEN_POLL_S) if self._rate else remaining
+
+    def _refill_locked(self) -> None:
+        if not self._rate:
+            return
+        now = time.monotonic()
+        self._bucket = min(self._capacity, self._bucket + (now - self._bucket_at) * self._rate)
+        self._bucket_at = now
+
+    def _can_admit_locked(self, cost: float) -> bool:
+        if self._active >= self.max_concurrent:
+            return False
+        return not self._rate or self._bucket >= cost
+
+    def _admit_locked(self, cost: float) -> None:
+        self._active += 1
+        self._bucket -= cost
+        ADMISSION_IN_FLIGHT.set(self._active, self.name)
+
+    def _enter(self, key: Hashable, cost: float, loop: asyncio.AbstractEventLoop | None) -> _Waiter | None:
+        """Admit immediately (None) or enqueue and return the waiter."""
+        with self._lock:
+            self._refill_locked()
+            # Jumping ahead of existing waiters would defeat fairness.
+            if not self._queues and self._can_admit_locked(cost):
+                self._admit_locked(cost)
+                return None
+            if self._queued >= self.max_queue:
+                raise self._reject_locked("queue_full")
+            waiter = _Waiter(cost, loop)
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+            queue.append(waiter)
+            self._queued += 1
+            self._queued_cost += cost
+            self._dispatch_locked()
+            return waiter
+
+    def _dispatch(self) -> None:
+        with self._lock:
+            self._dispatch_locked()
+
+    def _dispatch_locked(self) -> None:
+        self._refill_locked()
+        while self._queues and self._active < self.max_concurrent:
+            key, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+            if self._rate and self._bucket < waiter.cost:
+                break
+            queue.popleft()
+            # Round-robin: the served key goes to the back of the line.
+            del self._queues[key]
+            if queue:
+                self._queues[key] = queue
+            self._queued -= 1
+            self._queued_cost -= waiter.cost
+            self._admit_locked(waiter.cost)
+            waiter.granted = True
+            waiter.wake()
+        ADMISSION_QUEUE_DEPTH.set(self._queued, self.name)
+
+    def _leave_queue(self, key: Hashable, waiter: _Waiter) -> bool:
+        """Stop waiting; True if the waiter was granted a slot in the meantime."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            queue = self._queues.get(key)
+            if queue is not None and waiter in queue:
+                queue.remove(waiter)
+                self._queued -= 1
+                self._queued_cost -= waiter.cost
+                if not queue:
+                    del self._queues[key]
+            self._dispatch_locked()
+            return False
+
+    def _admitted(self, cost: float, arrived: float) -> Slot:
+        slot = Slot(self, cost)
+        ADMISSION_WAIT_SECONDS.observe(slot.started - arrived, self.name)
+        return slot
+
+    def _release(self, slot: Slot | None) -> None:
+        with self._lock:
+            self._active -= 1
+            ADMISSION_IN_FLIGHT.set(self._active, self.name)
+            if slot is not None:
+                held = time.monotonic() - slot.started
+                self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * held
+            self._dispatch_locked()
+
+    def _charge(self, delta: float) -> None:
+        with self._lock:
+            self._refill_locked()
+            self._bucket = min(self._capacity, self._bucket - delta)
+            self._dispatch_locked()
+
+    def _retry_after_locked(self) -> int:
+        concurrency = self.max_concurrent if math.isfinite(self.max_concurrent) else max(1, self._active)
+        wait = (self._queued + 1) / concurrency * self._hold_seconds
+        if self._rate:
+            wait = max(wait, (self._queued_cost - self._bucket) / self._rate)
+        return max(1, math.ceil(wait))
+
+    def _reject_locked(self, reason: str) -> AdmissionRejected:
+        ADMISSION_REJECTED.inc(self.name, reason)
+        return AdmissionRejected(self.name, reason, self._retry_after_locked())
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        with self._lock:
+            return self._reject_locked(reason)
+
+
+AGENT_ADMISSION = AdmissionController.from_env("agent", "AGENT", max_concurrent=16)
+EMBEDDING_ADMISSION = AdmissionController.from_env("embedding", "EMBEDDING", max_concurrent=8)
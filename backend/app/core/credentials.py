@@ -0,0 +1,113 @@
+"""Process-wide Entra ID credential with a token cache, shared by the agent and embedding clients.
+
+Credentials such as `AzureCliCredential` do not cache: every `get_token` starts an `az`
+subprocess (hundreds of milliseconds). `CachedTokenCredential` wraps one and
+
+- returns the cached token while it has more than `refresh_margin` seconds left
+- once a token is within `refresh_ahead` seconds of expiry, refreshes it in a background
+  thread and keeps serving the cached one meanwhile
+- fetches at most one token per scope at a time: concurrent callers that need a new token
+  wait for the same fetch (single-flight)
+
+A failed background refresh keeps the old token (it is still valid) and is retried on the next
+call. Calls with extra arguments (e.g. `claims` from a CAE challenge) bypass the cache.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from functools import lru_cache
+from typing import Any
+
+from app.core.metrics import ENTRA_TOKEN_FETCHES
+
+logger = logging.getLogger("app.credentials")
+
+COGNITIVE_SERVICES_SCOPE = "https://cognitiveservices.azure.com/.default"
+
+
+class CachedTokenCredential:
+    def __init__(self, credential: Any, *, refresh_margin: float = 60.0, refresh_ahead: float = 300.0) -> None:
+        self._credential = credential
+        self.refresh_margin = refresh_margin
+        self.refresh_ahead = max(refresh_ahead, refresh_margin)
+        self._lock = threading.Lock()
+        self._tokens: dict[tuple[str, ...], Any] = {}
+        self._errors: dict[tuple[str, ...], BaseException] = {}
+        self._inflight: dict[tuple[str, ...], threading.Event] = {}
+
+    def get_token(self, *scopes: str, **kwargs: Any) -> Any:
+        if kwargs:
+            return self._credential.get_token(*scopes, **kwargs)
+
+        with self._lock:
+            token = self._tokens.get(scopes)
+            left = token.expires_on - time.time() if token is not None else 0.0
+            if left > self.refresh_margin:
+                if left <= self.refresh_ahead and scopes not in self._inflight:
+                    event = self._inflight[scopes] = threading.Event()
+                    threading.Thread(
+                        target=self._fetch, args=(scopes, event, "background"), daemon=True
+                    ).start()
+                return token
+            event = self._inflight.get(scopes)
+            leader = event is None
+            if leader:
+                event = self._inflight[scopes] = threading.Event()
+
+        if leader:
+            self._fetch(scopes, event, "blocking")
+        else:
+            event.wait()
+
+        with self._lock:
+            token = self._tokens.get(scopes)
+            error = self._errors.get(scopes)
+        if token is not None and token.expires_on > time.time():
+            return token
+        if error is not None:
+            raise error
+        raise RuntimeError(f"no token available for {scopes}")
+
+    def _fetch(self, scopes: tuple[str, ...], event: threading.Event, mode: str) -> None:
+        try:
+            token = self._credential.get_token(*scopes)
+        except Exception as exc:
+            with self._lock:
+                self._errors[scopes] = exc
+            ENTRA_TOKEN_FETCHES.inc(mode, "error")
+            if mode == "background":
+                logger.warning("background token refresh failed: %s", exc)
+        else:
+            with self._lock:
+                self._tokens[scopes] = token
+                self._errors.pop(scopes, None)
+            ENTRA_TOKEN_FETCHES.inc(mode, "ok")
+        finally:
+            with self._lock:
+                self._inflight.pop(scopes, None)
+            event.set()
+
+    def close(self) -> None:
+        close = getattr(self._credential, "close", None)
+        if callable(close):
+            close()
+
+
+@lru_cache(maxsize=4)
+def get_shared_credential(tenant_id: str = "") -> CachedTokenCredential:
+    """The cached credential for `tenant_id` ("" = `DefaultAzureCredential`), one per process."""
+    try:
+        from azure.identity import AzureCliCredential, DefaultAzureCredential  # type: ignore
+    except Exception as exc:
+        raise RuntimeError(
+            "Entra ID auth requires azure-identity. Install with: "
+            "py -m pip install -r backend\\requirements-agent.txt"
+        ) from exc
+
+    if tenant_id:
+        # Prefer Azure CLI token from the specified tenant (prevents tenant mismatch).
+        return CachedTokenCredential(AzureCliCredential(tenant_id=tenant_id))
+    return CachedTokenCredential(DefaultAzureCredential(exclude_interactive_browser_credential=False))
@@ -0,0 +1,83 @@
+"""Fast JSON encoding for SSE/NDJSON frames and large listing responses.
+
+Backends, in order of preference:
+
+- `orjson` when installed (optional dependency)
+- `pydantic`: `pydantic_core.to_json`, always available with FastAPI
+- `json`: the standard library
+
+`JSON_BACKEND=orjson|pydantic|json` forces one (e.g. to compare in benchmarks); an unavailable
+choice falls back to the default. All backends emit compact, non-ASCII-escaped UTF-8.
+
+Routes with a return annotation are already serialized by FastAPI through pydantic's Rust
+encoder, so this is *not* installed as the app-wide `default_response_class` (a custom default
+class turns that fast path off). Large listings return `FastJSONResponse` directly instead,
+which skips per-request validation of the returned dict as well.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Callable
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson  # type: ignore
+except Exception:  # optional dependency
+    orjson = None
+
+
+def _stdlib_dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def _stdlib_dumpb(obj: Any) -> bytes:
+    return _stdlib_dumps(obj).encode("utf-8")
+
+
+BACKENDS: dict[str, tuple[Callable[[Any], str], Callable[[Any], bytes]]] = {
+    "json": (_stdlib_dumps, _stdlib_dumpb),
+}
+
+try:
+    import pydantic_core
+
+    def _pydantic_dumpb(obj: Any) -> bytes:
+        return pydantic_core.to_json(obj)
+
+    BACKENDS["pydantic"] = (lambda obj: _pydantic_dumpb(obj).decode("utf-8"), _pydantic_dumpb)
+except Exception:
+    pass
+
+if orjson is not None:
+
+    def _orjson_dumpb(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    BACKENDS["orjson"] = (lambda obj: _orjson_dumpb(obj).decode("utf-8"), _orjson_dumpb)
+
+
+def _select(name: str | None) -> str:
+    name = (name or "").strip().lower()
+    if name in BACKENDS:
+        return name
+    return next(b for b in ("orjson", "pydantic", "json") if b in BACKENDS)
+
+
+BACKEND = _select(os.getenv("JSON_BACKEND"))
+_dumps, _dumpb = BACKENDS[BACKEND]
+
+
+def dumps(obj: Any) -> str:
+    return _dumps(obj)
+
+
+def dumpb(obj: Any) -> bytes:
+    return _dumpb(obj)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return _dumpb(content)
@@ -0,0 +1,494 @@
+"""Minimal in-process metrics registry rendered in Prometheus text format.
+
+Updates are a dict lookup plus a few additions under a per-metric lock, so instrumenting
+hot paths is cheap. Label values are passed positionally in the order of `labelnames`.
+"""
+
+from __future__ import annotations
+
+import functools
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+RATE_BUCKETS = (1, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_INF_LE = 'le="+Inf"'
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: tuple[str, ...]) -> tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return labels
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(tuple(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        *,
+        callback: Callable[[], float] | None = None,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._callback = callback
+
+    def set_callback(self, callback: Callable[[], float] | None) -> None:
+        """Compute the (unlabelled) value lazily at scrape time instead of on every update."""
+        self._callback = callback
+
+    def set(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels: str) -> float:
+        if self._callback is not None and not labels:
+            return float(self._callback())
+        return self._values.get(tuple(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        if self._callback is not None:
+            try:
+                return [f"{self.name} {_format_value(float(self._callback()))}"]
+            except Exception:
+                return []
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        *,
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts..., +Inf count], sum, count
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[key] = series
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(tuple(labels))
+        return int(series[2]) if series else 0
+
+    def sum(self, *labels: str) -> float:
+        series = self._series.get(tuple(labels))
+        return float(series[1]) if series else 0.0
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        lines: list[str] = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, _INF_LE)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        *,
+        callback: Callable[[], float] | None = None,
+    ) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, callback=callback))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        *,
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets=buckets))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: list[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency (until the last body chunk is sent), per route template.",
+    ("method", "route", "status"),
+)
+AGENT_RUN_SECONDS = REGISTRY.histogram(
+    "agent_run_duration_seconds",
+    "Duration of agent.run / agent.run_stream calls.",
+    ("mode", "outcome"),
+)
+AGENT_STREAM_TTFD_SECONDS = REGISTRY.histogram(
+    "agent_stream_time_to_first_delta_seconds",
+    "Time from starting an agent stream to its first text delta.",
+)
+AGENT_STREAM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "agent_stream_output_tokens_per_second",
+    "Output token throughput of completed agent streams.",
+    buckets=RATE_BUCKETS,
+)
+AGENT_BATCHES_IN_FLIGHT = REGISTRY.gauge(
+    "agent_batches_in_flight",
+    "Bulk agent runs (POST /api/agent/batch) currently executing.",
+)
+AGENT_BATCH_ITEMS = REGISTRY.counter(
+    "agent_batch_items_total",
+    "Bulk agent run items by final status (ok, error, skipped, cancelled).",
+    ("status",),
+)
+AGENT_STREAMS_IN_FLIGHT = REGISTRY.gauge(
+    "agent_streams_in_flight",
+    "Agent SSE streams currently open.",
+)
+CONVERSATION_STORE_SIZE = REGISTRY.gauge(
+    "agent_conversation_store_size",
+    "Conversations held in the in-process conversation store.",
+)
+CONVERSATION_THREAD_LOADS = REGISTRY.counter(
+    "agent_conversation_thread_loads_total",
+    "Threads handed to agent turns, by source (live object reused, rebuilt from snapshot + log, new).",
+    ("source",),
+)
+CONVERSATION_COMPACTIONS = REGISTRY.counter(
+    "agent_conversation_compactions_total",
+    "Conversation message logs folded into a fresh thread snapshot.",
+)
+CONVERSATION_SUMMARIES = REGISTRY.counter(
+    "agent_conversation_summaries_total",
+    "Background rolling summaries of old conversation turns, by outcome.",
+    ("outcome",),
+)
+CONVERSATION_BACKEND_CONFLICTS = REGISTRY.counter(
+    "agent_conversation_backend_conflicts_total",
+    "Optimistic conversation writes rejected because another writer committed first.",
+)
+AGENT_DEPLOYMENT_IN_FLIGHT = REGISTRY.gauge(
+    "agent_deployment_in_flight",
+    "Agent calls currently running per profile and deployment.",
+    ("profile", "deployment"),
+)
+AGENT_DEPLOYMENT_REQUESTS = REGISTRY.counter(
+    "agent_deployment_requests_total",
+    "Agent calls per profile and deployment, by outcome (ok, throttled, failed, error, cancelled).",
+    ("profile", "deployment", "outcome"),
+)
+AGENT_DEPLOYMENT_COOLDOWNS = REGISTRY.counter(
+    "agent_deployment_cooldowns_total",
+    "Times a deployment was taken out of rotation after a throttled or failed call.",
+    ("profile", "deployment"),
+)
+AGENT_ROUTE_DECISIONS = REGISTRY.counter(
+    "agent_route_decisions_total",
+    "Prompt-size routing decisions by route (small, large, explicit, default) and reason.",
+    ("route", "reason"),
+)
+AGENT_ROUTE_SECONDS = REGISTRY.histogram(
+    "agent_route_duration_seconds",
+    "Latency of successful agent calls per route.",
+    ("route",),
+)
+AGENT_ROUTE_TOKENS = REGISTRY.counter(
+    "agent_route_tokens_total",
+    "Tokens used per route and kind (input, output).",
+    ("route", "kind"),
+)
+ADMISSION_IN_FLIGHT = REGISTRY.gauge(
+    "admission_in_flight", "Upstream model calls currently admitted.", ("name",)
+)
+ADMISSION_QUEUE_DEPTH = REGISTRY.gauge(
+    "admission_queue_depth", "Upstream model calls waiting for admission.", ("name",)
+)
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    "admission_wait_seconds", "Time from arrival to admission of an upstream model call.", ("name",)
+)
+ADMISSION_REJECTED = REGISTRY.counter(
+    "admission_rejected_total", "Upstream model calls rejected with 429.", ("name", "reason")
+)
+UPSTREAM_ATTEMPTS = REGISTRY.counter(
+    "upstream_attempts_total",
+    "Attempts made by resilient upstream callers, by outcome (ok, retryable, fatal).",
+    ("name", "outcome"),
+)
+UPSTREAM_HEDGES = REGISTRY.counter(
+    "upstream_hedges_total",
+    "Hedged upstream calls that got a duplicate request, by which request answered first.",
+    ("name", "winner"),
+)
+CIRCUIT_BREAKER_OPEN = REGISTRY.gauge(
+    "circuit_breaker_open",
+    "1 while an upstream circuit breaker is open or half-open, else 0.",
+    ("name",),
+)
+ENTRA_TOKEN_FETCHES = REGISTRY.counter(
+    "entra_token_fetches_total",
+    "Entra ID tokens fetched by the shared credential, by mode (blocking, background) and outcome.",
+    ("mode", "outcome"),
+)
+SINGLEFLIGHT_CALLS = REGISTRY.counter(
+    "singleflight_calls_total",
+    "Calls through single-flight groups: leader (did the work) or coalesced (shared a result).",
+    ("name", "result"),
+)
+STATIC_RESPONSES = REGISTRY.counter(
+    "static_responses_total",
+    "Static frontend responses by encoding (br, gzip, identity) or not_modified (304).",
+    ("result",),
+)
+EMBEDDING_SECONDS = REGISTRY.histogram(
+    "embedding_request_duration_seconds",
+    "Latency of embedding API calls.",
+    ("outcome",),
+)
+EMBEDDING_BATCH_SIZE = REGISTRY.histogram(
+    "embedding_batch_size",
+    "Number of texts sent per embedding API call.",
+    buckets=SIZE_BUCKETS,
+)
+KNOWLEDGE_FANOUT_SIZE = REGISTRY.histogram(
+    "knowledge_fanout_size",
+    "Knowledge bases searched concurrently by one multi-base query.",
+    buckets=SIZE_BUCKETS,
+)
+KNOWLEDGE_QUERY_SECONDS = REGISTRY.histogram(
+    "knowledge_query_duration_seconds",
+    "End-to-end knowledge retrieval latency (embedding + vector search).",
+)
+CHROMA_QUERY_SECONDS = REGISTRY.histogram(
+    "chroma_query_duration_seconds",
+    "Latency of Chroma collection queries.",
+)
+SQLITE_WRITE_SECONDS = REGISTRY.histogram(
+    "sqlite_write_duration_seconds",
+    "Latency of token usage database writes.",
+    ("operation",),
+)
+
+
+def timed(histogram: Histogram, *labels: str):
+    """Decorator recording the wall time of every call (including failed ones) in `histogram`."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, *labels)
+
+        return wrapper
+
+    return decorator
+
+
+def _route_label(scope) -> str:
+    """Route template for a handled request, e.g. `/api/knowledge/uploads/{stored_name}`.
+
+    Built from the request path with path-parameter values swapped back for their names, which
+    keeps label cardinality bounded without depending on how the router nests prefixes.
+    """
+    if scope.get("route") is None and scope.get("endpoint") is None:
+        return "unmatched"
+    # Mounted sub-apps (e.g. StaticFiles) extend root_path; label them by mount point.
+    mount = str(scope.get("root_path") or "")[len(str(scope.get("app_root_path") or "")) :]
+    if mount:
+        return mount + "/{path}"
+    path = str(scope.get("path") or "")
+    for name, value in (scope.get("path_params") or {}).items():
+        needle = "/" + str(value)
+        idx = path.rfind(needle)
+        if idx >= 0 and value != "":
+            path = path[:idx] + "/{" + name + "}" + path[idx + len(needle) :]
+    return path or "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: records request latency per route template, including streamed bodies."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope.get("type") != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+        recorded = {"done": False}
+
+        def record() -> None:
+            if recorded["done"]:
+                return
+            recorded["done"] = True
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                scope.get("method", ""),
+                _route_label(scope),
+                str(status["code"]),
+            )
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = int(message.get("status", 500))
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            record()
@@ -0,0 +1,267 @@
+"""Deadlines, retries, hedging and a circuit breaker for blocking upstream calls.
+
+    caller = ResilientCaller.from_env("embedding", "EMBEDDING")
+    response = caller.call(lambda timeout: client.embeddings.create(..., timeout=timeout), hedge=True)
+
+`fn` receives the time it may take (seconds) and must pass it on as its own timeout; the SDK's
+built-in retries should be disabled (`max_retries=0`) so they do not stack with these.
+
+- deadline: the whole call, retries included, never takes longer than `deadline`; one attempt
+  takes at most `attempt_timeout`
+- retries: transient failures (timeouts, connection errors, 408/409/429/5xx) are retried up to
+  `max_attempts` with full-jitter exponential backoff; a `Retry-After` header is honoured
+- hedging: with `hedge=True` (meant for small, latency-critical requests), a duplicate request
+  is sent if the first has not answered after the observed p95 latency; the first success wins
+- circuit breaker: after `breaker_failures` consecutive transient failures calls fail fast with
+  `CircuitOpen` for `breaker_reset` seconds, then one trial call decides whether to close again
+
+Configuration per caller: `<PREFIX>_DEADLINE_S`, `<PREFIX>_ATTEMPT_TIMEOUT_S`,
+`<PREFIX>_MAX_ATTEMPTS`, `<PREFIX>_HEDGE` (1 to enable), `<PREFIX>_BREAKER_FAILURES`,
+`<PREFIX>_BREAKER_RESET_S`.
+"""
+
+from __future__ import annotations
+
+import math
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, TypeVar
+
+from fastapi import HTTPException
+
+from app.core.metrics import (
+    CIRCUIT_BREAKER_OPEN,
+    UPSTREAM_ATTEMPTS,
+    UPSTREAM_HEDGES,
+)
+from app.core.settings import env_float, env_int
+
+T = TypeVar("T")
+
+_TRANSIENT_STATUS = {408, 409, 429}
+# Until enough latencies are observed, hedge after this long.
+_DEFAULT_HEDGE_DELAY_S = 0.5
+_MIN_LATENCY_SAMPLES = 20
+
+# Hedged attempts run here so the caller can wait on whichever finishes first.
+_hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitOpen(Exception):
+    def __init__(self, name: str, retry_after: int) -> None:
+        super().__init__(f"{name} upstream is failing; retry after {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def unavailable(exc: CircuitOpen) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": str(exc.retry_after)})
+
+
+def _status_code(exc: BaseException) -> int | None:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether retrying `exc` may help (as opposed to e.g. a bad request or bad credentials)."""
+    status = _status_code(exc)
+    if status is not None:
+        return status in _TRANSIENT_STATUS or status >= 500
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    try:
+        import httpx
+        import openai
+    except Exception:
+        return False
+    return isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError, httpx.TransportError))
+
+
+def _retry_after(exc: BaseException) -> float | None:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, *, failure_threshold: int = 5, reset_after: float = 30.0) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_after = reset_after
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._state = "closed"
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def before_call(self) -> None:
+        """Raise `CircuitOpen` unless a call may go out now."""
+        with self._lock:
+            if self._state == "open":
+                waited = time.monotonic() - self._opened_at
+                if waited < self.reset_after:
+                    raise CircuitOpen(self.name, max(1, math.ceil(self.reset_after - waited)))
+                self._state = "half_open"
+                self._trial_in_flight = False
+            if self._state == "half_open":
+                if self._trial_in_flight:
+                    raise CircuitOpen(self.name, 1)
+                self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self._state != "closed":
+                self._state = "closed"
+                CIRCUIT_BREAKER_OPEN.set(0, self.name)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                self._state = "open"
+                self._opened_at = time.monotonic()
+                CIRCUIT_BREAKER_OPEN.set(1, self.name)
+
+
+class _LatencyWindow:
+    def __init__(self, size: int = 200) -> None:
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        samples = sorted(self._samples)
+        if len(samples) < _MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class ResilientCaller:
+    def __init__(
+        self,
+        name: str,
+        *,
+        deadline: float = 30.0,
+        attempt_timeout: float = 10.0,
+        max_attempts: int = 3,
+        base_delay: float = 0.2,
+        max_delay: float = 5.0,
+        hedge: bool = False,
+        hedge_delay: float = _DEFAULT_HEDGE_DELAY_S,
+        breaker: CircuitBreaker | None = None,
+        retryable: Callable[[BaseException], bool] = is_transient,
+    ) -> None:
+        self.name = name
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.breaker = breaker or CircuitBreaker(name)
+        self.retryable = retryable
+        self._latency = _LatencyWindow()
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str) -> "ResilientCaller":
+        return cls(
+            name,
+            deadline=env_float(f"{prefix}_DEADLINE_S", 30.0),
+            attempt_timeout=env_float(f"{prefix}_ATTEMPT_TIMEOUT_S", 10.0),
+            max_attempts=env_int(f"{prefix}_MAX_ATTEMPTS", 3),
+            hedge=env_int(f"{prefix}_HEDGE", 0) == 1,
+            breaker=CircuitBreaker(
+                name,
+                failure_threshold=env_int(f"{prefix}_BREAKER_FAILURES", 5),
+                reset_after=env_float(f"{prefix}_BREAKER_RESET_S", 30.0),
+            ),
+        )
+
+    def call(self, fn: Callable[[float], T], *, hedge: bool = False) -> T:
+        deadline_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"{self.name}: deadline of {self.deadline}s exceeded")
+            timeout = min(remaining, self.attempt_timeout)
+            attempt += 1
+            start = time.monotonic()
+            try:
+                if hedge and self.hedge:
+                    result = self._hedged(fn, timeout)
+                else:
+                    result = fn(timeout)
+            except Exception as exc:
+                if not self.retryable(exc):
+                    # The upstream answered; the request itself is at fault.
+                    self.breaker.record_success()
+                    UPSTREAM_ATTEMPTS.inc(self.name, "fatal")
+                    raise
+                self.breaker.record_failure()
+                UPSTREAM_ATTEMPTS.inc(self.name, "retryable")
+                if attempt >= self.max_attempts:
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                delay = max(delay, _retry_after(exc) or 0.0)
+                if time.monotonic() + delay >= deadline_at:
+                    raise
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            self._latency.add(time.monotonic() - start)
+            UPSTREAM_ATTEMPTS.inc(self.name, "ok")
+            return result
+
+    def _hedged(self, fn: Callable[[float], T], timeout: float) -> T:
+        start = time.monotonic()
+        delay = self._latency.quantile(0.95) or self.hedge_delay
+        primary = _hedge_pool.submit(fn, timeout)
+        if delay >= timeout:
+            return primary.result()
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        hedge = _hedge_pool.submit(fn, timeout - delay)
+        roles: dict[Future, str] = {primary: "primary", hedge: "hedge"}
+        pending = set(roles)
+        error: BaseException | None = None
+        while pending:
+            remaining = start + timeout - time.monotonic()
+            done, pending = wait(pending, timeout=max(0.0, remaining), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    # The loser keeps running until its own timeout; its result is dropped.
+                    UPSTREAM_HEDGES.inc(self.name, roles[future])
+                    return future.result()
+                error = future.exception()
+        if error is not None:
+            raise error
+        raise DeadlineExceeded(f"{self.name}: hedged attempt timed out after {timeout:.2f}s")
@@ -1,9 +1,198 @@
-from dataclasses import dataclass
+"""Immutable configuration snapshot, loaded once and swapped atomically on reload.
+
+`get_settings()` returns the current `Settings`. It is built on first use: the local env
+files (`config/azure_openai.env`, then `.env`, both overriding the process environment as
+before) are applied once and the relevant variables are read into a frozen dataclass, so
+hot paths no longer re-read files or the environment.
+
+`reload_settings()` (also `POST /api/admin/reload`, or automatically with
+`SETTINGS_WATCH=1` when an env file changes) builds a new snapshot, swaps it in and calls
+the callbacks registered with `on_reload` so dependent clients (agent, embedding client,
+credential) are rebuilt on next use. A reference taken from `get_settings()` never changes
+underneath its holder.
+
+Settings that are per-deployment tuning knobs (admission limits, context policy, storage
+paths, ...) are still read by their own modules, several at import time; entry points
+(`app.main`, the maintenance commands) call `get_settings()` first so the env files are
+applied before those modules are imported.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Callable, TypeVar
+
+logger = logging.getLogger("app.settings")
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[3]
+ENV_FILES = (_PROJECT_ROOT / "config" / "azure_openai.env", _PROJECT_ROOT / ".env")
+
+D = TypeVar("D")
+
+
+def _env(name: str, default: str = "") -> str:
+    return (os.getenv(name) or default).strip()
+
+
+def env_int(name: str, default: D) -> int | D:
+    """`name` as an int; `default` when it is unset, blank or not a number."""
+    raw = _env(name)
+    try:
+        return int(raw) if raw else default
+    except ValueError:
+        return default
+
+
+def env_float(name: str, default: D) -> float | D:
+    """`name` as a float; `default` when it is unset, blank or not a number."""
+    raw = _env(name)
+    try:
+        return float(raw) if raw else default
+    except ValueError:
+        return default
 
 
 @dataclass(frozen=True)
 class Settings:
     app_name: str = "testpython"
 
+    azure_openai_endpoint: str = ""
+    responses_deployment_name: str = ""
+    embedding_deployment_name: str = ""
+    api_version: str = ""
+    api_key: str = ""
+    tenant_id: str = ""
+
+    # azure | fake
+    agent_backend: str = "azure"
+    agent_name: str = "Assistant"
+    agent_instructions: str = "You are a helpful assistant."
+    # JSON: profile name -> deployments/instructions (see app.agents.agent_pool).
+    agent_profiles: str = ""
+    # Prompt-size routing (see app.agents.model_router); off while the small profile is unset.
+    agent_route_small_profile: str = ""
+    agent_route_large_profile: str = "default"
+    agent_route_small_max_tokens: int = 1000
+    agent_route_small_max_turns: int = 8
+    # azure | hash
+    embedding_provider: str = "azure"
+    # Mount the knowledge routes (read at startup; changing it needs a restart).
+    knowledge_enabled: bool = True
+
+    admin_token: str = ""
+    watch_env_files: bool = False
+
+    @property
+    def auth_mode(self) -> str:
+        return "api_key" if self.api_key else "entra_id"
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            azure_openai_endpoint=_env("AZURE_OPENAI_ENDPOINT"),
+            responses_deployment_name=_env("AZURE_OPENAI_RESPONSES_DEPLOYMENT_NAME"),
+            embedding_deployment_name=_env("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME"),
+            api_version=_env("AZURE_OPENAI_API_VERSION"),
+            api_key=_env("AZURE_OPENAI_API_KEY"),
+            tenant_id=_env("AZURE_TENANT_ID"),
+            agent_backend=_env("AGENT_BACKEND", "azure").lower(),
+            agent_name=_env("AGENT_NAME", "Assistant"),
+            agent_instructions=_env("AGENT_INSTRUCTIONS", "You are a helpful assistant."),
+            agent_profiles=_env("AGENT_PROFILES"),
+            agent_route_small_profile=_env("AGENT_ROUTE_SMALL_PROFILE"),
+            agent_route_large_profile=_env("AGENT_ROUTE_LARGE_PROFILE", "default") or "default",
+            agent_route_small_max_tokens=env_int("AGENT_ROUTE_SMALL_MAX_TOKENS", 1000),
+            agent_route_small_max_turns=env_int("AGENT_ROUTE_SMALL_MAX_TURNS", 8),
+            embedding_provider=_env("KNOWLEDGE_EMBEDDING_PROVIDER", "azure").lower(),
+            knowledge_enabled=_env("KNOWLEDGE_ENABLED", "1") != "0",
+            admin_token=_env("ADMIN_TOKEN"),
+            watch_env_files=_env("SETTINGS_WATCH") == "1",
+        )
+
+    def changed_fields(self, other: "Settings") -> list[str]:
+        return [f.name for f in fields(self) if getattr(self, f.name) != getattr(other, f.name)]
+
+
+def _load_env_files() -> None:
+    """Best-effort local env file loading to support local dev."""
+    try:
+        from dotenv import load_dotenv  # type: ignore
+
+        for path in ENV_FILES:
+            load_dotenv(dotenv_path=path, override=True)
+    except Exception:
+        pass
+
+
+_lock = threading.Lock()
+_current: Settings | None = None
+_callbacks: list[Callable[[Settings, Settings], None]] = []
+
+
+def get_settings() -> Settings:
+    current = _current
+    if current is not None:
+        return current
+    with _lock:
+        if _current is None:
+            _swap(_build())
+        return _current  # type: ignore[return-value]
+
+
+def _build(load_files: bool = True) -> Settings:
+    if load_files:
+        _load_env_files()
+    return Settings.from_env()
+
+
+def _swap(new: Settings) -> Settings | None:
+    global _current
+    old, _current = _current, new
+    return old
+
+
+def reload_settings(*, load_files: bool = True) -> tuple[Settings, list[str]]:
+    """Re-read env files and environment; returns the new snapshot and the changed fields.
+
+    `load_files=False` reads only the process environment (tests, which must not have their
+    variables overridden by a developer's local env file).
+    """
+    with _lock:
+        new = _build(load_files)
+        old = _swap(new)
+    changed = new.changed_fields(old) if old is not None else []
+    if old is not None and changed:
+        for callback in list(_callbacks):
+            try:
+                callback(old, new)
+            except Exception:
+                logger.exception("settings reload callback failed")
+    return new, changed
+
+
+def on_reload(callback: Callable[[Settings, Settings], None]) -> Callable[[Settings, Settings], None]:
+    """Register `callback(old, new)`, called after a reload that changed something."""
+    _callbacks.append(callback)
+    return callback
+
+
+def env_files_mtime() -> tuple[float, ...]:
+    return tuple(p.stat().st_mtime if p.exists() else 0.0 for p in ENV_FILES)
+
+
+async def watch_env_files(interval: float = 2.0) -> None:
+    """Reload whenever one of the env files changes (polling; runs until cancelled)."""
+    import asyncio
 
-settings = Settings()
+    seen = env_files_mtime()
+    while True:
+        await asyncio.sleep(interval)
+        mtimes = env_files_mtime()
+        if mtimes != seen:
+            seen = mtimes
+            _, changed = reload_settings()
+            logger.info("env files changed; settings reloaded (changed: %s)", ", ".join(changed) or "nothing")
@@ -0,0 +1,53 @@
+"""Async single-flight: concurrent identical calls share one in-flight computation.
+
+    _uploads_flight = SingleFlight("knowledge_uploads")
+    items = await _uploads_flight.run("uploads", list_uploads)
+
+The first caller for a key starts the work; callers arriving while it runs await the same
+result (or exception) instead of repeating it. Nothing is cached: once the call finishes, the
+next caller starts a fresh one. The work runs as its own task, so a caller that disconnects
+does not cancel it for the others. Results are shared objects and must not be mutated.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+from typing import Any, Callable, Hashable
+
+from app.core.metrics import SINGLEFLIGHT_CALLS
+
+
+class SingleFlight:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    async def run(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run `fn(*args, **kwargs)` once per concurrent `key`.
+
+        Coroutine functions are awaited; plain functions run in a worker thread.
+        """
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            SINGLEFLIGHT_CALLS.inc(self.name, "coalesced")
+            return await asyncio.shield(task)
+
+        SINGLEFLIGHT_CALLS.inc(self.name, "leader")
+        if inspect.iscoroutinefunction(fn):
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+        else:
+            task = asyncio.ensure_future(asyncio.to_thread(fn, *args, **kwargs))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every waiter was cancelled.
+        if not task.cancelled():
+            task.exception()
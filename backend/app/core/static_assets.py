@@ -0,0 +1,316 @@
+"""Static frontend serving: content-hashed URLs, precompressed variants and ETag revalidation.
+
+`StaticAssets` scans the frontend directory once at startup and, per file,
+
+- computes a content hash and a hashed URL (`/static/app.<hash>.js`), served with
+  `Cache-Control: public, max-age=31536000, immutable`
+- precompresses text assets with gzip (and brotli when the optional `brotli` package is
+  installed); the variant is picked from `Accept-Encoding` and sent with `Vary: Accept-Encoding`
+- keeps the encoded bodies in a byte-bounded in-memory LRU (`STATIC_CACHE_MAX_BYTES`,
+  default 16 MiB), so hot assets are served without touching the disk
+
+`index.html` is rendered with its `/static/...` references rewritten to the hashed URLs and is
+served with `Cache-Control: no-cache` plus an ETag, so browsers revalidate it (304) on each
+load and pick up new asset URLs after a deploy. Unhashed URLs (`/static/app.js?v=6`) keep
+working with the same revalidation.
+
+Files edited on disk are picked up without a restart: mtimes are re-checked at most every
+`STATIC_RELOAD_INTERVAL_S` seconds (default 2; 0 disables).
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import mimetypes
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from fastapi import HTTPException, Request, Response
+
+from app.core.metrics import STATIC_RESPONSES
+from app.core.settings import env_float, env_int
+
+try:
+    import brotli  # type: ignore
+except Exception:  # optional dependency
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+_COMPRESSIBLE = {".html", ".js", ".mjs", ".css", ".svg", ".json", ".map", ".txt", ".xml"}
+_MIN_COMPRESS_BYTES = 256
+_STATIC_REF = re.compile(r"""(["'])/static/([^"'?#]+)(?:\?[^"'#]*)?\1""")
+
+
+def _hashed_name(name: str, digest: str) -> str:
+    head, dot, suffix = name.rpartition(".")
+    if not dot or "/" in suffix:
+        return f"{name}.{digest}"
+    return f"{head}.{digest}.{suffix}"
+
+
+def accepted_encodings(header: str) -> dict[str, float]:
+    """`Accept-Encoding` as {coding: q}."""
+    out: dict[str, float] = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        out[coding] = q
+    return out
+
+
+def choose_encoding(header: str, available: list[str]) -> str:
+    """Best of `available` (in server preference order) for `Accept-Encoding`, else "identity"."""
+    accepted = accepted_encodings(header)
+    best, best_q = "identity", 0.0
+    for coding in available:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+@dataclass
+class Asset:
+    name: str
+    path: Path
+    hashed_name: str
+    content_type: str
+    digest: str
+    mtime_ns: int
+    size: int
+    # Encodings with a (smaller) precompressed variant, in preference order.
+    encodings: list[str] = field(default_factory=list)
+
+    def etag(self, encoding: str) -> str:
+        return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+
+
+class StaticAssets:
+    def __init__(
+        self,
+        directory: str | Path,
+        *,
+        cache_bytes: int | None = None,
+        reload_interval: float | None = None,
+        index: str = "index.html",
+    ) -> None:
+        self.directory = Path(directory)
+        self.index = index
+        self.cache_bytes = env_int("STATIC_CACHE_MAX_BYTES", 16 * 1024 * 1024) if cache_bytes is None else cache_bytes
+        self.reload_interval = (
+            env_float("STATIC_RELOAD_INTERVAL_S", 2.0) if reload_interval is None else reload_interval
+        )
+        self._lock = threading.RLock()
+        self._assets: dict[str, Asset] = {}
+        self._by_hashed: dict[str, Asset] = {}
+        self._rendered: dict[str, bytes] = {}
+        self._cache: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+        self._cached_bytes = 0
+        self._checked = 0.0
+        self.build()
+
+    # -- manifest ---------------------------------------------------------------------------
+
+    def _scan(self) -> list[Path]:
+        return sorted(
+            p
+            for p in self.directory.rglob("*")
+            if p.is_file() and not any(part.startswith(".") for part in p.relative_to(self.directory).parts)
+        )
+
+    def build(self) -> None:
+        """(Re)scan the directory: hashes, hashed names, rendered HTML and warm cache."""
+        files = self._scan()
+        with self._lock:
+            self._assets.clear()
+            self._by_hashed.clear()
+            self._rendered.clear()
+            self._cache.clear()
+            self._cached_bytes = 0
+            html: list[Path] = []
+            for path in files:
+                if path.suffix.lower() == ".html":
+                    html.append(path)
+                else:
+                    self._add(path, path.read_bytes())
+            # HTML last: its hash covers the rewritten asset URLs.
+            for path in html:
+                name = path.relative_to(self.directory).as_posix()
+                rendered = self._render(path.read_text(encoding="utf-8")).encode("utf-8")
+                self._rendered[name] = rendered
+                self._add(path, rendered)
+            self._checked = time.monotonic()
+
+    def _add(self, path: Path, data: bytes) -> None:
+        name = path.relative_to(self.directory).as_posix()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        stat = path.stat()
+        asset = Asset(
+            name=name,
+            path=path,
+            hashed_name=_hashed_name(name, digest),
+            content_type=mimetypes.guess_type(name)[0] or "application/octet-stream",
+            digest=digest,
+            mtime_ns=stat.st_mtime_ns,
+            size=len(data),
+        )
+        if asset.content_type.startswith("text/") or asset.content_type.endswith("javascript"):
+            asset.content_type += "; charset=utf-8"
+        self._assets[name] = asset
+        self._by_hashed[asset.hashed_name] = asset
+        self._store(asset, "identity", data)
+        if path.suffix.lower() in _COMPRESSIBLE and len(data) >= _MIN_COMPRESS_BYTES:
+            for encoding in ("br", "gzip"):
+                encoded = self._encode(data, encoding)
+                if encoded is not None and len(encoded) < len(data):
+                    asset.encodings.append(encoding)
+                    self._store(asset, encoding, encoded)
+
+    def _render(self, html: str) -> str:
+        def replace(match: re.Match) -> str:
+            asset = self._assets.get(match.group(2))
+            if asset is None:
+                return match.group(0)
+            quote = match.group(1)
+            return f"{quote}/static/{asset.hashed_name}{quote}"
+
+        return _STATIC_REF.sub(replace, html)
+
+    @staticmethod
+    def _encode(data: bytes, encoding: str) -> bytes | None:
+        if encoding == "gzip":
+            # mtime=0 keeps the output (and so the ETag) stable across restarts.
+            return gzip.compress(data, compresslevel=9, mtime=0)
+        if encoding == "br" and brotli is not None:
+            return brotli.compress(data, quality=11)
+        return None
+
+    def _refresh(self) -> None:
+        if self.reload_interval <= 0 or time.monotonic() - self._checked < self.reload_interval:
+            return
+        with self._lock:
+            self._checked = time.monotonic()
+            try:
+                # Added or removed files change the listing; edited ones their mtime.
+                names = {p.relative_to(self.directory).as_posix() for p in self._scan()}
+                changed = names != set(self._assets) or any(
+                    asset.path.stat().st_mtime_ns != asset.mtime_ns for asset in self._assets.values()
+                )
+            except OSError:
+                changed = True
+        if changed:
+            self.build()
+
+    # -- lookup -----------------------------------------------------------------------------
+
+    def url(self, name: str) -> str:
+        asset = self._assets.get(name)
+        return f"/static/{asset.hashed_name if asset else name}"
+
+    def resolve(self, path: str) -> tuple[Asset, bool] | None:
+        """(asset, immutable) for a request path relative to /static, or None."""
+        self._refresh()
+        asset = self._by_hashed.get(path)
+        if asset is not None:
+            return asset, True
+        asset = self._assets.get(path)
+        return (asset, False) if asset is not None else None
+
+    def body(self, asset: Asset, encoding: str) -> bytes | None:
+        """Bytes of `asset` in `encoding`; None if the file no longer matches the asset's digest.
+
+        A cache miss re-reads the file, which may have changed since the manifest was built
+        (within the reload interval, or at any time with reloading off). Serving those bytes
+        under the old hashed URL would pin them in browsers for a year, so the manifest is
+        rebuilt instead and the caller resolves the path again.
+        """
+        key = (asset.name, encoding)
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+                return data
+        raw = self._rendered.get(asset.name)
+        if raw is None:
+            try:
+                raw = asset.path.read_bytes()
+            except OSError:
+                raw = None
+            if raw is None or hashlib.sha256(raw).hexdigest()[:12] != asset.digest:
+                self.build()
+                return None
+        data = raw if encoding == "identity" else (self._encode(raw, encoding) or raw)
+        with self._lock:
+            self._store(asset, encoding, data)
+        return data
+
+    def _store(self, asset: Asset, encoding: str, data: bytes) -> None:
+        key = (asset.name, encoding)
+        old = self._cache.pop(key, None)
+        if old is not None:
+            self._cached_bytes -= len(old)
+        if len(data) > self.cache_bytes:
+            return
+        self._cache[key] = data
+        self._cached_bytes += len(data)
+        while self._cached_bytes > self.cache_bytes and self._cache:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= len(evicted)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"assets": len(self._assets), "cached_entries": len(self._cache), "cached_bytes": self._cached_bytes}
+
+    # -- HTTP -------------------------------------------------------------------------------
+
+    def response(self, request: Request, path: str) -> Response:
+        # A second attempt follows a rebuild triggered by a changed file (see `body`).
+        for _ in range(2):
+            response = self._response(request, path)
+            if response is not None:
+                return response
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    def _response(self, request: Request, path: str) -> Response | None:
+        resolved = self.resolve(path)
+        if resolved is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        asset, immutable = resolved
+
+        encoding = choose_encoding(request.headers.get("accept-encoding", ""), asset.encodings)
+        etag = asset.etag(encoding)
+        headers = {"ETag": etag, "Cache-Control": IMMUTABLE if immutable else REVALIDATE}
+        if asset.encodings:
+            headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = request.headers.get("if-none-match", "")
+        if if_none_match:
+            tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+            if "*" in tags or etag in tags:
+                STATIC_RESPONSES.inc("not_modified")
+                return Response(status_code=304, headers=headers)
+
+        data = self.body(asset, encoding)
+        if data is None:
+            return None
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        STATIC_RESPONSES.inc(encoding)
+        return Response(data, media_type=asset.content_type, headers=headers)
@@ -0,0 +1,123 @@
+"""Request-scoped phase timing, surfaced as a `Server-Timing` header and a slow-request log."""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from app.core.settings import env_float
+
+logger = logging.getLogger("app.slow_requests")
+
+_current: ContextVar["RequestTiming | None"] = ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    """Accumulates named phase durations for one request. Repeated phase names are summed."""
+
+    __slots__ = ("start", "phases")
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.phases: dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def snapshot(self) -> dict:
+        """Phase durations and total elapsed time, in milliseconds."""
+        return {
+            "total_ms": round(self.elapsed() * 1000, 2),
+            "phases": {name: round(sec * 1000, 2) for name, sec in self.phases.items()},
+        }
+
+    def server_timing(self) -> str:
+        parts = [f"{name};dur={sec * 1000:.1f}" for name, sec in self.phases.items()]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def current_timing() -> RequestTiming | None:
+    return _current.get()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time a block as phase `name` of the current request (no-op outside a request)."""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    with timing.phase(name):
+        yield
+
+
+def _slow_threshold_ms() -> float:
+    return env_float("SLOW_REQUEST_MS", 2000.0)
+
+
+class TimingMiddleware:
+    """Pure ASGI middleware that owns the request timing context.
+
+    Recorded phases are sent in the `Server-Timing` header. Streaming handlers cannot add phases
+    after headers are sent, so they emit their own final timing event. Requests slower than
+    `SLOW_REQUEST_MS` (default 2000) are written to the `app.slow_requests` logger as JSON.
+    """
+
+    def __init__(self, app, *, slow_threshold_ms: float | None = None) -> None:
+        self.app = app
+        self.slow_threshold_ms = _slow_threshold_ms() if slow_threshold_ms is None else slow_threshold_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope.get("type") != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = _current.set(timing)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = int(message.get("status", 500))
+                headers = list(message.get("headers") or [])
+                headers.append((b"server-timing", timing.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            elapsed_ms = timing.elapsed() * 1000
+            if self.slow_threshold_ms >= 0 and elapsed_ms >= self.slow_threshold_ms:
+                snap = timing.snapshot()
+                logger.warning(
+                    json.dumps(
+                        {
+                            "event": "slow_request",
+                            "method": scope.get("method"),
+                            "path": scope.get("path"),
+                            "status": status["code"],
+                            "duration_ms": round(elapsed_ms, 2),
+                            "threshold_ms": self.slow_threshold_ms,
+                            "phases": snap["phases"],
+                        },
+                        ensure_ascii=False,
+                    )
+                )
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+
+
+_CJK_RE = re.compile(r"[\u4e00-\u9fff]")
+_WORD_RE = re.compile(r"[A-Za-z0-9_]+")
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """Return the tiktoken encoding, or None when tiktoken is unavailable.
+
+    Loading an encoding is expensive (file read + BPE table build), so it is done once per process.
+    """
+    try:
+        import tiktoken  # type: ignore
+
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def token_count_fallback(text: str) -> int:
+    text = (text or "").strip()
+    if not text:
+        return 0
+
+    # Rough but stable: count CJK chars + word-ish chunks + remaining punctuation.
+    cjk = len(_CJK_RE.findall(text))
+    words = len(_WORD_RE.findall(text))
+    # Remaining non-space chars excluding counted word chars.
+    stripped = re.sub(_WORD_RE, "", text)
+    rest = sum(1 for ch in stripped if not ch.isspace())
+    return max(1, cjk + words + rest)
+
+
+def token_count(text: str) -> int:
+    text = text or ""
+    if not text.strip():
+        return 0
+
+    # Prefer tiktoken if available (more accurate), otherwise fallback.
+    enc = get_encoding()
+    if enc is None:
+        return token_count_fallback(text)
+    try:
+        return len(enc.encode(text))
+    except Exception:
+        return token_count_fallback(text)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` so that it encodes to at most `max_tokens` tokens."""
+    text = text or ""
+    if max_tokens <= 0:
+        return ""
+
+    enc = get_encoding()
+    if enc is not None:
+        try:
+            ids = enc.encode(text)
+            if len(ids) <= max_tokens:
+                return text
+            return enc.decode(ids[:max_tokens])
+        except Exception:
+            pass
+
+    # Fallback: shrink by characters until the estimate fits.
+    if token_count_fallback(text) <= max_tokens:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if token_count_fallback(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo]
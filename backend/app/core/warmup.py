@@ -0,0 +1,118 @@
+"""Eager initialization of slow singletons after startup, and the readiness state it drives.
+
+The lifespan handler starts `Warmup.run()` in the background; the steps (tokenizer, the agent
+clients of every profile deployment and, unless `KNOWLEDGE_ENABLED=0`, Chroma index and embedding client + first Entra
+token) run in parallel worker threads.
+Until every step has finished, `GET /api/health?ready=1` answers 503 so a load balancer keeps
+traffic on warm workers. A failed step (e.g. Azure not configured in local dev) is reported
+but does not keep the worker unready: requests would fail the same way after warm-up.
+
+`WARMUP=0` skips the steps; `WARMUP_TIMEOUT_S` (default 60) bounds each step.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from app.core.settings import env_float
+
+logger = logging.getLogger("app.warmup")
+
+
+def _warm_tokenizer() -> None:
+    from app.core.tokens import get_encoding
+
+    get_encoding()
+
+
+def _warm_agent() -> None:
+    from app.agents.agent_pool import AGENT_POOLS
+
+    AGENT_POOLS.warm_up()
+
+
+def _warm_index() -> None:
+    from app.knowledge.store import warm_up_index
+
+    warm_up_index()
+
+
+def _warm_embeddings() -> None:
+    from app.knowledge.store import warm_up_embeddings
+
+    warm_up_embeddings()
+
+
+def default_steps() -> dict[str, Callable[[], Any]]:
+    from app.core.settings import get_settings
+
+    steps: dict[str, Callable[[], Any]] = {"tokenizer": _warm_tokenizer, "agent": _warm_agent}
+    if get_settings().knowledge_enabled:
+        # Also pays the (lazy) chromadb import off the request path.
+        steps["knowledge_index"] = _warm_index
+        steps["embeddings"] = _warm_embeddings
+    return steps
+
+
+@dataclass
+class StepResult:
+    status: str = "pending"  # pending | ok | failed
+    ms: float | None = None
+    error: str | None = None
+
+
+class Warmup:
+    def __init__(self, steps: dict[str, Callable[[], Any]] | None = None, *, timeout: float | None = None) -> None:
+        self.steps = dict(default_steps() if steps is None else steps)
+        if timeout is None:
+            timeout = env_float("WARMUP_TIMEOUT_S", 60.0)
+        self.timeout = timeout
+        self.results = {name: StepResult() for name in self.steps}
+        self.started = False
+        self.finished = False
+        self.total_ms: float | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.finished
+
+    async def run(self) -> None:
+        self.started = True
+        start = time.perf_counter()
+        if (os.getenv("WARMUP") or "1").strip() == "0":
+            self.results = {}
+        else:
+            await asyncio.gather(*(self._run_step(name, fn) for name, fn in self.steps.items()))
+        self.total_ms = round((time.perf_counter() - start) * 1000.0, 1)
+        self.finished = True
+        logger.info("warm-up finished in %.0f ms: %s", self.total_ms, self.report()["steps"])
+
+    async def _run_step(self, name: str, fn: Callable[[], Any]) -> None:
+        result = self.results[name]
+        start = time.perf_counter()
+        try:
+            # The thread keeps running after a timeout; the worker just stops waiting for it.
+            await asyncio.wait_for(asyncio.to_thread(fn), self.timeout)
+            result.status = "ok"
+        except asyncio.TimeoutError:
+            result.status = "failed"
+            result.error = f"timed out after {self.timeout:g}s"
+        except Exception as exc:
+            result.status = "failed"
+            result.error = f"{type(exc).__name__}: {exc}"
+            logger.warning("warm-up step %s failed: %s", name, result.error)
+        result.ms = round((time.perf_counter() - start) * 1000.0, 1)
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "total_ms": self.total_ms,
+            "steps": {
+                name: {k: v for k, v in vars(r).items() if v is not None} for name, r in self.results.items()
+            },
+        }
@@ -0,0 +1,34 @@
+"""Maintenance commands for the token usage database.
+
+Usage (from the backend directory):
+
+    py -m app.db rebuild-rollups [--db PATH]
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from app.core.settings import get_settings
+from app.db.token_usage import rebuild_usage_rollups
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = sub.add_parser("rebuild-rollups", help="Backfill usage_rollup from raw usage rows")
+    rebuild.add_argument("--db", dest="db_path", default=None, help="SQLite path (default: TOKEN_USAGE_DB_PATH)")
+
+    args = parser.parse_args(argv)
+    # TOKEN_USAGE_DB_PATH may come from the env files.
+    get_settings()
+    if args.command == "rebuild-rollups":
+        buckets = rebuild_usage_rollups(db_path=args.db_path)
+        print(f"usage_rollup rebuilt: {buckets} buckets")
+        return 0
+    return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
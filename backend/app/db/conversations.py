@@ -0,0 +1,206 @@
+"""SQLite (WAL) conversation state shared by all workers on one host.
+
+See `app.agents.conversation_backend` for the data model. Each write is one short transaction:
+a compare-and-set UPDATE of the header row plus INSERTs of the new log messages, so concurrent
+workers serialize on SQLite's write lock only for that long and readers never block.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from app.agents.conversation_backend import StoredConversation, VersionConflict
+from app.core.metrics import SQLITE_WRITE_SECONDS, timed
+
+
+def _default_db_path() -> str:
+    env = os.getenv("CONVERSATION_DB_PATH")
+    if env and env.strip():
+        return env.strip()
+
+    # backend/app/db/conversations.py -> project root is parents[3]
+    project_root = Path(__file__).resolve().parents[3]
+    return str(project_root / "data" / "conversations.sqlite3")
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class SqliteConversationBackend:
+    blocking = True
+
+    def __init__(self, db_path: str | None = None) -> None:
+        self.db_path = db_path or _default_db_path()
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        # One connection per thread: asyncio.to_thread reuses a small pool of worker threads.
+        self._local = threading.local()
+        conn = self._conn()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError:
+            pass
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS conversation_state (
+                conversation_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                header TEXT NOT NULL,
+                snapshot TEXT,
+                log_start INTEGER NOT NULL DEFAULT 0,
+                log_end INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS conversation_log (
+                conversation_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                message TEXT NOT NULL,
+                PRIMARY KEY (conversation_id, seq)
+            ) WITHOUT ROWID;
+            """
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def version(self, conversation_id: str) -> int | None:
+        row = self._conn().execute(
+            "SELECT version FROM conversation_state WHERE conversation_id = ?",
+            (conversation_id,),
+        ).fetchone()
+        return int(row[0]) if row else None
+
+    def load(self, conversation_id: str) -> StoredConversation | None:
+        conn = self._conn()
+        # One read transaction so the header and the log come from the same commit.
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute(
+                """
+                SELECT version, header, snapshot, log_start, log_end
+                FROM conversation_state WHERE conversation_id = ?
+                """,
+                (conversation_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            messages = conn.execute(
+                """
+                SELECT message FROM conversation_log
+                WHERE conversation_id = ? AND seq >= ? AND seq < ?
+                ORDER BY seq
+                """,
+                (conversation_id, int(row[3]), int(row[4])),
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        return StoredConversation(
+            version=int(row[0]),
+            header=json.loads(row[1]),
+            snapshot=json.loads(row[2]) if row[2] is not None else None,
+            log=[json.loads(m[0]) for m in messages],
+        )
+
+    @timed(SQLITE_WRITE_SECONDS, "conversation_write")
+    def write(
+        self,
+        conversation_id: str,
+        *,
+        expected_version: int,
+        header: dict[str, Any],
+        append: list[dict[str, str]] | None = None,
+        replace_log: list[dict[str, str]] | None = None,
+        snapshot: dict[str, Any] | None = None,
+    ) -> int:
+        conn = self._conn()
+        now = datetime.now(timezone.utc).isoformat()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT version, log_start, log_end FROM conversation_state WHERE conversation_id = ?",
+                (conversation_id,),
+            ).fetchone()
+            current_version = int(row[0]) if row else 0
+            if current_version != expected_version:
+                raise VersionConflict(conversation_id)
+            log_start, log_end = (int(row[1]), int(row[2])) if row else (0, 0)
+
+            messages = append or []
+            if replace_log is not None:
+                conn.execute(
+                    "DELETE FROM conversation_log WHERE conversation_id = ? AND seq < ?",
+                    (conversation_id, log_end),
+                )
+                log_start = log_end
+                messages = replace_log
+            conn.executemany(
+                "INSERT INTO conversation_log (conversation_id, seq, message) VALUES (?, ?, ?)",
+                [(conversation_id, log_end + i, _dumps(m)) for i, m in enumerate(messages)],
+            )
+            log_end += len(messages)
+
+            new_version = expected_version + 1
+            if row is None:
+                conn.execute(
+                    """
+                    INSERT INTO conversation_state
+                        (conversation_id, version, header, snapshot, log_start, log_end, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        conversation_id,
+                        new_version,
+                        _dumps(header),
+                        _dumps(snapshot) if snapshot is not None else None,
+                        log_start,
+                        log_end,
+                        now,
+                    ),
+                )
+            elif replace_log is not None:
+                conn.execute(
+                    """
+                    UPDATE conversation_state
+                    SET version = ?, header = ?, snapshot = ?, log_start = ?, log_end = ?, updated_at = ?
+                    WHERE conversation_id = ?
+                    """,
+                    (
+                        new_version,
+                        _dumps(header),
+                        _dumps(snapshot) if snapshot is not None else None,
+                        log_start,
+                        log_end,
+                        now,
+                        conversation_id,
+                    ),
+                )
+            else:
+                # The snapshot column is left untouched: appends never rewrite it.
+                conn.execute(
+                    """
+                    UPDATE conversation_state
+                    SET version = ?, header = ?, log_end = ?, updated_at = ?
+                    WHERE conversation_id = ?
+                    """,
+                    (new_version, _dumps(header), log_end, now, conversation_id),
+                )
+            conn.execute("COMMIT")
+            return new_version
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def count(self) -> int:
+        row = self._conn().execute("SELECT COUNT(*) FROM conversation_state").fetchone()
+        return int(row[0]) if row else 0
@@ -0,0 +1,71 @@
+"""Stand-in network key-value service for `CONVERSATION_BACKEND=http` (local dev and tests).
+
+Data lives in process memory, so run exactly one instance:
+
+    py -m uvicorn app.db.kv_server:app --app-dir backend --port 8765
+
+Protocol (all bodies JSON):
+
+- `GET /kv/{key}` -> `{value, version}` or 404
+- `PUT /kv/{key}` `{value, expected_version?}` -> `{version}`; 409 if `expected_version`
+  (0 = must not exist) does not match
+- `POST /kv/_mget` `{keys}` -> `{items: [{value, version} | null]}`
+- `POST /kv/_delete` `{keys}` -> `{deleted}`
+- `GET /kv/_count?prefix=` -> `{count}`
+"""
+
+from __future__ import annotations
+
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+from app.agents.conversation_backend import MemoryKeyValueClient, VersionConflict
+
+
+class PutBody(BaseModel):
+    value: str
+    expected_version: int | None = None
+
+
+class KeysBody(BaseModel):
+    keys: list[str]
+
+
+def create_kv_app(store: MemoryKeyValueClient | None = None) -> FastAPI:
+    kv = store or MemoryKeyValueClient()
+    app = FastAPI(title="kv stand-in")
+
+    # Fixed routes first so `{key:path}` does not swallow them.
+    @app.post("/kv/_mget")
+    def mget(body: KeysBody) -> dict:
+        items = kv.mget(body.keys)
+        return {"items": [{"value": e.value, "version": e.version} if e else None for e in items]}
+
+    @app.post("/kv/_delete")
+    def delete(body: KeysBody) -> dict:
+        kv.delete(body.keys)
+        return {"deleted": len(body.keys)}
+
+    @app.get("/kv/_count")
+    def count(prefix: str = "") -> dict:
+        return {"count": kv.count(prefix)}
+
+    @app.get("/kv/{key:path}")
+    def get(key: str) -> dict:
+        entry = kv.get(key)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="not found")
+        return {"value": entry.value, "version": entry.version}
+
+    @app.put("/kv/{key:path}")
+    def put(key: str, body: PutBody) -> dict:
+        try:
+            version = kv.put(key, body.value, expected_version=body.expected_version)
+        except VersionConflict as exc:
+            raise HTTPException(status_code=409, detail=str(exc)) from exc
+        return {"version": version}
+
+    return app
+
+
+app = create_kv_app()
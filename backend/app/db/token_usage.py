@@ -2,10 +2,13 @@ from __future__ import annotations
 
 import os
 import sqlite3
+import threading
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
+
+from app.core.metrics import SQLITE_WRITE_SECONDS, timed
 
 
 def _default_db_path() -> str:
@@ -18,14 +21,30 @@ def _default_db_path() -> str:
     return str(project_root / "data" / "token_usage.sqlite3")
 
 
-def _connect(db_path: str | None = None) -> sqlite3.Connection:
+_schema_lock = threading.Lock()
+_schema_ready: set[str] = set()
+
+
+def _connect(db_path: str | None = None, *, check_same_thread: bool = True) -> sqlite3.Connection:
     path = db_path or _default_db_path()
-    conn = sqlite3.connect(path, timeout=30)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row
+    # WAL lets readers proceed while a writer holds the lock; NORMAL is durable enough in WAL mode.
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if path not in _schema_ready:
+        with _schema_lock:
+            if path not in _schema_ready:
+                _ensure_schema(conn)
+                _schema_ready.add(path)
     return conn
 
 
 def _ensure_schema(conn: sqlite3.Connection) -> None:
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.DatabaseError:
+        # e.g. in-memory databases or file systems without shared-memory support.
+        pass
     conn.execute(
         """
         CREATE TABLE IF NOT EXISTS conversation_turn_usage (
@@ -46,9 +65,100 @@ def _ensure_schema(conn: sqlite3.Connection) -> None:
     conn.execute(
         "CREATE INDEX IF NOT EXISTS idx_ctu_conversation_turn ON conversation_turn_usage(conversation_id, turn_index)"
     )
+    # High-frequency synthetic operations (e.g. knowledge queries) are aggregated per minute
+    # instead of growing one raw row per call under a single conversation key. Minute buckets
+    # let `rebuild_usage_rollups` restore every rollup granularity; listings are per hour.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS operation_usage (
+            operation TEXT NOT NULL,
+            model_name TEXT NOT NULL DEFAULT '',
+            bucket_start TEXT NOT NULL,
+            calls INTEGER NOT NULL DEFAULT 0,
+            input_tokens INTEGER NOT NULL DEFAULT 0,
+            output_tokens INTEGER NOT NULL DEFAULT 0,
+            total_tokens INTEGER NOT NULL DEFAULT 0,
+            last_created_at TEXT NOT NULL,
+            PRIMARY KEY (operation, model_name, bucket_start)
+        )
+        """
+    )
+    # Incrementally maintained time buckets (minute/hour/day x model x conversation class) so that
+    # usage analytics never have to scan raw rows.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS usage_rollup (
+            granularity TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            model_name TEXT NOT NULL DEFAULT '',
+            conversation_class TEXT NOT NULL,
+            turns INTEGER NOT NULL DEFAULT 0,
+            input_tokens INTEGER NOT NULL DEFAULT 0,
+            output_tokens INTEGER NOT NULL DEFAULT 0,
+            total_tokens INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, bucket_start, model_name, conversation_class)
+        ) WITHOUT ROWID
+        """
+    )
     conn.commit()
 
 
+ROLLUP_GRANULARITIES = ("minute", "hour", "day")
+ROLLUP_GROUP_COLUMNS = ("model_name", "conversation_class")
+
+
+def conversation_class(conversation_id: str) -> str:
+    """Classify usage rows for rollups: synthetic `knowledge:*` conversations vs regular chat."""
+    return "knowledge" if (conversation_id or "").startswith("knowledge:") else "chat"
+
+
+def bucket_start(ts: datetime, granularity: str) -> str:
+    ts = ts.astimezone(timezone.utc)
+    if granularity == "minute":
+        ts = ts.replace(second=0, microsecond=0)
+    elif granularity == "hour":
+        ts = ts.replace(minute=0, second=0, microsecond=0)
+    elif granularity == "day":
+        ts = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+    return ts.isoformat()
+
+
+def _apply_rollups(
+    conn: sqlite3.Connection,
+    ts: datetime,
+    conv_class: str,
+    model_name: str | None,
+    input_tokens: int,
+    output_tokens: int,
+    total_tokens: int,
+) -> None:
+    conn.executemany(
+        """
+        INSERT INTO usage_rollup (
+            granularity, bucket_start, model_name, conversation_class, turns, input_tokens, output_tokens, total_tokens
+        ) VALUES (?, ?, ?, ?, 1, ?, ?, ?)
+        ON CONFLICT(granularity, bucket_start, model_name, conversation_class) DO UPDATE SET
+            turns = turns + 1,
+            input_tokens = input_tokens + excluded.input_tokens,
+            output_tokens = output_tokens + excluded.output_tokens,
+            total_tokens = total_tokens + excluded.total_tokens
+        """,
+        [
+            (g, bucket_start(ts, g), model_name or "", conv_class, input_tokens, output_tokens, total_tokens)
+            for g in ROLLUP_GRANULARITIES
+        ],
+    )
+
+
+def _usage_values(usage: dict[str, int]) -> tuple[int, int, int]:
+    input_tokens = int(usage.get("input_tokens", 0))
+    output_tokens = int(usage.get("output_tokens", 0))
+    total_tokens = int(usage.get("total_tokens", input_tokens + output_tokens))
+    return input_tokens, output_tokens, total_tokens
+
+
 @dataclass(frozen=True)
 class TurnUsageRow:
     conversation_id: str
@@ -68,6 +178,7 @@ class ConversationSummary:
     last_created_at: str
 
 
+@timed(SQLITE_WRITE_SECONDS, "record_turn_usage")
 def record_turn_usage(
     conversation_id: str,
     turn_index: int,
@@ -76,24 +187,203 @@ def record_turn_usage(
     *,
     db_path: str | None = None,
 ) -> None:
-    input_tokens = int(usage.get("input_tokens", 0))
-    output_tokens = int(usage.get("output_tokens", 0))
-    total_tokens = int(usage.get("total_tokens", input_tokens + output_tokens))
-
-    created_at = datetime.now(timezone.utc).isoformat()
+    input_tokens, output_tokens, total_tokens = _usage_values(usage)
+    now = datetime.now(timezone.utc)
 
     conn = _connect(db_path)
     try:
-        _ensure_schema(conn)
         conn.execute(
             """
             INSERT INTO conversation_turn_usage (
                 conversation_id, turn_index, model_name, input_tokens, output_tokens, total_tokens, created_at
             ) VALUES (?, ?, ?, ?, ?, ?, ?)
             """,
-            (conversation_id, int(turn_index), model_name, input_tokens, output_tokens, total_tokens, created_at),
+            (conversation_id, int(turn_index), model_name, input_tokens, output_tokens, total_tokens, now.isoformat()),
+        )
+        _apply_rollups(
+            conn, now, conversation_class(conversation_id), model_name, input_tokens, output_tokens, total_tokens
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@timed(SQLITE_WRITE_SECONDS, "record_turn_usage_many")
+def record_turn_usage_many(
+    rows: list[tuple[str, int, dict[str, int], str | None]],
+    *,
+    db_path: str | None = None,
+) -> int:
+    """Insert many `(conversation_id, turn_index, usage, model_name)` rows in one transaction."""
+    if not rows:
+        return 0
+    now = datetime.now(timezone.utc)
+    created_at = now.isoformat()
+    values = [
+        (conversation_id, int(turn_index), model_name, *_usage_values(usage), created_at)
+        for conversation_id, turn_index, usage, model_name in rows
+    ]
+
+    conn = _connect(db_path)
+    try:
+        conn.executemany(
+            """
+            INSERT INTO conversation_turn_usage (
+                conversation_id, turn_index, model_name, input_tokens, output_tokens, total_tokens, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            values,
         )
+        for conversation_id, _, model_name, input_tokens, output_tokens, total_tokens, _ in values:
+            _apply_rollups(
+                conn, now, conversation_class(conversation_id), model_name, input_tokens, output_tokens, total_tokens
+            )
         conn.commit()
+        return len(values)
+    finally:
+        conn.close()
+
+
+@timed(SQLITE_WRITE_SECONDS, "record_next_turn_usage")
+def record_next_turn_usage(
+    conversation_id: str,
+    usage: dict[str, int],
+    model_name: str | None = None,
+    *,
+    db_path: str | None = None,
+) -> int:
+    """Append a usage row with the next turn index for `conversation_id` and return that index.
+
+    The index is computed inside the INSERT itself, so concurrent writers can never
+    observe the same MAX(turn_index) and no separate COUNT round trip is needed.
+    """
+    input_tokens, output_tokens, total_tokens = _usage_values(usage)
+    now = datetime.now(timezone.utc)
+    created_at = now.isoformat()
+
+    conn = _connect(db_path)
+    try:
+        cur = conn.execute(
+            """
+            INSERT INTO conversation_turn_usage (
+                conversation_id, turn_index, model_name, input_tokens, output_tokens, total_tokens, created_at
+            )
+            SELECT ?, COALESCE(MAX(turn_index), 0) + 1, ?, ?, ?, ?, ?
+            FROM conversation_turn_usage
+            WHERE conversation_id = ?
+            """,
+            (conversation_id, model_name, input_tokens, output_tokens, total_tokens, created_at, conversation_id),
+        )
+        row = conn.execute(
+            "SELECT turn_index FROM conversation_turn_usage WHERE id = ?",
+            (cur.lastrowid,),
+        ).fetchone()
+        _apply_rollups(
+            conn, now, conversation_class(conversation_id), model_name, input_tokens, output_tokens, total_tokens
+        )
+        conn.commit()
+        return int(row["turn_index"]) if row is not None else 0
+    finally:
+        conn.close()
+
+
+@dataclass(frozen=True)
+class OperationUsageRow:
+    operation: str
+    model_name: str | None
+    bucket_start: str
+    calls: int
+    input_tokens: int
+    output_tokens: int
+    total_tokens: int
+    last_created_at: str
+
+
+@timed(SQLITE_WRITE_SECONDS, "record_operation_usage")
+def record_operation_usage(
+    operation: str,
+    usage: dict[str, int],
+    model_name: str | None = None,
+    *,
+    db_path: str | None = None,
+) -> None:
+    """Add one call's usage to the per-minute rollup of a synthetic operation (single UPSERT)."""
+    input_tokens, output_tokens, total_tokens = _usage_values(usage)
+    now = datetime.now(timezone.utc)
+
+    conn = _connect(db_path)
+    try:
+        conn.execute(
+            """
+            INSERT INTO operation_usage (
+                operation, model_name, bucket_start, calls, input_tokens, output_tokens, total_tokens, last_created_at
+            ) VALUES (?, ?, ?, 1, ?, ?, ?, ?)
+            ON CONFLICT(operation, model_name, bucket_start) DO UPDATE SET
+                calls = calls + 1,
+                input_tokens = input_tokens + excluded.input_tokens,
+                output_tokens = output_tokens + excluded.output_tokens,
+                total_tokens = total_tokens + excluded.total_tokens,
+                last_created_at = excluded.last_created_at
+            """,
+            (
+                operation,
+                model_name or "",
+                bucket_start(now, "minute"),
+                input_tokens,
+                output_tokens,
+                total_tokens,
+                now.isoformat(),
+            ),
+        )
+        _apply_rollups(
+            conn, now, conversation_class(operation), model_name, input_tokens, output_tokens, total_tokens
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def list_operation_usage(
+    operation: str | None = None,
+    *,
+    db_path: str | None = None,
+    limit: int = 168,
+) -> list[OperationUsageRow]:
+    conn = _connect(db_path)
+    try:
+        where, params = ("WHERE operation = ?", [operation]) if operation else ("", [])
+        rows = conn.execute(
+            f"""
+            SELECT
+                operation,
+                model_name,
+                substr(bucket_start, 1, 13) || ':00:00+00:00' AS bucket_start,
+                SUM(calls) AS calls,
+                SUM(input_tokens) AS input_tokens,
+                SUM(output_tokens) AS output_tokens,
+                SUM(total_tokens) AS total_tokens,
+                MAX(last_created_at) AS last_created_at
+            FROM operation_usage
+            {where}
+            GROUP BY operation, model_name, substr(bucket_start, 1, 13)
+            ORDER BY bucket_start DESC, operation ASC, model_name ASC
+            LIMIT ?
+            """,
+            (*params, int(limit)),
+        ).fetchall()
+        return [
+            OperationUsageRow(
+                operation=str(r["operation"]),
+                model_name=str(r["model_name"]) or None,
+                bucket_start=str(r["bucket_start"]),
+                calls=int(r["calls"]),
+                input_tokens=int(r["input_tokens"]),
+                output_tokens=int(r["output_tokens"]),
+                total_tokens=int(r["total_tokens"]),
+                last_created_at=str(r["last_created_at"]),
+            )
+            for r in rows
+        ]
     finally:
         conn.close()
 
@@ -106,7 +396,6 @@ def list_conversations_page(
 ) -> list[ConversationSummary]:
     conn = _connect(db_path)
     try:
-        _ensure_schema(conn)
         rows = conn.execute(
             """
             SELECT
@@ -140,7 +429,6 @@ def count_conversations(
 ) -> int:
     conn = _connect(db_path)
     try:
-        _ensure_schema(conn)
         row = conn.execute(
             """
             SELECT COUNT(1) AS total
@@ -165,7 +453,6 @@ def list_turn_usage(
 ) -> list[TurnUsageRow]:
     conn = _connect(db_path)
     try:
-        _ensure_schema(conn)
         rows = conn.execute(
             """
             SELECT conversation_id, turn_index, model_name, input_tokens, output_tokens, total_tokens, created_at
@@ -201,7 +488,6 @@ def list_turn_usage_page(
 ) -> list[TurnUsageRow]:
     conn = _connect(db_path)
     try:
-        _ensure_schema(conn)
         rows = conn.execute(
             """
             SELECT conversation_id, turn_index, model_name, input_tokens, output_tokens, total_tokens, created_at
@@ -235,7 +521,6 @@ def count_turn_usage(
 ) -> int:
     conn = _connect(db_path)
     try:
-        _ensure_schema(conn)
         row = conn.execute(
             """
             SELECT COUNT(1) AS total
@@ -258,7 +543,6 @@ def summarize_usage(
 ) -> dict[str, Any]:
     conn = _connect(db_path)
     try:
-        _ensure_schema(conn)
         row = conn.execute(
             """
             SELECT
@@ -281,3 +565,223 @@ def summarize_usage(
         }
     finally:
         conn.close()
+
+
+EXPORT_COLUMNS = (
+    "id",
+    "conversation_id",
+    "turn_index",
+    "model_name",
+    "input_tokens",
+    "output_tokens",
+    "total_tokens",
+    "created_at",
+)
+
+
+def _prefix_upper_bound(prefix: str) -> str | None:
+    """Smallest string greater than every string starting with `prefix` (None if unbounded)."""
+    while prefix:
+        last = ord(prefix[-1])
+        if last < 0x10FFFF:
+            return prefix[:-1] + chr(last + 1)
+        prefix = prefix[:-1]
+    return None
+
+
+def iter_turn_usage_export(
+    *,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    conversation_prefix: str | None = None,
+    after_id: int = 0,
+    limit: int | None = None,
+    batch_size: int = 1000,
+    db_path: str | None = None,
+) -> Iterator[list[tuple]]:
+    """Yield raw usage rows (as `EXPORT_COLUMNS` tuples) in id order, one batch at a time.
+
+    Rows are pulled from a single SQLite cursor with `fetchmany`, so memory stays bounded by
+    `batch_size` no matter how many rows match. Pass the last exported `id` as `after_id` to resume.
+    The connection may be consumed from a different thread than the one that created it
+    (e.g. a streaming response iterated in a thread pool), but never concurrently.
+    """
+    where = ["id > ?"]
+    params: list[Any] = [int(after_id)]
+    if start is not None:
+        where.append("created_at >= ?")
+        params.append(start.astimezone(timezone.utc).isoformat())
+    if end is not None:
+        where.append("created_at < ?")
+        params.append(end.astimezone(timezone.utc).isoformat())
+    if conversation_prefix:
+        where.append("conversation_id >= ?")
+        params.append(conversation_prefix)
+        upper = _prefix_upper_bound(conversation_prefix)
+        if upper is not None:
+            where.append("conversation_id < ?")
+            params.append(upper)
+    limit_sql = ""
+    if limit is not None:
+        limit_sql = "LIMIT ?"
+        params.append(int(limit))
+
+    conn = _connect(db_path, check_same_thread=False)
+    try:
+        # NOT INDEXED keeps the scan in rowid order, so ORDER BY id never needs a temp sort.
+        cur = conn.execute(
+            f"""
+            SELECT {", ".join(EXPORT_COLUMNS)}
+            FROM conversation_turn_usage NOT INDEXED
+            WHERE {" AND ".join(where)}
+            ORDER BY id ASC
+            {limit_sql}
+            """,
+            params,
+        )
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [tuple(r) for r in rows]
+    finally:
+        conn.close()
+
+
+def summarize_usage_buckets(
+    *,
+    granularity: str = "hour",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    group_by: tuple[str, ...] = (),
+    db_path: str | None = None,
+) -> list[dict[str, Any]]:
+    """Aggregate token usage per time bucket from `usage_rollup` (cost independent of raw row count).
+
+    `start` is floored to the bucket containing it; `end` is exclusive.
+    """
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+    for col in group_by:
+        if col not in ROLLUP_GROUP_COLUMNS:
+            raise ValueError(f"Unsupported group_by column: {col}")
+
+    where = ["granularity = ?"]
+    params: list[Any] = [granularity]
+    if start is not None:
+        where.append("bucket_start >= ?")
+        params.append(bucket_start(start, granularity))
+    if end is not None:
+        where.append("bucket_start < ?")
+        params.append(end.astimezone(timezone.utc).isoformat())
+
+    group_cols = ["bucket_start", *group_by]
+    select_cols = ", ".join(group_cols)
+
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute(
+            f"""
+            SELECT
+                {select_cols},
+                SUM(turns) AS turns,
+                SUM(input_tokens) AS input_tokens,
+                SUM(output_tokens) AS output_tokens,
+                SUM(total_tokens) AS total_tokens
+            FROM usage_rollup
+            WHERE {" AND ".join(where)}
+            GROUP BY {select_cols}
+            ORDER BY {select_cols}
+            """,
+            params,
+        ).fetchall()
+        items: list[dict[str, Any]] = []
+        for r in rows:
+            item: dict[str, Any] = {"bucket_start": str(r["bucket_start"])}
+            for col in group_by:
+                value = r[col]
+                item[col] = (str(value) or None) if value is not None else None
+            item["turns"] = int(r["turns"])
+            item["input_tokens"] = int(r["input_tokens"])
+            item["output_tokens"] = int(r["output_tokens"])
+            item["total_tokens"] = int(r["total_tokens"])
+            items.append(item)
+        return items
+    finally:
+        conn.close()
+
+
+_REBUILD_BUCKET_EXPR = {
+    "minute": "substr(created_at, 1, 16) || ':00+00:00'",
+    "hour": "substr(created_at, 1, 13) || ':00:00+00:00'",
+    "day": "substr(created_at, 1, 10) || 'T00:00:00+00:00'",
+}
+
+
+def rebuild_usage_rollups(*, db_path: str | None = None) -> int:
+    """Recompute `usage_rollup` from raw rows and the operation rollups. Returns the bucket count.
+
+    Raw `created_at` values and operation `bucket_start` values are UTC ISO-8601 strings, so
+    buckets are derived by prefix. Operation rows written before operations were bucketed per
+    minute are hourly; they land in the first minute of their hour.
+    """
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM usage_rollup")
+        for granularity, expr in _REBUILD_BUCKET_EXPR.items():
+            conn.execute(
+                f"""
+                INSERT INTO usage_rollup (
+                    granularity, bucket_start, model_name, conversation_class,
+                    turns, input_tokens, output_tokens, total_tokens
+                )
+                SELECT
+                    ?,
+                    {expr} AS bucket,
+                    COALESCE(model_name, '') AS model,
+                    CASE WHEN conversation_id LIKE 'knowledge:%' THEN 'knowledge' ELSE 'chat' END AS class,
+                    COUNT(1),
+                    COALESCE(SUM(input_tokens), 0),
+                    COALESCE(SUM(output_tokens), 0),
+                    COALESCE(SUM(total_tokens), 0)
+                FROM conversation_turn_usage
+                GROUP BY bucket, model, class
+                """,
+                (granularity,),
+            )
+
+        for granularity, expr in _REBUILD_BUCKET_EXPR.items():
+            expr = expr.replace("created_at", "bucket_start")
+            conn.execute(
+                f"""
+                INSERT INTO usage_rollup (
+                    granularity, bucket_start, model_name, conversation_class,
+                    turns, input_tokens, output_tokens, total_tokens
+                )
+                SELECT
+                    ?,
+                    {expr} AS bucket,
+                    model_name,
+                    CASE WHEN operation LIKE 'knowledge:%' THEN 'knowledge' ELSE 'chat' END AS class,
+                    SUM(calls),
+                    SUM(input_tokens),
+                    SUM(output_tokens),
+                    SUM(total_tokens)
+                FROM operation_usage
+                WHERE 1
+                GROUP BY bucket, model_name, class
+                ON CONFLICT(granularity, bucket_start, model_name, conversation_class) DO UPDATE SET
+                    turns = turns + excluded.turns,
+                    input_tokens = input_tokens + excluded.input_tokens,
+                    output_tokens = output_tokens + excluded.output_tokens,
+                    total_tokens = total_tokens + excluded.total_tokens
+                """,
+                (granularity,),
+            )
+
+        row = conn.execute("SELECT COUNT(1) AS total FROM usage_rollup").fetchone()
+        conn.commit()
+        return int(row["total"]) if row is not None else 0
+    finally:
+        conn.close()
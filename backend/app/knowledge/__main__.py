@@ -0,0 +1,55 @@
+"""Maintenance commands for the knowledge index.
+
+Usage (from the backend directory):
+
+    py -m app.knowledge sync [--kb NAME | --all] [--dry-run] [--no-prune]
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from app.core.settings import get_settings
+
+# Env files first: the store's embedding admission limits are read at import time.
+get_settings()
+
+from app.knowledge.store import DEFAULT_KB, knowledge_base_name, list_knowledge_bases  # noqa: E402
+from app.knowledge.sync import sync_uploads  # noqa: E402
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.knowledge")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sync = sub.add_parser("sync", help="Re-embed new/changed uploads and drop chunks of removed ones")
+    sync.add_argument("--kb", default=DEFAULT_KB, help="Knowledge base to sync (default: default)")
+    sync.add_argument("--all", action="store_true", help="Sync every existing knowledge base")
+    sync.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    sync.add_argument("--no-prune", dest="prune", action="store_false", help="Keep chunks whose file is gone")
+
+    args = parser.parse_args(argv)
+    if args.command == "sync":
+        kbs = [kb["name"] for kb in list_knowledge_bases()] if args.all else [knowledge_base_name(args.kb)]
+        failed = False
+        for kb in kbs:
+            report = sync_uploads(kb=kb, dry_run=args.dry_run, prune=args.prune)
+            prefix = "[dry run] " if report.dry_run else ""
+            print(
+                f"{prefix}{kb}: unchanged={len(report.unchanged)} touched={len(report.touched)} "
+                f"indexed={len(report.indexed)} removed={len(report.removed)} failed={len(report.failed)} "
+                f"chunks_indexed={report.chunks_indexed} chunks_deleted={report.chunks_deleted}"
+            )
+            for name in report.indexed:
+                print(f"  indexed {name}")
+            for name in report.removed:
+                print(f"  removed {name}")
+            for name, error in report.failed.items():
+                print(f"  failed  {name}: {error}")
+            failed = failed or bool(report.failed)
+        return 1 if failed else 0
+    return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
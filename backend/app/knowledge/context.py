@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Iterable
+
+from app.core.tokens import token_count, truncate_to_tokens
+
+
+# Overlap between neighbouring chunks is bounded by `chunk_text(overlap=...)`; search a bit wider
+# so that whitespace trimming at chunk edges never hides a match.
+_MAX_OVERLAP_CHARS = 512
+# Unindexed chunks (older data without `chunk_index`) are only stitched on a clearly real overlap.
+_MIN_UNINDEXED_OVERLAP_CHARS = 32
+_SHINGLE_SIZE = 5
+_WS_RE = re.compile(r"\s+")
+
+
+@dataclass(frozen=True)
+class PackedPassage:
+    text: str
+    source: str
+    distance: float | None
+    chunk_indices: tuple[int, ...] = ()
+    tokens: int = 0
+    truncated: bool = False
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "text": self.text,
+            "source": self.source,
+            "distance": self.distance,
+            "chunk_indices": list(self.chunk_indices),
+            "tokens": self.tokens,
+            "truncated": self.truncated,
+        }
+
+
+@dataclass
+class PackedContext:
+    passages: list[PackedPassage] = field(default_factory=list)
+    dropped: list[dict[str, Any]] = field(default_factory=list)
+    tokens: int = 0
+    budget: int | None = None
+    retrieved: int = 0
+    overlap_chars_removed: int = 0
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "retrieved": self.retrieved,
+            "passages": len(self.passages),
+            "tokens": self.tokens,
+            "budget": self.budget,
+            "overlap_chars_removed": self.overlap_chars_removed,
+            "dropped": list(self.dropped),
+        }
+
+
+@dataclass
+class _Candidate:
+    text: str
+    source: str
+    distance: float | None
+    chunk_indices: list[int]
+    rank: int
+
+
+def format_passage(idx: int, source: str, text: str) -> str:
+    return f"[{idx}] 来源:{source}\n{text}"
+
+
+def _distance_key(distance: float | None) -> float:
+    return float("inf") if distance is None else float(distance)
+
+
+def _overlap_len(left: str, right: str, *, max_chars: int = _MAX_OVERLAP_CHARS) -> int:
+    """Length of the longest suffix of `left` that is also a prefix of `right`."""
+    limit = min(len(left), len(right), max_chars)
+    for size in range(limit, 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _shingles(text: str) -> set[str]:
+    norm = _WS_RE.sub(" ", text.lower()).strip()
+    if len(norm) <= _SHINGLE_SIZE:
+        return {norm} if norm else set()
+    return {norm[i : i + _SHINGLE_SIZE] for i in range(len(norm) - _SHINGLE_SIZE + 1)}
+
+
+def _jaccard(a: set[str], b: set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    inter = len(a & b)
+    if not inter:
+        return 0.0
+    return inter / float(len(a) + len(b) - inter)
+
+
+def _drop_entry(source: str, chunk_indices: Iterable[int], distance: float | None, reason: str) -> dict[str, Any]:
+    return {
+        "source": source,
+        "chunk_indices": list(chunk_indices),
+        "distance": distance,
+        "reason": reason,
+    }
+
+
+def _merge_neighbours(candidates: list[_Candidate], packed: PackedContext) -> list[_Candidate]:
+    """Merge chunks that are adjacent in the same source document and strip the shared overlap."""
+    by_source: dict[str, list[_Candidate]] = {}
+    for cand in candidates:
+        by_source.setdefault(cand.source, []).append(cand)
+
+    merged: list[_Candidate] = []
+    for source, group in by_source.items():
+        indexed = sorted((c for c in group if c.chunk_indices), key=lambda c: c.chunk_indices[0])
+        unindexed = [c for c in group if not c.chunk_indices]
+
+        current: _Candidate | None = None
+        for cand in indexed:
+            if current is not None and cand.chunk_indices[0] == current.chunk_indices[-1] + 1:
+                overlap = _overlap_len(current.text, cand.text)
+                packed.overlap_chars_removed += overlap
+                joiner = "" if overlap else " "
+                current = _Candidate(
+                    text=current.text + joiner + cand.text[overlap:],
+                    source=source,
+                    distance=min(current.distance, cand.distance, key=_distance_key),
+                    chunk_indices=current.chunk_indices + cand.chunk_indices,
+                    rank=min(current.rank, cand.rank),
+                )
+                continue
+            if current is not None:
+                merged.append(current)
+            current = cand
+        if current is not None:
+            merged.append(current)
+
+        # Without chunk positions we can still stitch pieces whose edges overlap verbatim.
+        pending = sorted(unindexed, key=lambda c: c.rank)
+        while pending:
+            base = pending.pop(0)
+            changed = True
+            while changed:
+                changed = False
+                for other in list(pending):
+                    head = _overlap_len(base.text, other.text)
+                    tail = _overlap_len(other.text, base.text)
+                    if head >= _MIN_UNINDEXED_OVERLAP_CHARS:
+                        text = base.text + other.text[head:]
+                        packed.overlap_chars_removed += head
+                    elif tail >= _MIN_UNINDEXED_OVERLAP_CHARS:
+                        text = other.text + base.text[tail:]
+                        packed.overlap_chars_removed += tail
+                    else:
+                        continue
+                    base = _Candidate(
+                        text=text,
+                        source=source,
+                        distance=min(base.distance, other.distance, key=_distance_key),
+                        chunk_indices=[],
+                        rank=min(base.rank, other.rank),
+                    )
+                    pending.remove(other)
+                    changed = True
+            merged.append(base)
+
+    merged.sort(key=lambda c: (_distance_key(c.distance), c.rank))
+    return merged
+
+
+def pack_context(
+    chunks: Iterable[Any],
+    *,
+    max_tokens: int | None = None,
+    max_distance: float | None = None,
+    duplicate_threshold: float = 0.9,
+) -> PackedContext:
+    """Select and compact retrieved chunks into prompt passages.
+
+    `chunks` are retrieval hits exposing `text`, `source`, `distance` and (optionally) `chunk_index`,
+    best match first. The packer drops hits beyond `max_distance`, drops near-duplicate passages,
+    merges neighbouring chunks of the same source (removing the chunker's overlap) and then fills
+    passages in relevance order until `max_tokens` (measured with the real tokenizer) is reached.
+    Everything that is left out is listed in `PackedContext.dropped` with a reason.
+    """
+    packed = PackedContext(budget=max_tokens)
+
+    candidates: list[_Candidate] = []
+    kept_shingles: list[set[str]] = []
+    for rank, chunk in enumerate(chunks):
+        packed.retrieved += 1
+        text = str(getattr(chunk, "text", "") or "").strip()
+        source = str(getattr(chunk, "source", None) or "unknown")
+        distance = getattr(chunk, "distance", None)
+        chunk_index = getattr(chunk, "chunk_index", None)
+        indices = [int(chunk_index)] if chunk_index is not None else []
+
+        if not text:
+            packed.dropped.append(_drop_entry(source, indices, distance, "empty"))
+            continue
+        if max_distance is not None and distance is not None and float(distance) > max_distance:
+            packed.dropped.append(_drop_entry(source, indices, distance, "distance"))
+            continue
+
+        shingles = _shingles(text)
+        if any(_jaccard(shingles, seen) >= duplicate_threshold for seen in kept_shingles):
+            packed.dropped.append(_drop_entry(source, indices, distance, "duplicate"))
+            continue
+        kept_shingles.append(shingles)
+        candidates.append(_Candidate(text=text, source=source, distance=distance, chunk_indices=indices, rank=rank))
+
+    for cand in _merge_neighbours(candidates, packed):
+        idx = len(packed.passages) + 1
+        cost = token_count(format_passage(idx, cand.source, cand.text))
+        text = cand.text
+        truncated = False
+        if max_tokens is not None and packed.tokens + cost > max_tokens:
+            if packed.passages:
+                packed.dropped.append(_drop_entry(cand.source, cand.chunk_indices, cand.distance, "budget"))
+                continue
+            # Never answer from an empty context: cut the best passage down to the budget instead.
+            header_cost = token_count(format_passage(idx, cand.source, ""))
+            text = truncate_to_tokens(cand.text, max(0, max_tokens - header_cost))
+            if not text.strip():
+                packed.dropped.append(_drop_entry(cand.source, cand.chunk_indices, cand.distance, "budget"))
+                continue
+            cost = token_count(format_passage(idx, cand.source, text))
+            truncated = True
+
+        packed.tokens += cost
+        packed.passages.append(
+            PackedPassage(
+                text=text,
+                source=cand.source,
+                distance=cand.distance,
+                chunk_indices=tuple(cand.chunk_indices),
+                tokens=cost,
+                truncated=truncated,
+            )
+        )
+    return packed
@@ -0,0 +1,85 @@
+"""Embedding provider interface and a deterministic local stand-in.
+
+The knowledge store embeds through whichever provider is active:
+
+- an injected provider (`set_embedding_provider`), e.g. in tests or benchmarks
+- the hashing provider when `KNOWLEDGE_EMBEDDING_PROVIDER=hash`
+- Azure OpenAI otherwise (see `app.knowledge.store.AzureEmbeddingProvider`)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import re
+from functools import lru_cache
+from typing import Protocol
+
+
+class EmbeddingProvider(Protocol):
+    # Recorded as `model_name` in token usage.
+    model_name: str | None
+
+    def embed(self, texts: list[str]) -> tuple[list[list[float]], dict[str, int] | None]:
+        """Embed non-empty `texts`; returns one vector per text plus token usage (if known)."""
+        ...
+
+
+_TOKEN_RE = re.compile(r"[\u4e00-\u9fff]|[A-Za-z0-9_]+")
+
+
+@lru_cache(maxsize=262144)
+def _hash_feature(feature: str) -> int:
+    # Cached: corpora reuse a small vocabulary, and blake2b dominates embedding time otherwise.
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HashingEmbeddingProvider:
+    """Deterministic feature-hashing embeddings (no network, no model files).
+
+    Each word (and CJK character) plus character trigrams of words are hashed into `dim`
+    buckets with a signed count, then L2-normalised. Texts sharing vocabulary land close
+    together, which is enough for functional tests and realistic index/query benchmarks.
+    """
+
+    def __init__(self, dim: int = 256) -> None:
+        self.dim = int(dim)
+        self.model_name: str | None = f"hash-embedding-{self.dim}"
+
+    def _features(self, text: str) -> list[str]:
+        feats: list[str] = []
+        for tok in _TOKEN_RE.findall(text.lower()):
+            feats.append(tok)
+            if len(tok) > 3:
+                padded = f"#{tok}#"
+                feats.extend(padded[i : i + 3] for i in range(len(padded) - 2))
+        return feats
+
+    def _vector(self, text: str) -> list[float]:
+        vec = [0.0] * self.dim
+        for feat in self._features(text):
+            value = _hash_feature(feat)
+            idx = value % self.dim
+            vec[idx] += 1.0 if (value >> 63) & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vec))
+        if norm > 0:
+            vec = [v / norm for v in vec]
+        return vec
+
+    def embed(self, texts: list[str]) -> tuple[list[list[float]], dict[str, int] | None]:
+        vectors = [self._vector(t) for t in texts]
+        tokens = sum(len(_TOKEN_RE.findall(t)) for t in texts)
+        return vectors, {"input_tokens": tokens, "output_tokens": 0, "total_tokens": tokens}
+
+
+_provider_override: EmbeddingProvider | None = None
+
+
+def set_embedding_provider(provider: EmbeddingProvider | None) -> None:
+    """Inject the provider used by the knowledge store; pass None to restore the default."""
+    global _provider_override
+    _provider_override = provider
+
+
+def get_embedding_provider_override() -> EmbeddingProvider | None:
+    return _provider_override
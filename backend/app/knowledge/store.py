@@ -1,56 +1,88 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import os
 import re
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
-from typing import Iterable
-
-from chromadb import PersistentClient
-
-from app.db.token_usage import count_turn_usage, record_turn_usage
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+from app.core.admission import EMBEDDING_ADMISSION
+from app.core.credentials import COGNITIVE_SERVICES_SCOPE, get_shared_credential
+from app.core.metrics import (
+    CHROMA_QUERY_SECONDS,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_SECONDS,
+    KNOWLEDGE_FANOUT_SIZE,
+    KNOWLEDGE_QUERY_SECONDS,
+    timed,
+)
+from app.core.resilience import ResilientCaller
+from app.core.settings import Settings, env_int, get_settings, on_reload
+from app.core.timing import phase
+from app.db.token_usage import record_next_turn_usage, record_operation_usage
+from app.knowledge.embeddings import EmbeddingProvider, HashingEmbeddingProvider, get_embedding_provider_override
+
+if TYPE_CHECKING:
+    from chromadb import PersistentClient
 
 
 # Supported file types for simple demo ingestion.
 _SUPPORTED_EXTS = {".txt", ".md", ".pdf"}
 
-
-def _load_env() -> None:
-    """Best-effort local .env loading to support local dev."""
-    try:
-        from dotenv import load_dotenv  # type: ignore
-
-        project_root = Path(__file__).resolve().parents[3]
-        load_dotenv(dotenv_path=project_root / "config" / "azure_openai.env", override=True)
-        load_dotenv(dotenv_path=project_root / ".env", override=True)
-    except Exception:
-        pass
+# Knowledge bases: "default" is the original `knowledge` collection with files directly in
+# `data/uploads`; any other base `<kb>` is collection `knowledge__<kb>` with files in
+# `data/uploads/<kb>`, so a query only searches the bases it names.
+DEFAULT_KB = "default"
+_KB_NAME = re.compile(r"^[a-z0-9](?:[a-z0-9_-]{0,46}[a-z0-9])?$")
+_COLLECTION_PREFIX = "knowledge__"
 
 
-def _get_required_env(name: str) -> str:
-    value = os.getenv(name)
-    if value is None or not value.strip():
-        raise RuntimeError(f"Missing required env var: {name}")
-    return value.strip()
+_fanout: ThreadPoolExecutor | None = None
+_fanout_lock = threading.Lock()
 
 
 def _project_root() -> Path:
     return Path(__file__).resolve().parents[3]
 
 
-def _uploads_dir() -> Path:
-    return _project_root() / "data" / "uploads"
+def _data_dir() -> Path:
+    env = os.getenv("KNOWLEDGE_DATA_DIR")
+    if env and env.strip():
+        return Path(env.strip())
+    return _project_root() / "data"
+
+
+def knowledge_base_name(name: str | None) -> str:
+    """Normalized knowledge base name; ValueError when it is not a valid name."""
+    kb = (name or "").strip().lower() or DEFAULT_KB
+    if not _KB_NAME.match(kb):
+        raise ValueError(f"Invalid knowledge base name: {name!r} (use a-z, 0-9, '-' and '_', at most 48 chars)")
+    return kb
+
+
+def _collection_name(kb: str) -> str:
+    return "knowledge" if kb == DEFAULT_KB else f"{_COLLECTION_PREFIX}{kb}"
+
+
+def _uploads_dir(kb: str = DEFAULT_KB) -> Path:
+    root = _data_dir() / "uploads"
+    return root if kb == DEFAULT_KB else root / kb
 
 
 def _chroma_dir() -> Path:
-    return _project_root() / "data" / "chroma"
+    return _data_dir() / "chroma"
 
 
-def _ensure_dirs() -> None:
-    _uploads_dir().mkdir(parents=True, exist_ok=True)
+def _ensure_dirs(kb: str = DEFAULT_KB) -> None:
+    _uploads_dir(kb).mkdir(parents=True, exist_ok=True)
     _chroma_dir().mkdir(parents=True, exist_ok=True)
 
 
@@ -59,60 +91,101 @@ class RetrievedChunk:
     text: str
     source: str
     distance: float | None
+    chunk_index: int | None = None
+    knowledge_base: str = DEFAULT_KB
+
+
+@lru_cache(maxsize=4)
+def _chroma_client(path: str) -> "PersistentClient":
+    # chromadb is imported here, not at module level: it dominates app import time, and
+    # chat-only workers never need it. Opening the client loads the on-disk index, so it is
+    # done once per data directory.
+    from chromadb import PersistentClient
 
+    return PersistentClient(path=path)
 
-def _get_chroma_collection():
+
+def _get_chroma_collection(kb: str = DEFAULT_KB, *, create: bool = True):
+    """The collection of knowledge base `kb`; with `create=False`, KeyError if it does not exist."""
     _ensure_dirs()
-    client = PersistentClient(path=str(_chroma_dir()))
-    return client.get_or_create_collection(name="knowledge")
+    client = _chroma_client(str(_chroma_dir()))
+    if create or kb == DEFAULT_KB:
+        return client.get_or_create_collection(name=_collection_name(kb))
+    # The missing-collection error differs across chromadb versions (ValueError before 0.6,
+    # InvalidCollectionException, then NotFoundError), so check the listing instead.
+    if _collection_name(kb) not in _collection_names(client):
+        raise KeyError(kb)
+    return client.get_collection(name=_collection_name(kb))
 
 
-def _get_embedding_client():
-    _load_env()
-    endpoint = _get_required_env("AZURE_OPENAI_ENDPOINT")
-    deployment = _get_required_env("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME")
-    api_version = os.getenv("AZURE_OPENAI_API_VERSION")
-    api_key = os.getenv("AZURE_OPENAI_API_KEY", "").strip()
-    tenant_id = os.getenv("AZURE_TENANT_ID", "").strip()
+def _collection_names(client) -> set[str]:
+    # Collection objects before chromadb 0.6, plain names since.
+    return {getattr(collection, "name", collection) for collection in client.list_collections()}
+
 
+def list_knowledge_bases() -> list[dict]:
+    """Existing knowledge bases with their chunk counts; "default" is always listed."""
+    _ensure_dirs()
+    client = _chroma_client(str(_chroma_dir()))
+    names = {DEFAULT_KB}
+    for name in _collection_names(client):
+        if name.startswith(_COLLECTION_PREFIX):
+            names.add(name[len(_COLLECTION_PREFIX):])
+    return [{"name": kb, "chunks": int(_get_chroma_collection(kb).count())} for kb in sorted(names)]
+
+
+@lru_cache(maxsize=4)
+def _build_embedding_client(endpoint: str, api_version: str, api_key: str, tenant_id: str):
     try:
         from openai import AzureOpenAI  # type: ignore
     except Exception as exc:
         raise RuntimeError("Missing dependency: openai. Install with backend/requirements-agent.txt") from exc
 
+    # Retries, deadlines and hedging are handled by AzureEmbeddingProvider's ResilientCaller.
     if api_key:
-        client = AzureOpenAI(
+        return AzureOpenAI(
             azure_endpoint=endpoint,
-            api_version=api_version or "2024-06-01",
+            api_version=api_version,
             api_key=api_key,
+            max_retries=0,
         )
-        return client, deployment
-
-    try:
-        from azure.identity import AzureCliCredential, DefaultAzureCredential  # type: ignore
-    except Exception as exc:
-        raise RuntimeError(
-            "Entra ID auth requires azure-identity. Install with: "
-            "py -m pip install -r backend\\requirements-agent.txt"
-        ) from exc
 
-    if tenant_id:
-        credential = AzureCliCredential(tenant_id=tenant_id)
-    else:
-        credential = DefaultAzureCredential(exclude_interactive_browser_credential=False)
+    # Shared with the agent client; tokens are cached and refreshed ahead of expiry.
+    credential = get_shared_credential(tenant_id)
 
     def _token_provider() -> str:
-        token = credential.get_token("https://cognitiveservices.azure.com/.default")
+        token = credential.get_token(COGNITIVE_SERVICES_SCOPE)
         return token.token
 
-    client = AzureOpenAI(
+    return AzureOpenAI(
         azure_endpoint=endpoint,
-        api_version=api_version or "2024-06-01",
+        api_version=api_version,
         azure_ad_token_provider=_token_provider,
+        max_retries=0,
     )
+
+
+def _required(value: str, name: str) -> str:
+    if not value:
+        raise RuntimeError(f"Missing required env var: {name}")
+    return value
+
+
+def _get_embedding_client():
+    """The embedding client for the current settings snapshot (built once per configuration)."""
+    config = get_settings()
+    endpoint = _required(config.azure_openai_endpoint, "AZURE_OPENAI_ENDPOINT")
+    deployment = _required(config.embedding_deployment_name, "AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME")
+
+    client = _build_embedding_client(endpoint, config.api_version or "2024-06-01", config.api_key, config.tenant_id)
     return client, deployment
 
 
+@on_reload
+def _rebuild_embedding_client(old: Settings, new: Settings) -> None:
+    _build_embedding_client.cache_clear()
+
+
 def _usage_from_embedding(response) -> dict[str, int] | None:
     usage = getattr(response, "usage", None)
     if usage is None and isinstance(response, dict):
@@ -147,23 +220,88 @@ def _usage_from_embedding(response) -> dict[str, int] | None:
     return {"input_tokens": tokens, "output_tokens": 0, "total_tokens": tokens}
 
 
+# Query-path embeddings are a single question; only those are worth a duplicate request.
+_HEDGE_MAX_TEXTS = 1
+
+
+class AzureEmbeddingProvider:
+    """Embeddings from the Azure OpenAI deployment `AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME`.
+
+    Calls go through a `ResilientCaller` (`EMBEDDING_DEADLINE_S`, `EMBEDDING_MAX_ATTEMPTS`,
+    `EMBEDDING_HEDGE`, ...; see `app.core.resilience`).
+    """
+
+    def __init__(self, caller: ResilientCaller | None = None) -> None:
+        self.caller = caller or ResilientCaller.from_env("embedding", "EMBEDDING")
+
+    @property
+    def model_name(self) -> str | None:
+        return get_settings().embedding_deployment_name or None
+
+    def embed(self, texts: list[str]) -> tuple[list[list[float]], dict[str, int] | None]:
+        client, deployment = _get_embedding_client()
+        response = self.caller.call(
+            lambda timeout: client.embeddings.create(model=deployment, input=texts, timeout=timeout),
+            hedge=len(texts) <= _HEDGE_MAX_TEXTS,
+        )
+        return [item.embedding for item in response.data], _usage_from_embedding(response)
+
+
+_azure_provider = AzureEmbeddingProvider()
+_hashing_provider = HashingEmbeddingProvider()
+
+
+def _embedding_provider() -> EmbeddingProvider:
+    override = get_embedding_provider_override()
+    if override is not None:
+        return override
+    if get_settings().embedding_provider == "hash":
+        return _hashing_provider
+    return _azure_provider
+
+
+def warm_up_embeddings() -> None:
+    """Build the Azure embedding client and fetch the first Entra token ahead of the first query."""
+    if not isinstance(_embedding_provider(), AzureEmbeddingProvider):
+        return
+    _get_embedding_client()
+    config = get_settings()
+    if not config.api_key:
+        get_shared_credential(config.tenant_id).get_token(COGNITIVE_SERVICES_SCOPE)
+
+
+def warm_up_index() -> None:
+    """Open the Chroma client and collection."""
+    _get_chroma_collection()
+
+
 def _embed_texts(texts: Iterable[str]) -> list[list[float]]:
-    client, deployment = _get_embedding_client()
-    items = [t for t in texts if t and t.strip()]
-    if not items:
-        return []
-    response = client.embeddings.create(model=deployment, input=items)
-    return [item.embedding for item in response.data]
+    embeddings, _ = _embed_texts_with_usage(texts)
+    return embeddings
 
 
-def _embed_texts_with_usage(texts: Iterable[str]) -> tuple[list[list[float]], dict[str, int] | None]:
-    client, deployment = _get_embedding_client()
+def _embed_texts_with_usage(
+    texts: Iterable[str], *, operation: str = "default"
+) -> tuple[list[list[float]], dict[str, int] | None]:
+    """Embed `texts`; `operation` is the admission fairness key (ingestion vs. queries)."""
     items = [t for t in texts if t and t.strip()]
     if not items:
         return [], None
-    response = client.embeddings.create(model=deployment, input=items)
-    embeddings = [item.embedding for item in response.data]
-    return embeddings, _usage_from_embedding(response)
+    provider = _embedding_provider()
+    EMBEDDING_BATCH_SIZE.observe(len(items))
+    # ~4 characters per token is close enough for budgeting; settled with the real usage below.
+    estimate = sum(len(t) for t in items) // 4
+    with EMBEDDING_ADMISSION.slot_sync(operation, tokens=estimate) as slot:
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            embeddings, usage = provider.embed(items)
+            outcome = "ok"
+        finally:
+            EMBEDDING_SECONDS.observe(time.perf_counter() - start, outcome)
+    if usage:
+        slot.settle(usage.get("total_tokens"))
+    return embeddings, usage
 
 
 def _clean_text(text: str) -> str:
@@ -222,10 +360,10 @@ def read_text_from_file(path: Path) -> str:
     raise RuntimeError(f"Unsupported file type: {suffix}")
 
 
-def save_upload(filename: str, content: bytes) -> Path:
-    _ensure_dirs()
+def save_upload(filename: str, content: bytes, *, kb: str = DEFAULT_KB) -> Path:
+    _ensure_dirs(kb)
     safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", Path(filename).name) or "upload"
-    target = _uploads_dir() / f"{uuid.uuid4().hex}_{safe_name}"
+    target = _uploads_dir(kb) / f"{uuid.uuid4().hex}_{safe_name}"
     target.write_bytes(content)
     return target
 
@@ -234,6 +372,14 @@ def _metadata_path(path: Path) -> Path:
     return Path(str(path) + ".meta.json")
 
 
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
 def write_upload_metadata(
     path: Path,
     *,
@@ -241,39 +387,53 @@ def write_upload_metadata(
     size_bytes: int,
     chunks_indexed: int,
     chunk_lengths: list[int] | None = None,
+    content_hash: str | None = None,
+    uploaded_at: str | None = None,
 ) -> Path:
     meta = {
         "original_name": original_name,
         "stored_name": path.name,
         "stored_path": str(path),
         "size_bytes": int(size_bytes),
-        "uploaded_at": datetime.now(timezone.utc).isoformat(),
+        "uploaded_at": uploaded_at or datetime.now(timezone.utc).isoformat(),
         "chunks_indexed": int(chunks_indexed),
         "chunk_lengths": [int(x) for x in (chunk_lengths or [])],
+        # What the index holds for this file; `sync_uploads` re-embeds it when these go stale.
+        "content_hash": content_hash,
+        "mtime_ns": path.stat().st_mtime_ns,
     }
     meta_path = _metadata_path(path)
     meta_path.write_text(json.dumps(meta, ensure_ascii=True), encoding="utf-8")
     return meta_path
 
 
-def list_uploads() -> list[dict]:
-    _ensure_dirs()
-    items: list[dict] = []
-    for path in _uploads_dir().iterdir():
-        if path.is_dir():
-            continue
-        if path.name.endswith(".meta.json"):
-            continue
-        if path.suffix.lower() not in _SUPPORTED_EXTS:
+def read_upload_metadata(path: Path) -> dict | None:
+    meta_path = _metadata_path(path)
+    if not meta_path.exists():
+        return None
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    return meta if isinstance(meta, dict) else None
+
+
+def iter_upload_files(kb: str = DEFAULT_KB) -> Iterator[Path]:
+    """Uploaded documents (not their metadata) of knowledge base `kb`."""
+    directory = _uploads_dir(kb)
+    if not directory.is_dir():
+        return
+    for path in directory.iterdir():
+        if path.is_dir() or path.name.endswith(".meta.json"):
             continue
+        if path.suffix.lower() in _SUPPORTED_EXTS:
+            yield path
 
-        meta_path = _metadata_path(path)
-        meta: dict | None = None
-        if meta_path.exists():
-            try:
-                meta = json.loads(meta_path.read_text(encoding="utf-8"))
-            except Exception:
-                meta = None
+
+def list_uploads(kb: str = DEFAULT_KB) -> list[dict]:
+    items: list[dict] = []
+    for path in iter_upload_files(kb):
+        meta = read_upload_metadata(path)
 
         size_bytes = int(path.stat().st_size)
         if meta and isinstance(meta.get("uploaded_at"), str):
@@ -308,51 +468,119 @@ def list_uploads() -> list[dict]:
     return items
 
 
-def index_file(path: Path, *, source_name: str | None = None) -> dict:
-    collection = _get_chroma_collection()
-    text = read_text_from_file(path)
-    chunks = chunk_text(text)
+def delete_source_chunks(source_id: str, *, legacy_source: str | None = None, kb: str = DEFAULT_KB) -> int:
+    """Remove the chunks of one upload from the index; returns how many were removed.
+
+    Chunks are found by their `source_id` metadata (the stored file name). Chunks indexed
+    before `source_id` existed only carry the display name; pass it as `legacy_source` to
+    remove those as well.
+    """
+    collection = _get_chroma_collection(kb)
+    ids = list(collection.get(where={"source_id": source_id}, include=[])["ids"])
+    if legacy_source:
+        legacy = collection.get(where={"source": legacy_source}, include=["metadatas"])
+        ids += [i for i, m in zip(legacy["ids"], legacy["metadatas"] or []) if not (m or {}).get("source_id")]
+    if ids:
+        collection.delete(ids=ids)
+    return len(ids)
+
+
+def index_file(
+    path: Path, *, source_name: str | None = None, content_hash: str | None = None, kb: str = DEFAULT_KB
+) -> dict:
+    """(Re)index one upload into knowledge base `kb`: its previous chunks are replaced."""
+    with phase("chroma_open"):
+        collection = _get_chroma_collection(kb)
+    with phase("parse"):
+        text = read_text_from_file(path)
+    with phase("chunk"):
+        chunks = chunk_text(text)
+    content_hash = content_hash or file_sha256(path)
+    source_id = path.name
     if not chunks:
-        return {"chunks": 0}
+        delete_source_chunks(source_id, kb=kb)
+        return {"chunks": 0, "content_hash": content_hash}
 
     chunk_lengths = [len(c) for c in chunks]
-    embeddings, usage = _embed_texts_with_usage(chunks)
-    ids = [uuid.uuid4().hex for _ in chunks]
+    with phase("embed"):
+        embeddings, usage = _embed_texts_with_usage(chunks, operation="ingest")
+    ids = [f"{source_id}:{idx}" for idx in range(len(chunks))]
     source = source_name or path.name
-    metadatas = [{"source": source} for _ in chunks]
-
-    collection.add(ids=ids, documents=chunks, embeddings=embeddings, metadatas=metadatas)
+    metadatas = [
+        {"source": source, "source_id": source_id, "content_hash": content_hash, "chunk_index": idx}
+        for idx in range(len(chunks))
+    ]
+
+    with phase("chroma_add"):
+        # Only chunks beyond the new count need an explicit delete; the rest are overwritten.
+        keep = set(ids)
+        stale = [i for i in collection.get(where={"source_id": source_id}, include=[])["ids"] if i not in keep]
+        if stale:
+            collection.delete(ids=stale)
+        collection.upsert(ids=ids, documents=chunks, embeddings=embeddings, metadatas=metadatas)
     if usage:
-        conversation_id = f"knowledge:upload:{source}"
+        conversation_id = f"knowledge:upload:{source}" if kb == DEFAULT_KB else f"knowledge:upload:{kb}/{source}"
         try:
-            turn_index = count_turn_usage(conversation_id) + 1
-            model_name = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME", "").strip() or None
-            record_turn_usage(conversation_id, turn_index, usage, model_name)
+            model_name = _embedding_provider().model_name
+            with phase("usage_write"):
+                record_next_turn_usage(conversation_id, usage, model_name)
         except Exception:
             # Best-effort; do not break ingestion if stats write fails.
             pass
-    return {"chunks": len(chunks), "chunk_lengths": chunk_lengths}
-
-
-def query_knowledge(query: str, *, top_k: int = 4) -> list[RetrievedChunk]:
-    collection = _get_chroma_collection()
-    embeddings, usage = _embed_texts_with_usage([query])
-    if not embeddings:
-        return []
-    if usage:
-        conversation_id = "knowledge:query"
-        try:
-            turn_index = count_turn_usage(conversation_id) + 1
-            model_name = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME", "").strip() or None
-            record_turn_usage(conversation_id, turn_index, usage, model_name)
-        except Exception:
-            # Best-effort; do not break query if stats write fails.
-            pass
-    results = collection.query(
-        query_embeddings=embeddings,
-        n_results=int(top_k),
-        include=["documents", "metadatas", "distances"],
-    )
+    return {"chunks": len(chunks), "chunk_lengths": chunk_lengths, "content_hash": content_hash}
+
+
+def delete_upload(stored_name: str, *, kb: str = DEFAULT_KB) -> dict:
+    """Delete an upload's chunks, file and metadata. Raises KeyError for an unknown name."""
+    path = _uploads_dir(kb) / stored_name
+    if (
+        Path(stored_name).name != stored_name
+        or stored_name.endswith(".meta.json")
+        or path.suffix.lower() not in _SUPPORTED_EXTS
+        or not path.is_file()
+    ):
+        raise KeyError(stored_name)
+
+    meta = read_upload_metadata(path) or {}
+    original_name = meta.get("original_name") or path.name
+    legacy_source = None
+    if not meta.get("content_hash"):
+        # Indexed before chunks carried `source_id`: they can only be found by display name,
+        # which is safe only while no other upload shares it (sync cleans up the rest).
+        others = (
+            (read_upload_metadata(p) or {}).get("original_name") or p.name for p in iter_upload_files(kb) if p != path
+        )
+        if original_name not in set(others):
+            legacy_source = original_name
+
+    # Vectors first: if this fails the file stays, and the delete can be retried.
+    chunks_deleted = delete_source_chunks(path.name, legacy_source=legacy_source, kb=kb)
+    path.unlink(missing_ok=True)
+    _metadata_path(path).unlink(missing_ok=True)
+    return {"stored_name": path.name, "original_name": original_name, "chunks_deleted": chunks_deleted}
+
+
+def _fanout_pool() -> ThreadPoolExecutor:
+    global _fanout
+    pool = _fanout
+    if pool is None:
+        # First multi-base queries can arrive together on worker threads; build one pool.
+        with _fanout_lock:
+            if _fanout is None:
+                _fanout = ThreadPoolExecutor(
+                    max_workers=max(1, env_int("KNOWLEDGE_FANOUT_WORKERS", 8)), thread_name_prefix="knowledge-fanout"
+                )
+            pool = _fanout
+    return pool
+
+
+def _query_collection(kb: str, collection, embeddings: list[list[float]], top_k: int) -> list[RetrievedChunk]:
+    with CHROMA_QUERY_SECONDS.time():
+        results = collection.query(
+            query_embeddings=embeddings,
+            n_results=int(top_k),
+            include=["documents", "metadatas", "distances"],
+        )
     documents = results.get("documents") or []
     metadatas = results.get("metadatas") or []
     distances = results.get("distances") or []
@@ -363,18 +591,61 @@ def query_knowledge(query: str, *, top_k: int = 4) -> list[RetrievedChunk]:
         dist = None
         if distances and distances[0] and idx < len(distances[0]):
             dist = float(distances[0][idx])
+        chunk_index = meta.get("chunk_index")
+        source = str(meta.get("source") or "unknown")
         chunks.append(
             RetrievedChunk(
                 text=str(doc),
-                source=str(meta.get("source") or "unknown"),
+                # Qualified outside the default base, so same-named files in two bases stay apart.
+                source=source if kb == DEFAULT_KB else f"{kb}/{source}",
                 distance=dist,
+                chunk_index=int(chunk_index) if isinstance(chunk_index, (int, float)) else None,
+                knowledge_base=kb,
             )
         )
     return chunks
 
 
-def knowledge_stats() -> dict:
-    collection = _get_chroma_collection()
+@timed(KNOWLEDGE_QUERY_SECONDS)
+def query_knowledge(
+    query: str, *, top_k: int = 4, knowledge_bases: Iterable[str] = (DEFAULT_KB,)
+) -> list[RetrievedChunk]:
+    """Top `top_k` chunks across `knowledge_bases`, nearest first.
+
+    The question is embedded once; with several bases their collections are queried
+    concurrently (`KNOWLEDGE_FANOUT_WORKERS` threads) and the hits merged by distance.
+    Raises KeyError for a base that does not exist.
+    """
+    kbs = list(dict.fromkeys(knowledge_bases)) or [DEFAULT_KB]
+    with phase("chroma_open"):
+        collections = [(kb, _get_chroma_collection(kb, create=False)) for kb in kbs]
+    with phase("embed"):
+        embeddings, usage = _embed_texts_with_usage([query], operation="query")
+    if not embeddings:
+        return []
+    if usage:
+        try:
+            model_name = _embedding_provider().model_name
+            with phase("usage_write"):
+                record_operation_usage("knowledge:query", usage, model_name)
+        except Exception:
+            # Best-effort; do not break query if stats write fails.
+            pass
+    with phase("chroma_query"):
+        if len(collections) == 1:
+            kb, collection = collections[0]
+            return _query_collection(kb, collection, embeddings, top_k)
+        KNOWLEDGE_FANOUT_SIZE.observe(len(collections))
+        futures = [
+            _fanout_pool().submit(_query_collection, kb, collection, embeddings, top_k) for kb, collection in collections
+        ]
+        hits = [chunk for future in futures for chunk in future.result()]
+    hits.sort(key=lambda c: float("inf") if c.distance is None else c.distance)
+    return hits[: int(top_k)]
+
+
+def knowledge_stats(kb: str = DEFAULT_KB) -> dict:
+    collection = _get_chroma_collection(kb, create=False)
     count = collection.count()
     return {"chunks": int(count)}
 
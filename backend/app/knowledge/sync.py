@@ -0,0 +1,150 @@
+"""Incremental re-sync of `data/uploads` against the Chroma index.
+
+For each uploaded file, the `.meta.json` sidecar records the content hash and mtime the index
+was built from. A sync
+
+- skips files whose size and mtime still match (no read at all)
+- hashes files whose mtime changed; same hash means only the sidecar is refreshed
+- re-embeds new or changed files, replacing their chunks (found by `source_id`)
+- removes chunks whose file is gone (unless `prune=False`), including chunks indexed before
+  `source_id` existed, which are matched by display name
+
+so the cost is proportional to what changed, not to the corpus. Run it with
+`py -m app.knowledge sync` (see `app/knowledge/__main__.py`).
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+
+from app.knowledge.store import (
+    DEFAULT_KB,
+    _get_chroma_collection,
+    file_sha256,
+    index_file,
+    iter_upload_files,
+    read_upload_metadata,
+    write_upload_metadata,
+)
+
+_PAGE = 5000
+
+
+@dataclass
+class SyncReport:
+    knowledge_base: str = DEFAULT_KB
+    dry_run: bool = False
+    unchanged: list[str] = field(default_factory=list)
+    # mtime changed but the content did not: sidecar refreshed, nothing re-embedded
+    touched: list[str] = field(default_factory=list)
+    indexed: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    failed: dict[str, str] = field(default_factory=dict)
+    chunks_indexed: int = 0
+    chunks_deleted: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _index_inventory(kb: str) -> tuple[dict[str, int], dict[str, list[str]]]:
+    """({source_id: chunk count}, {display name: ids of chunks without source_id})."""
+    collection = _get_chroma_collection(kb)
+    by_source: dict[str, int] = {}
+    legacy: dict[str, list[str]] = {}
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=_PAGE, offset=offset)
+        ids = page["ids"]
+        for chunk_id, meta in zip(ids, page["metadatas"] or []):
+            meta = meta or {}
+            source_id = meta.get("source_id")
+            if source_id:
+                by_source[source_id] = by_source.get(source_id, 0) + 1
+            else:
+                legacy.setdefault(str(meta.get("source") or ""), []).append(chunk_id)
+        if len(ids) < _PAGE:
+            return by_source, legacy
+        offset += len(ids)
+
+
+def _is_current(meta: dict | None, indexed_chunks: int) -> bool:
+    if not meta or not meta.get("content_hash"):
+        return False
+    # A file that produced chunks but has none in the index (e.g. a wiped index) is stale.
+    return indexed_chunks > 0 or int(meta.get("chunks_indexed") or 0) == 0
+
+
+def sync_uploads(*, kb: str = DEFAULT_KB, dry_run: bool = False, prune: bool = True) -> SyncReport:
+    """Sync knowledge base `kb` (its uploads directory against its collection)."""
+    report = SyncReport(knowledge_base=kb, dry_run=dry_run)
+    by_source, legacy = _index_inventory(kb)
+    collection = _get_chroma_collection(kb)
+    files = sorted(iter_upload_files(kb))
+
+    for path in files:
+        name = path.name
+        meta = read_upload_metadata(path)
+        original_name = (meta or {}).get("original_name") or name
+        stat = path.stat()
+        try:
+            if _is_current(meta, by_source.get(name, 0)):
+                if meta.get("mtime_ns") == stat.st_mtime_ns and meta.get("size_bytes") == stat.st_size:
+                    report.unchanged.append(name)
+                    continue
+                content_hash = file_sha256(path)
+                if content_hash == meta["content_hash"]:
+                    report.touched.append(name)
+                    if not dry_run:
+                        write_upload_metadata(
+                            path,
+                            original_name=original_name,
+                            size_bytes=stat.st_size,
+                            chunks_indexed=int(meta.get("chunks_indexed") or 0),
+                            chunk_lengths=list(meta.get("chunk_lengths") or []),
+                            content_hash=content_hash,
+                            uploaded_at=meta.get("uploaded_at"),
+                        )
+                    continue
+            else:
+                content_hash = file_sha256(path)
+
+            report.indexed.append(name)
+            if dry_run:
+                continue
+            info = index_file(path, source_name=original_name, content_hash=content_hash, kb=kb)
+            report.chunks_indexed += int(info.get("chunks", 0))
+            stale = legacy.pop(original_name, [])
+            if stale:
+                collection.delete(ids=stale)
+                report.chunks_deleted += len(stale)
+            write_upload_metadata(
+                path,
+                original_name=original_name,
+                size_bytes=stat.st_size,
+                chunks_indexed=int(info.get("chunks", 0)),
+                chunk_lengths=list(info.get("chunk_lengths") or []),
+                content_hash=content_hash,
+                uploaded_at=(meta or {}).get("uploaded_at"),
+            )
+        except Exception as exc:
+            report.failed[name] = str(exc)
+
+    if not prune:
+        return report
+    names = {path.name for path in files}
+    orphans = {source_id: count for source_id, count in by_source.items() if source_id not in names}
+    # Legacy chunks of files still present were replaced above (or the file failed); the rest are orphans.
+    display_names = {(read_upload_metadata(p) or {}).get("original_name") or p.name for p in files}
+    legacy_orphans = {source: ids for source, ids in legacy.items() if source not in display_names}
+    for source_id, count in sorted(orphans.items()):
+        report.removed.append(source_id)
+        report.chunks_deleted += count
+        if not dry_run:
+            collection.delete(where={"source_id": source_id})
+    for source, ids in sorted(legacy_orphans.items()):
+        report.removed.append(source)
+        report.chunks_deleted += len(ids)
+        if not dry_run:
+            collection.delete(ids=ids)
+    return report
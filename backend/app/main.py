@@ -1,23 +1,53 @@
+import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request
 
-from app.api.router import api_router
+from app.core.settings import get_settings, watch_env_files
 
+# Apply the env files (config/azure_openai.env, .env) before anything below is imported:
+# route modules build their singletons (admission limits, conversation backend, context
+# policy, JSON backend, ...) from the environment at import time.
+get_settings()
 
-def create_app() -> FastAPI:
-    app = FastAPI(title="testpython")
+from app.api.router import api_router  # noqa: E402
+from app.core.metrics import MetricsMiddleware  # noqa: E402
+from app.core.static_assets import StaticAssets  # noqa: E402
+from app.core.timing import TimingMiddleware  # noqa: E402
+from app.core.warmup import Warmup  # noqa: E402
+
+
+def create_app(*, warmup: Warmup | None = None) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Warm up in the background so the worker answers health checks (not ready) meanwhile.
+        app.state.warmup = warmup or Warmup()
+        tasks = [asyncio.create_task(app.state.warmup.run())]
+        if get_settings().watch_env_files:
+            tasks.append(asyncio.create_task(watch_env_files()))
+        try:
+            yield
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    app = FastAPI(title=get_settings().app_name, lifespan=lifespan)
+    app.add_middleware(TimingMiddleware)
+    app.add_middleware(MetricsMiddleware)
 
     app.include_router(api_router, prefix="/api")
 
     frontend_dir = Path(__file__).resolve().parents[2] / "frontend"
-    app.mount("/static", StaticFiles(directory=str(frontend_dir)), name="static")
+    assets = app.state.static_assets = StaticAssets(frontend_dir)
+
+    @app.api_route("/static/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+    def static(path: str, request: Request):
+        return assets.response(request, path)
 
-    @app.get("/")
-    def index():
-        return FileResponse(str(frontend_dir / "index.html"))
+    @app.api_route("/", methods=["GET", "HEAD"], include_in_schema=False)
+    def index(request: Request):
+        return assets.response(request, assets.index)
 
     return app
 
@@ -0,0 +1,207 @@
+"""Helpers shared by the benchmark scripts (percentiles, in-process ASGI driver, result files)."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lo = int(rank)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (rank - lo)
+
+
+def latency_summary(seconds: list[float]) -> dict[str, float]:
+    """p50/p95/p99/max in milliseconds."""
+    return {
+        "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+        "p95_ms": round(percentile(seconds, 95) * 1000, 3),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 3),
+        "max_ms": round(max(seconds) * 1000, 3) if seconds else 0.0,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def write_results(path: str | None, name: str, results: dict[str, Any]) -> dict[str, Any]:
+    """Print results and optionally save them as JSON with commit/platform info for comparisons."""
+    payload = {
+        "benchmark": name,
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    text = json.dumps(payload, ensure_ascii=False, indent=2)
+    print(text)
+    if path:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(text, encoding="utf-8")
+    return payload
+
+
+@dataclass
+class AsgiResponse:
+    status: int
+    headers: dict[str, str]
+    body: bytes
+    ttfb: float
+    elapsed: float
+
+
+async def asgi_request(
+    app,
+    method: str,
+    path: str,
+    *,
+    json_body: Any = None,
+    body: bytes = b"",
+    headers: dict[str, str] | None = None,
+) -> AsgiResponse:
+    """Call an ASGI app in-process and time the first non-empty body chunk (TTFB) and completion."""
+    if json_body is not None:
+        body = json.dumps(json_body).encode("utf-8")
+    raw_headers = [(b"host", b"bench")]
+    if json_body is not None:
+        raw_headers.append((b"content-type", b"application/json"))
+    for key, value in (headers or {}).items():
+        raw_headers.append((key.lower().encode("latin-1"), value.encode("latin-1")))
+    raw_headers.append((b"content-length", str(len(body)).encode()))
+
+    path_only, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path_only,
+        "raw_path": path_only.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": raw_headers,
+        "client": ("127.0.0.1", 12345),
+        "server": ("bench", 80),
+    }
+
+    sent = {"done": False}
+
+    async def receive():
+        if not sent["done"]:
+            sent["done"] = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Event().wait()
+        return {"type": "http.disconnect"}
+
+    start = time.perf_counter()
+    state: dict[str, Any] = {"status": 0, "headers": {}, "ttfb": None, "chunks": []}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            state["status"] = int(message["status"])
+            state["headers"] = {k.decode("latin-1"): v.decode("latin-1") for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            if chunk and state["ttfb"] is None:
+                state["ttfb"] = time.perf_counter() - start
+            state["chunks"].append(chunk)
+
+    await app(scope, receive, send)
+    elapsed = time.perf_counter() - start
+    return AsgiResponse(
+        status=state["status"],
+        headers=state["headers"],
+        body=b"".join(state["chunks"]),
+        ttfb=state["ttfb"] if state["ttfb"] is not None else elapsed,
+        elapsed=elapsed,
+    )
+
+
+class Lifespan:
+    """Run an ASGI app's lifespan startup/shutdown around a benchmark."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._started = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def __aenter__(self):
+        async def receive():
+            return await self._queue.get()
+
+        async def send(message):
+            if message["type"].startswith("lifespan.startup"):
+                self._started.set()
+
+        self._task = asyncio.create_task(self.app({"type": "lifespan", "asgi": {"version": "3.0"}}, receive, send))
+        await self._queue.put({"type": "lifespan.startup"})
+        started = asyncio.create_task(self._started.wait())
+        await asyncio.wait({started, self._task}, return_when=asyncio.FIRST_COMPLETED)
+        if not self._started.is_set():
+            started.cancel()
+            self._task.result()
+            raise RuntimeError("ASGI lifespan ended before startup completed")
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._queue.put({"type": "lifespan.shutdown"})
+        if self._task is not None:
+            await self._task
+
+
+def _flatten_numbers(value: Any, prefix: str = "") -> dict[str, float]:
+    out: dict[str, float] = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            out.update(_flatten_numbers(item, f"{prefix}.{key}" if prefix else str(key)))
+    elif isinstance(value, list):
+        for idx, item in enumerate(value):
+            label = item.get("label") if isinstance(item, dict) else None
+            out.update(_flatten_numbers(item, f"{prefix}[{label if label is not None else idx}]"))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = float(value)
+    return out
+
+
+def compare_results(baseline_path: str, current: dict[str, Any]) -> list[dict[str, Any]]:
+    """Per-metric change (%) between a saved result file and the current payload's results."""
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    before = _flatten_numbers(baseline.get("results", baseline))
+    after = _flatten_numbers(current.get("results", current))
+    rows: list[dict[str, Any]] = []
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        change = round((new - old) / old * 100.0, 2) if old else None
+        rows.append({"metric": key, "baseline": old, "current": new, "change_pct": change})
+    return rows
@@ -0,0 +1,193 @@
+"""Offline load test for /api/agent/run and /api/agent/stream using the fake agent backend.
+
+Drives the FastAPI app in-process over ASGI (no sockets, no Azure), so the numbers reflect the
+server's own overhead: routing, thread (de)serialization, usage writes, SSE framing.
+
+Usage (from the backend directory):
+
+    py -m benchmarks.agent_bench --requests 2000 --concurrency 50 --turns 4
+    py -m benchmarks.agent_bench --endpoint stream --latency-ms 200 --tokens-per-sec 50 --json out/agent.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Any
+
+from benchmarks._common import Lifespan, asgi_request, latency_summary, write_results
+
+
+def _parse_server_timing(header: str | None) -> dict[str, float]:
+    phases: dict[str, float] = {}
+    for part in (header or "").split(","):
+        name, _, rest = part.strip().partition(";dur=")
+        if name and rest:
+            try:
+                phases[name] = float(rest)
+            except ValueError:
+                pass
+    return phases
+
+
+def _conversation_id_from(endpoint: str, body: bytes) -> str | None:
+    if endpoint == "run":
+        try:
+            return json.loads(body).get("conversation_id")
+        except Exception:
+            return None
+    for block in body.decode("utf-8", errors="ignore").split("\n\n"):
+        if block.startswith("event: meta"):
+            data = block.split("data: ", 1)[-1]
+            try:
+                return json.loads(data).get("conversation_id")
+            except Exception:
+                return None
+    return None
+
+
+async def run_load(app, *, endpoint: str, requests: int, concurrency: int, turns: int) -> dict[str, Any]:
+    """Run `requests` calls as conversations of `turns` sequential turns, `concurrency` at a time."""
+    path = "/api/agent/run" if endpoint == "run" else "/api/agent/stream"
+    turns = max(1, turns)
+    conversations = max(1, requests // turns)
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(conversations):
+        queue.put_nowait(i)
+
+    latencies: list[float] = []
+    ttfbs: list[float] = []
+    errors = 0
+    phase_totals: dict[str, float] = {}
+
+    async def worker() -> None:
+        nonlocal errors
+        while True:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            conversation_id: str | None = None
+            for turn in range(turns):
+                payload: dict[str, Any] = {"message": f"benchmark turn {turn}"}
+                if conversation_id:
+                    payload["conversation_id"] = conversation_id
+                res = await asgi_request(app, "POST", path, json_body=payload)
+                if res.status != 200 or b"event: error" in res.body:
+                    errors += 1
+                    break
+                latencies.append(res.elapsed)
+                ttfbs.append(res.ttfb)
+                for name, ms in _parse_server_timing(res.headers.get("server-timing")).items():
+                    phase_totals[name] = phase_totals.get(name, 0.0) + ms
+                conversation_id = conversation_id or _conversation_id_from(endpoint, res.body)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    wall = time.perf_counter() - start
+
+    done = len(latencies)
+    return {
+        "endpoint": endpoint,
+        "requests": done,
+        "errors": errors,
+        "concurrency": concurrency,
+        "turns_per_conversation": turns,
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(done / wall, 2) if wall > 0 else 0.0,
+        "latency": latency_summary(latencies),
+        "ttfb": latency_summary(ttfbs),
+        "server_phases_mean_ms": {k: round(v / done, 3) for k, v in sorted(phase_totals.items())} if done else {},
+    }
+
+
+async def measure_memory(app, *, conversations: int, concurrency: int) -> dict[str, Any]:
+    """Python heap growth for `conversations` new single-turn conversations, scaled to 10k."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        await run_load(app, endpoint="run", requests=conversations, concurrency=concurrency, turns=1)
+        gc.collect()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    growth = max(0, after - before)
+    return {
+        "conversations": conversations,
+        "heap_growth_bytes": growth,
+        "heap_growth_per_10k_conversations_mb": round(growth * 10_000 / max(1, conversations) / 1_048_576, 3),
+        "heap_peak_bytes": peak,
+    }
+
+
+async def main_async(args: argparse.Namespace) -> dict[str, Any]:
+    from app.agents.af_client import set_agent_override
+    from app.agents.fake_agent import FakeAgent, FakeAgentConfig
+    from app.main import create_app
+
+    config = FakeAgentConfig(
+        latency_ms=args.latency_ms,
+        tokens_per_second=args.tokens_per_sec,
+        output_tokens=args.output_tokens,
+        history_size=args.history_size,
+    )
+    set_agent_override(FakeAgent(config))
+    app = create_app()
+
+    results: dict[str, Any] = {"fake_agent": config.__dict__, "runs": []}
+    async with Lifespan(app):
+        endpoints = ["run", "stream"] if args.endpoint == "both" else [args.endpoint]
+        for endpoint in endpoints:
+            results["runs"].append(
+                await run_load(
+                    app,
+                    endpoint=endpoint,
+                    requests=args.requests,
+                    concurrency=args.concurrency,
+                    turns=args.turns,
+                )
+            )
+        if args.memory_conversations > 0:
+            results["memory"] = await measure_memory(
+                app,
+                conversations=args.memory_conversations,
+                concurrency=args.concurrency,
+            )
+    set_agent_override(None)
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.agent_bench", description=__doc__)
+    parser.add_argument("--endpoint", choices=["run", "stream", "both"], default="both")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=4, help="Sequential turns per conversation")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0)
+    parser.add_argument("--output-tokens", type=int, default=32)
+    parser.add_argument("--history-size", type=int, default=0)
+    parser.add_argument("--memory-conversations", type=int, default=2000, help="0 disables the memory pass")
+    parser.add_argument("--db", default=None, help="Usage DB path (default: a temporary file)")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write results to this JSON file")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["TOKEN_USAGE_DB_PATH"] = args.db or os.path.join(tmp, "bench_usage.sqlite3")
+        results = asyncio.run(main_async(args))
+    write_results(args.json_path, "agent", results)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,161 @@
+"""JSON serialization microbenchmark: SSE delta frames and large listing responses.
+
+For every available backend of `app.core.fastjson` (stdlib `json`, `pydantic`, `orjson`):
+
+- per-frame cost of `_sse("delta", {...})`-style framing, in microseconds
+- per-listing cost of encoding a synthetic `/api/knowledge/uploads` payload (files with
+  per-file `chunk_lengths`) and a 2000-row usage page, in milliseconds
+
+plus the end-to-end ASGI time of the uploads listing served the FastAPI default way (a `-> dict`
+route, pydantic validation + Rust encoder) versus returning `FastJSONResponse`.
+
+Usage (from the backend directory):
+
+    py -m benchmarks.json_bench --json out/json.json
+    py -m benchmarks.json_bench --files 2000 --chunks 500 --compare out/json.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import Any, Callable
+
+from benchmarks._common import asgi_request, compare_results, latency_summary, write_results
+
+
+def delta_frames(count: int) -> list[dict[str, Any]]:
+    words = ["你好", "world", "，", "streaming", "输出", "token", " ", "Azure", "。"]
+    return [{"delta": "".join(words[(i + j) % len(words)] for j in range(4))} for i in range(count)]
+
+
+def uploads_payload(files: int, chunks: int) -> dict[str, Any]:
+    return {
+        "items": [
+            {
+                "stored_name": f"20260101_000000_{i:05d}_手册.pdf",
+                "original_name": f"手册 {i}.pdf",
+                "size_bytes": 1_048_576 + i,
+                "chunks_indexed": chunks,
+                "chunk_lengths": [800 + (i * 7 + c) % 100 for c in range(chunks)],
+                "uploaded_at": "2026-01-01T00:00:00+00:00",
+            }
+            for i in range(files)
+        ]
+    }
+
+
+def usage_payload(rows: int) -> dict[str, Any]:
+    return {
+        "items": [
+            {
+                "operation": "knowledge:query",
+                "model_name": "text-embedding-3-large",
+                "bucket_start": f"2026-01-01T{i % 24:02d}:00:00+00:00",
+                "calls": i,
+                "input_tokens": i * 31,
+                "output_tokens": 0,
+                "total_tokens": i * 31,
+                "last_created_at": "2026-01-01T00:59:59+00:00",
+            }
+            for i in range(rows)
+        ]
+    }
+
+
+def _per_call(fn: Callable[[], Any], repeat: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_backend(name: str, args: argparse.Namespace, frames: list[dict], uploads: dict, usage: dict) -> dict[str, Any]:
+    from app.core.fastjson import BACKENDS
+
+    dumps, dumpb = BACKENDS[name]
+
+    def sse() -> None:
+        for data in frames:
+            f"event: delta\ndata: {dumps(data)}\n\n"
+
+    frame_s = _per_call(sse, 3) / len(frames)
+    return {
+        "label": name,
+        "sse_frame_us": round(frame_s * 1e6, 3),
+        "uploads_ms": round(_per_call(lambda: dumpb(uploads), args.repeat) * 1000, 3),
+        "uploads_bytes": len(dumpb(uploads)),
+        "usage_page_ms": round(_per_call(lambda: dumpb(usage), args.repeat) * 1000, 3),
+    }
+
+
+def bench_endpoint(uploads: dict, requests: int) -> list[dict[str, Any]]:
+    from fastapi import FastAPI
+
+    from app.core.fastjson import FastJSONResponse
+
+    app = FastAPI()
+
+    @app.get("/default")
+    def default() -> dict:
+        return uploads
+
+    @app.get("/fast")
+    def fast() -> FastJSONResponse:
+        return FastJSONResponse(uploads)
+
+    async def drive(path: str) -> list[float]:
+        await asgi_request(app, "GET", path)
+        out = []
+        for _ in range(requests):
+            out.append((await asgi_request(app, "GET", path)).elapsed)
+        return out
+
+    rows = []
+    for label, path in (("fastapi_default", "/default"), ("fast_json_response", "/fast")):
+        rows.append({"label": label, **latency_summary(asyncio.run(drive(path)))})
+    return rows
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    from app.core.fastjson import BACKEND, BACKENDS
+
+    frames = delta_frames(args.frames)
+    uploads = uploads_payload(args.files, args.chunks)
+    usage = usage_payload(args.usage_rows)
+    return {
+        "default_backend": BACKEND,
+        "files": args.files,
+        "chunks_per_file": args.chunks,
+        "backends": [bench_backend(name, args, frames, uploads, usage) for name in sorted(BACKENDS)],
+        "uploads_endpoint": bench_endpoint(uploads, args.requests),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.json_bench", description=__doc__)
+    parser.add_argument("--frames", type=int, default=20_000, help="SSE delta frames per backend")
+    parser.add_argument("--files", type=int, default=500, help="Files in the uploads listing")
+    parser.add_argument("--chunks", type=int, default=300, help="chunk_lengths entries per file")
+    parser.add_argument("--usage-rows", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20, help="Encodings per listing and backend")
+    parser.add_argument("--requests", type=int, default=30, help="ASGI requests per endpoint variant")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write results to this JSON file")
+    parser.add_argument("--compare", default=None, help="Previous result JSON to diff against")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    payload = write_results(args.json_path, "json", run(args))
+    if args.compare:
+        for row in compare_results(args.compare, payload):
+            change = "n/a" if row["change_pct"] is None else f"{row['change_pct']:+.2f}%"
+            print(f"{row['metric']}: {row['baseline']} -> {row['current']} ({change})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
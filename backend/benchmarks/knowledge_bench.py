@@ -0,0 +1,309 @@
+"""Offline ingestion/retrieval benchmark for the knowledge store.
+
+Generates a deterministic synthetic corpus (txt, md and multi-page PDF files), then measures:
+
+- parse / chunk throughput over the corpus files (`read_text_from_file`, `chunk_text`)
+- embed / index throughput into a fresh Chroma collection, per target chunk count
+- query latency (p50/p99) through `query_knowledge`, per target chunk count
+- with `--bases N`, the chunks are spread over N knowledge bases; `query` then searches one
+  base and `query_all` fans out across all of them
+
+Embeddings come from the hashing provider by default, so no Azure endpoint is needed and
+runs are comparable across machines and commits. Everything is written to a temporary
+`KNOWLEDGE_DATA_DIR`; the real data/ directory is never touched.
+
+Usage (from the backend directory):
+
+    py -m benchmarks.knowledge_bench --json out/knowledge.json
+    py -m benchmarks.knowledge_bench --sizes 10000,100000 --pdf-pages 300 --compare out/knowledge.json
+    py -m benchmarks.knowledge_bench --sizes 1000000 --queries 500      # slow; needs several GB of disk
+    py -m benchmarks.knowledge_bench --sizes 100000 --bases 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Iterator
+
+from benchmarks._common import compare_results, latency_summary, write_results
+
+# Small, fixed vocabulary with a handful of "topics" so queries have genuine nearest neighbours.
+_TOPICS = {
+    "billing": "invoice payment refund charge subscription receipt currency balance credit",
+    "network": "latency packet router firewall bandwidth socket gateway timeout dns",
+    "storage": "disk volume snapshot replica backup archive block object bucket",
+    "security": "token credential password rotation audit policy encryption certificate",
+    "deploy": "release rollback pipeline container image cluster canary rollout build",
+}
+_FILLER = (
+    "the a of to and in for on with by from system service user request data value time "
+    "process result update change report team support issue note step check config"
+).split()
+
+
+def _paragraph(rng: random.Random, words: int = 140) -> tuple[str, str]:
+    topic = rng.choice(sorted(_TOPICS))
+    vocab = _TOPICS[topic].split()
+    out = [rng.choice(vocab) if rng.random() < 0.35 else rng.choice(_FILLER) for _ in range(words)]
+    return topic, " ".join(out) + "."
+
+
+def synthetic_chunks(count: int, *, seed: int = 0) -> Iterator[str]:
+    """`count` chunk-sized paragraphs (~900 chars, like `chunk_text` output)."""
+    rng = random.Random(seed)
+    for idx in range(count):
+        _, text = _paragraph(rng)
+        yield f"section {idx} {text}"[:900]
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: Path, pages: list[list[str]]) -> None:
+    """Minimal multi-page PDF (Helvetica, one text line per entry) that pypdf can extract."""
+    objects: list[bytes] = []
+    page_count = len(pages)
+    font_id = 3
+    first_page_id = 4
+    kids = " ".join(f"{first_page_id + 2 * i} 0 R" for i in range(page_count))
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {page_count} >>".encode("ascii"))
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, lines in enumerate(pages):
+        content_id = first_page_id + 2 * i + 1
+        objects.append(
+            (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>"
+            ).encode("ascii")
+        )
+        ops = ["BT", "/F1 9 Tf", "11 TL", "40 760 Td"]
+        ops.extend(f"({_pdf_escape(line)}) Tj T*" for line in lines)
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", errors="replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets: list[int] = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % num + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+
+
+def generate_corpus(root: Path, *, docs: int, paragraphs: int, pdf_pages: int, seed: int = 0) -> list[Path]:
+    """Write `docs` txt and md files plus one PDF of `pdf_pages` pages under `root`."""
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    files: list[Path] = []
+    for i in range(docs):
+        paras = [_paragraph(rng) for _ in range(paragraphs)]
+        txt = root / f"doc_{i:04d}.txt"
+        txt.write_text("\n\n".join(p for _, p in paras), encoding="utf-8")
+        md = root / f"doc_{i:04d}.md"
+        md.write_text("\n\n".join(f"## {topic}\n\n{p}" for topic, p in paras), encoding="utf-8")
+        files.extend([txt, md])
+    if pdf_pages > 0:
+        pages = []
+        for _ in range(pdf_pages):
+            words = _paragraph(rng, words=600)[1].split()
+            pages.append([" ".join(words[j : j + 12]) for j in range(0, len(words), 12)])
+        pdf = root / "manual.pdf"
+        write_pdf(pdf, pages)
+        files.append(pdf)
+    return files
+
+
+def bench_parse_chunk(files: list[Path]) -> dict[str, Any]:
+    from app.knowledge.store import chunk_text, read_text_from_file
+
+    by_type: dict[str, dict[str, float]] = {}
+    for path in files:
+        suffix = path.suffix.lower().lstrip(".")
+        stats = by_type.setdefault(
+            suffix,
+            {"files": 0, "bytes": 0, "chars": 0, "chunks": 0, "parse_s": 0.0, "chunk_s": 0.0},
+        )
+        start = time.perf_counter()
+        text = read_text_from_file(path)
+        parsed = time.perf_counter()
+        chunks = chunk_text(text)
+        done = time.perf_counter()
+        stats["files"] += 1
+        stats["bytes"] += path.stat().st_size
+        stats["chars"] += len(text)
+        stats["chunks"] += len(chunks)
+        stats["parse_s"] += parsed - start
+        stats["chunk_s"] += done - parsed
+
+    out: dict[str, Any] = {}
+    for suffix, s in sorted(by_type.items()):
+        out[suffix] = {
+            "files": int(s["files"]),
+            "bytes": int(s["bytes"]),
+            "chunks": int(s["chunks"]),
+            "parse_mb_per_s": round(s["bytes"] / 1_048_576 / s["parse_s"], 3) if s["parse_s"] else 0.0,
+            "chunk_chars_per_s": round(s["chars"] / s["chunk_s"]) if s["chunk_s"] else 0,
+        }
+    return out
+
+
+def _batches(items: Iterator[str], size: int) -> Iterator[list[str]]:
+    batch: list[str] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bench_index_query(
+    data_dir: Path,
+    *,
+    chunks: int,
+    batch_size: int,
+    queries: int,
+    top_k: int,
+    seed: int = 0,
+    bases: int = 1,
+) -> dict[str, Any]:
+    """Embed + add `chunks` synthetic chunks into a fresh store, then time `queries` lookups."""
+    from app.knowledge import store
+
+    os.environ["KNOWLEDGE_DATA_DIR"] = str(data_dir)
+    kbs = [store.DEFAULT_KB] + [f"kb{i}" for i in range(1, bases)]
+    collections = [store._get_chroma_collection(kb) for kb in kbs]
+    embed_s = 0.0
+    add_s = 0.0
+    indexed = 0
+    for batch in _batches(synthetic_chunks(chunks, seed=seed), batch_size):
+        start = time.perf_counter()
+        vectors, _ = store._embed_texts_with_usage(batch)
+        embedded = time.perf_counter()
+        collections[(indexed // batch_size) % len(collections)].add(
+            ids=[f"c{indexed + i}" for i in range(len(batch))],
+            documents=batch,
+            embeddings=vectors,
+            metadatas=[{"source": "synthetic", "chunk_index": indexed + i} for i in range(len(batch))],
+        )
+        embed_s += embedded - start
+        add_s += time.perf_counter() - embedded
+        indexed += len(batch)
+
+    def timed_queries(knowledge_bases: list[str]) -> list[float]:
+        rng = random.Random(seed + 1)
+        latencies: list[float] = []
+        for _ in range(queries):
+            topic = rng.choice(sorted(_TOPICS))
+            question = " ".join(rng.sample(_TOPICS[topic].split(), 4))
+            start = time.perf_counter()
+            store.query_knowledge(question, top_k=top_k, knowledge_bases=knowledge_bases)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    result: dict[str, Any] = {
+        "label": f"{chunks}" if bases == 1 else f"{chunks}x{bases}",
+        "chunks": indexed,
+        "bases": bases,
+        "embed_chunks_per_s": round(indexed / embed_s, 1) if embed_s else 0.0,
+        "index_chunks_per_s": round(indexed / add_s, 1) if add_s else 0.0,
+        "ingest_chunks_per_s": round(indexed / (embed_s + add_s), 1) if embed_s + add_s else 0.0,
+        "queries": queries,
+        "query": latency_summary(timed_queries(kbs[:1])),
+    }
+    if bases > 1:
+        result["query_all"] = latency_summary(timed_queries(kbs))
+    return result
+
+
+def run(args: argparse.Namespace, workdir: Path) -> dict[str, Any]:
+    from app.knowledge.embeddings import HashingEmbeddingProvider, set_embedding_provider
+
+    if args.provider == "hash":
+        set_embedding_provider(HashingEmbeddingProvider(dim=args.dim))
+    try:
+        files = generate_corpus(
+            workdir / "corpus",
+            docs=args.docs,
+            paragraphs=args.paragraphs,
+            pdf_pages=args.pdf_pages,
+            seed=args.seed,
+        )
+        results: dict[str, Any] = {
+            "provider": args.provider,
+            "dim": args.dim if args.provider == "hash" else None,
+            "parse_chunk": bench_parse_chunk(files),
+            "sizes": [],
+        }
+        for size in args.sizes:
+            results["sizes"].append(
+                bench_index_query(
+                    workdir / f"store_{size}",
+                    chunks=size,
+                    batch_size=args.batch_size,
+                    queries=args.queries,
+                    top_k=args.top_k,
+                    seed=args.seed,
+                    bases=args.bases,
+                )
+            )
+        return results
+    finally:
+        set_embedding_provider(None)
+
+
+def _parse_sizes(raw: str) -> list[int]:
+    return [int(x) for x in raw.replace("_", "").split(",") if x.strip()]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.knowledge_bench", description=__doc__)
+    parser.add_argument(
+        "--sizes",
+        type=_parse_sizes,
+        default=[10_000],
+        help="Comma-separated chunk counts, e.g. 10000,100000,1000000",
+    )
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=512, help="Chunks per embed/add call")
+    parser.add_argument("--bases", type=int, default=1, help="Knowledge bases to spread the chunks over")
+    parser.add_argument("--docs", type=int, default=50, help="txt + md files each")
+    parser.add_argument("--paragraphs", type=int, default=40, help="Paragraphs per txt/md file")
+    parser.add_argument("--pdf-pages", type=int, default=200)
+    parser.add_argument("--provider", choices=["hash", "azure"], default="hash")
+    parser.add_argument("--dim", type=int, default=256, help="Hashing provider dimensions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", default=None, help="Write results to this JSON file")
+    parser.add_argument("--compare", default=None, help="Previous result JSON to diff against")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["TOKEN_USAGE_DB_PATH"] = os.path.join(tmp, "bench_usage.sqlite3")
+        results = run(args, Path(tmp))
+    payload = write_results(args.json_path, "knowledge", results)
+    if args.compare:
+        for row in compare_results(args.compare, payload):
+            change = "n/a" if row["change_pct"] is None else f"{row['change_pct']:+.2f}%"
+            print(f"{row['metric']}: {row['baseline']} -> {row['current']} ({change})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,153 @@
+"""Cold-start benchmark: how long a fresh worker process takes to import the app.
+
+Each run starts a new interpreter with `python -X importtime -c "import app.main"`, once per
+scenario:
+
+- `full`: default configuration (knowledge routes mounted)
+- `chat_only`: `KNOWLEDGE_ENABLED=0` (no knowledge routes, no warm-up of the Chroma index)
+
+and reports, per scenario, the process wall time and the cumulative import time of
+`app.main` (median/min over the runs), plus the slowest top-level imports of the last run and
+whether heavy optional packages (chromadb, ...) were loaded at all. chromadb is imported
+lazily on first use of the knowledge store, so neither scenario should load it.
+
+Usage (from the backend directory):
+
+    py -m benchmarks.startup_bench --json out/startup.json
+    py -m benchmarks.startup_bench --runs 10 --compare out/startup.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any
+
+from benchmarks._common import BACKEND_DIR, compare_results, write_results
+
+SCENARIOS = {
+    "full": {"KNOWLEDGE_ENABLED": "1"},
+    "chat_only": {"KNOWLEDGE_ENABLED": "0"},
+}
+HEAVY_MODULES = ("chromadb", "openai", "tiktoken", "pypdf", "agent_framework")
+
+# import time: self [us] | cumulative | imported package
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def parse_importtime(stderr: str) -> list[dict[str, Any]]:
+    """Rows of `-X importtime` output as {module, self_us, cumulative_us, depth}."""
+    rows: list[dict[str, Any]] = []
+    for line in stderr.splitlines():
+        match = _LINE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        rows.append(
+            {
+                "module": module,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                # One leading space, then two per nesting level.
+                "depth": max(len(indent) - 1, 0) // 2,
+            }
+        )
+    return rows
+
+
+def top_imports(rows: list[dict[str, Any]], limit: int) -> list[dict[str, Any]]:
+    """Slowest top-level imports: interpreter startup (`site`, ...) and direct imports of the module."""
+    roots = [r for r in rows if r["depth"] <= 1 and r["module"] != "app.main"]
+    roots.sort(key=lambda r: r["cumulative_us"], reverse=True)
+    return [{"label": r["module"], "cumulative_ms": round(r["cumulative_us"] / 1000, 1)} for r in roots[:limit]]
+
+
+def run_once(module: str, env: dict[str, str]) -> tuple[float, list[dict[str, Any]]]:
+    code = f"import {module}"
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1", **env},
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    wall = time.perf_counter() - start
+    rows = parse_importtime(proc.stderr)
+    if proc.returncode != 0:
+        tail = "\n".join(l for l in proc.stderr.splitlines() if not l.startswith("import time:"))[-2000:]
+        raise RuntimeError(f"importing {module} failed:\n{tail}")
+    return wall, rows
+
+
+def bench_scenario(name: str, env: dict[str, str], *, module: str, runs: int, top: int) -> dict[str, Any]:
+    walls: list[float] = []
+    imports: list[float] = []
+    rows: list[dict[str, Any]] = []
+    for _ in range(runs):
+        wall, rows = run_once(module, env)
+        walls.append(wall)
+        entry = next((r for r in rows if r["module"] == module), None)
+        imports.append(entry["cumulative_us"] / 1_000_000 if entry else 0.0)
+    loaded = {r["module"].split(".")[0] for r in rows}
+    return {
+        "label": name,
+        "runs": runs,
+        "wall_ms": {
+            "median": round(statistics.median(walls) * 1000, 1),
+            "min": round(min(walls) * 1000, 1),
+        },
+        "import_ms": {
+            "median": round(statistics.median(imports) * 1000, 1),
+            "min": round(min(imports) * 1000, 1),
+        },
+        "modules_loaded": len(rows),
+        "heavy_modules": {m: m in loaded for m in HEAVY_MODULES},
+        "top_imports": top_imports(rows, top),
+    }
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    scenarios = [s for s in args.scenarios if s in SCENARIOS]
+    results: dict[str, Any] = {"module": args.module, "scenarios": []}
+    for name in scenarios:
+        results["scenarios"].append(
+            bench_scenario(name, SCENARIOS[name], module=args.module, runs=args.runs, top=args.top)
+        )
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup_bench", description=__doc__)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per scenario")
+    parser.add_argument(
+        "--scenarios",
+        type=lambda raw: [s.strip() for s in raw.split(",") if s.strip()],
+        default=list(SCENARIOS),
+        help="Comma-separated subset of: " + ", ".join(SCENARIOS),
+    )
+    parser.add_argument("--module", default="app.main", help="Module to import")
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to list")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write results to this JSON file")
+    parser.add_argument("--compare", default=None, help="Previous result JSON to diff against")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    payload = write_results(args.json_path, "startup", run(args))
+    if args.compare:
+        for row in compare_results(args.compare, payload):
+            change = "n/a" if row["change_pct"] is None else f"{row['change_pct']:+.2f}%"
+            print(f"{row['metric']}: {row['baseline']} -> {row['current']} ({change})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -21,3 +21,36 @@ def app():
 @pytest.fixture()
 def client(app):
     return TestClient(app)
+
+
+@pytest.fixture()
+def settings_env(monkeypatch):
+    """Set environment variables and reload the settings snapshot; restored afterwards."""
+    from app.core.settings import reload_settings
+
+    def apply(**env: str) -> None:
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        # Environment only: a local config/azure_openai.env must not override the test's values.
+        reload_settings(load_files=False)
+
+    yield apply
+    monkeypatch.undo()
+    reload_settings(load_files=False)
+
+
+@pytest.fixture()
+def hash_store(tmp_path, monkeypatch, request):
+    """Knowledge data dir and usage DB under `tmp_path`, embedded offline; yields the provider.
+
+    The provider is a `HashingEmbeddingProvider` unless a test picks another class with
+    `@pytest.mark.parametrize("hash_store", [ProviderClass], indirect=True)`.
+    """
+    from app.knowledge.embeddings import HashingEmbeddingProvider, set_embedding_provider
+
+    monkeypatch.setenv("KNOWLEDGE_DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setenv("TOKEN_USAGE_DB_PATH", str(tmp_path / "usage.sqlite3"))
+    provider = getattr(request, "param", HashingEmbeddingProvider)()
+    set_embedding_provider(provider)
+    yield provider
+    set_embedding_provider(None)
@@ -0,0 +1,183 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.agents.af_client import set_agent_override
+from app.agents.fake_agent import FakeAgent, FakeAgentConfig
+from app.core.admission import AdmissionController, AdmissionRejected
+from app.core.metrics import ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTED
+
+
+def test_concurrency_limit() -> None:
+    controller = AdmissionController("test_limit", max_concurrent=2)
+    running = 0
+    peak = 0
+
+    async def call() -> None:
+        nonlocal running, peak
+        async with controller.slot("k"):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    async def main() -> None:
+        await asyncio.gather(*(call() for _ in range(8)))
+
+    asyncio.run(main())
+    assert peak == 2
+    assert controller.in_flight() == 0
+    assert controller.queued() == 0
+
+
+def test_full_queue_rejects_with_retry_after() -> None:
+    controller = AdmissionController("test_full", max_concurrent=1, max_queue=1)
+
+    async def main() -> None:
+        release = asyncio.Event()
+
+        async def hold() -> None:
+            async with controller.slot("a"):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        assert ADMISSION_QUEUE_DEPTH.value("test_full") == 1
+
+        with pytest.raises(AdmissionRejected) as exc_info:
+            controller.check()
+        assert exc_info.value.retry_after >= 1
+        with pytest.raises(AdmissionRejected):
+            async with controller.slot("b"):
+                pass
+
+        release.set()
+        await asyncio.gather(holder, waiter)
+
+    asyncio.run(main())
+    assert ADMISSION_REJECTED.value("test_full", "queue_full") == 2
+
+
+def test_waiters_are_served_round_robin_across_keys() -> None:
+    controller = AdmissionController("test_fair", max_concurrent=1)
+    order: list[str] = []
+
+    async def main() -> None:
+        release = asyncio.Event()
+
+        async def call(key: str) -> None:
+            async with controller.slot(key):
+                order.append(key)
+                if key == "first":
+                    await release.wait()
+
+        tasks = [asyncio.create_task(call("first"))]
+        await asyncio.sleep(0.01)
+        for key in ("busy", "busy", "busy", "quiet"):
+            tasks.append(asyncio.create_task(call(key)))
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["first", "busy", "quiet", "busy", "busy"]
+
+
+def test_token_budget_delays_until_refilled() -> None:
+    # 60k tokens/minute = 1000/s with a 10k burst.
+    controller = AdmissionController("test_tokens", max_concurrent=10, tokens_per_minute=60_000)
+
+    async def main() -> float:
+        async with controller.slot("k", tokens=10_000):
+            pass
+        start = time.monotonic()
+        async with controller.slot("k", tokens=300):
+            return time.monotonic() - start
+
+    waited = asyncio.run(main())
+    assert 0.2 <= waited < 2.0
+
+
+def test_wait_timeout_rejects() -> None:
+    controller = AdmissionController("test_timeout", max_concurrent=1, queue_timeout=0.05)
+
+    async def main() -> None:
+        async with controller.slot("a"):
+            with pytest.raises(AdmissionRejected) as exc_info:
+                async with controller.slot("b"):
+                    pass
+            assert exc_info.value.reason == "timeout"
+
+    asyncio.run(main())
+    assert controller.queued() == 0
+    assert controller.in_flight() == 0
+
+
+def test_sync_and_async_callers_share_the_limit() -> None:
+    controller = AdmissionController("test_mixed", max_concurrent=1)
+    holding = threading.Event()
+    release = threading.Event()
+
+    def worker() -> None:
+        with controller.slot_sync("ingest"):
+            holding.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    holding.wait(5)
+
+    async def main() -> float:
+        threading.Timer(0.1, release.set).start()
+        start = time.monotonic()
+        async with controller.slot("query"):
+            return time.monotonic() - start
+
+    waited = asyncio.run(main())
+    thread.join(5)
+    assert waited >= 0.05
+    assert controller.in_flight() == 0
+
+
+def test_agent_route_returns_429_when_saturated(client, tmp_path, monkeypatch) -> None:
+    import app.api.routes.agent as agent_routes
+
+    monkeypatch.setenv("TOKEN_USAGE_DB_PATH", str(tmp_path / "usage.sqlite3"))
+    controller = AdmissionController("test_route", max_concurrent=1, max_queue=0)
+    monkeypatch.setattr(agent_routes, "AGENT_ADMISSION", controller)
+    set_agent_override(FakeAgent(FakeAgentConfig(output_tokens=2)))
+    try:
+        with controller.slot_sync("someone-else"):
+            res = client.post("/api/agent/run", json={"message": "hello"})
+            assert res.status_code == 429
+            assert int(res.headers["retry-after"]) >= 1
+            assert client.post("/api/agent/stream", json={"message": "hello"}).status_code == 429
+
+        res = client.post("/api/agent/run", json={"message": "hello"})
+        assert res.status_code == 200
+    finally:
+        set_agent_override(None)
+
+
+def test_queued_turn_does_not_take_the_live_thread(client, tmp_path, monkeypatch) -> None:
+    import app.api.routes.agent as agent_routes
+
+    monkeypatch.setenv("TOKEN_USAGE_DB_PATH", str(tmp_path / "usage.sqlite3"))
+    controller = AdmissionController("test_queued_checkout", max_concurrent=1, max_queue=4, queue_timeout=0.05)
+    monkeypatch.setattr(agent_routes, "AGENT_ADMISSION", controller)
+    set_agent_override(FakeAgent(FakeAgentConfig(output_tokens=2)))
+    try:
+        conversation_id = client.post("/api/agent/run", json={"message": "hello"}).json()["conversation_id"]
+        body = {"message": "again", "conversation_id": conversation_id}
+        with controller.slot_sync("someone-else"):
+            assert client.post("/api/agent/run", json=body).status_code == 429
+            assert "event: error" in client.post("/api/agent/stream", json=body).text
+        # Both requests timed out in the queue without checking the thread out.
+        assert agent_routes._conversations.get(conversation_id).live_thread is not None
+        res = client.post("/api/agent/run", json=body)
+        assert res.status_code == 200 and res.json()["stats"]["turns"] == 2
+    finally:
+        set_agent_override(None)
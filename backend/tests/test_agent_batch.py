@@ -0,0 +1,126 @@
+import asyncio
+import json
+
+import pytest
+
+from app.agents.af_client import set_agent_override
+from app.agents.batch import BatchRun
+from app.agents.fake_agent import FakeAgent, FakeAgentConfig
+
+
+def _batch(items, *, concurrency=2, fail=(), delay=0.01):
+    state = {"active": 0, "peak": 0, "order": [], "persisted": []}
+
+    async def run_turn(index, message, conversation_id):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        try:
+            await asyncio.sleep(delay)
+            if message in fail:
+                raise RuntimeError(f"bad {message}")
+            state["order"].append(message)
+            return {"output": message.upper()}, (conversation_id, 1, {"input_tokens": 1}, None)
+        finally:
+            state["active"] -= 1
+
+    async def persist(rows):
+        state["persisted"].append(list(rows))
+
+    return BatchRun(items, run_turn, persist, concurrency=concurrency), state
+
+
+async def _collect(run):
+    return [result async for result in run.results()]
+
+
+def test_batch_bounds_concurrency_and_keeps_conversation_order() -> None:
+    items = [(f"a{i}", "conv-a") for i in range(3)] + [(f"m{i}", None) for i in range(5)]
+
+    async def main():
+        run, state = _batch(items, concurrency=3)
+        run.start()
+        return await _collect(run), state
+
+    results, state = asyncio.run(main())
+    *lines, summary = results
+    assert sorted(line["index"] for line in lines) == list(range(8))
+    assert all(line["status"] == "ok" for line in lines)
+    assert state["peak"] == 3
+    assert [m for m in state["order"] if m.startswith("a")] == ["a0", "a1", "a2"]
+    # Items without a conversation id each get their own.
+    assert len({line["conversation_id"] for line in lines}) == 6
+    assert summary["counts"]["ok"] == 8 and summary["usage_recorded"] == 8
+    assert len(state["persisted"]) == 1
+
+
+def test_failed_turn_skips_rest_of_its_conversation() -> None:
+    items = [("a0", "conv-a"), ("a1", "conv-a"), ("a2", "conv-a"), ("b0", "conv-b")]
+
+    async def main():
+        run, _ = _batch(items, fail={"a1"})
+        run.start()
+        return await _collect(run)
+
+    *lines, summary = asyncio.run(main())
+    status = {line["index"]: line["status"] for line in lines}
+    assert status == {0: "ok", 1: "error", 2: "skipped", 3: "ok"}
+    assert next(line for line in lines if line["index"] == 1)["error"] == "bad a1"
+    assert summary["counts"] == {"ok": 2, "error": 1, "skipped": 1, "cancelled": 0}
+
+
+def test_cancel_stops_batch_and_records_finished_turns() -> None:
+    items = [(f"m{i}", None) for i in range(10)]
+
+    async def main():
+        run, state = _batch(items, concurrency=2, delay=0.05)
+        run.start()
+        results = []
+        async for result in run.results():
+            results.append(result)
+            if len(results) == 2:
+                run.cancel()
+        return results, state
+
+    results, state = asyncio.run(main())
+    *lines, summary = results
+    assert summary["cancelled"]
+    assert len(lines) == 10
+    assert summary["counts"]["ok"] >= 2
+    assert summary["counts"]["ok"] + summary["counts"]["cancelled"] == 10
+    assert len(state["persisted"][0]) == summary["counts"]["ok"] == summary["usage_recorded"]
+
+
+@pytest.fixture()
+def fake_agent(tmp_path, monkeypatch):
+    monkeypatch.setenv("TOKEN_USAGE_DB_PATH", str(tmp_path / "usage.sqlite3"))
+    set_agent_override(FakeAgent(FakeAgentConfig(output_tokens=3)))
+    yield
+    set_agent_override(None)
+
+
+def test_batch_route_streams_ndjson(client, fake_agent) -> None:
+    items = [{"message": "first", "conversation_id": "batch-conv"}, {"message": "second", "conversation_id": "batch-conv"}]
+    items += [{"message": f"q{i}"} for i in range(3)]
+    r = client.post("/api/agent/batch", json={"items": items, "concurrency": 2})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+
+    head, *lines, summary = [json.loads(line) for line in r.text.splitlines()]
+    assert head["items"] == 5 and head["concurrency"] == 2
+    assert sorted(line["index"] for line in lines) == [0, 1, 2, 3, 4]
+    by_index = {line["index"]: line for line in lines}
+    assert by_index[0]["output"] == "tok0 tok1 tok2"
+    assert by_index[1]["stats"]["turns"] == 2
+    assert summary["done"] and summary["usage_recorded"] == 5
+
+    usage = client.get("/api/agent/usage", params={"conversation_id": "batch-conv"}).json()
+    assert sorted(item["turn_index"] for item in usage["items"]) == [1, 2]
+
+
+def test_batch_route_validation(client, fake_agent) -> None:
+    assert client.post("/api/agent/batch", json={"items": []}).status_code == 400
+    r = client.post("/api/agent/batch", json={"items": [{"message": "x"}], "concurrency": 1000})
+    assert r.status_code == 400
+    r = client.post("/api/agent/batch", json={"items": [{"message": "x"}], "profile": "missing"})
+    assert r.status_code == 400
+    assert client.post("/api/agent/batch/nope/cancel").status_code == 404
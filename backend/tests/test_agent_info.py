@@ -1,9 +1,11 @@
-def test_agent_info_endpoint_does_not_expose_key(client, monkeypatch):
-    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com/")
-    monkeypatch.setenv("AZURE_OPENAI_RESPONSES_DEPLOYMENT_NAME", "gpt-deploy")
-    monkeypatch.setenv("AZURE_OPENAI_API_VERSION", "2024-10-21")
-    monkeypatch.setenv("AZURE_TENANT_ID", "tenant-123")
-    monkeypatch.setenv("AZURE_OPENAI_API_KEY", "super-secret")
+def test_agent_info_endpoint_does_not_expose_key(client, settings_env):
+    settings_env(
+        AZURE_OPENAI_ENDPOINT="https://example.openai.azure.com/",
+        AZURE_OPENAI_RESPONSES_DEPLOYMENT_NAME="gpt-deploy",
+        AZURE_OPENAI_API_VERSION="2024-10-21",
+        AZURE_TENANT_ID="tenant-123",
+        AZURE_OPENAI_API_KEY="super-secret",
+    )
 
     res = client.get("/api/agent/info")
     assert res.status_code == 200
@@ -0,0 +1,201 @@
+import json
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+from app.agents.agent_pool import AgentPool, AgentProfile, Deployment, load_profiles
+from app.core.settings import Settings
+
+
+class Throttled(Exception):
+    def __init__(self, retry_after: str | None = None) -> None:
+        super().__init__("429 Too Many Requests")
+        self.status_code = 429
+        self.response = SimpleNamespace(status_code=429, headers={"retry-after": retry_after} if retry_after else {})
+
+
+def _pool(*weights: int, strategy: str = "least_outstanding") -> AgentPool:
+    deployments = tuple(
+        Deployment(endpoint=f"https://r{i}.openai.azure.com/", deployment_name="gpt", weight=w)
+        for i, w in enumerate(weights)
+    )
+    profile = AgentProfile("test", deployments, strategy=strategy)
+    return AgentPool(profile, lambda profile, deployment: deployment.endpoint)
+
+
+def test_default_profile_from_settings() -> None:
+    config = Settings(azure_openai_endpoint="https://a.openai.azure.com/", responses_deployment_name="gpt-4o")
+    profiles = load_profiles(config)
+    assert list(profiles) == ["default"]
+    assert profiles["default"].deployments[0].key == "a.openai.azure.com/gpt-4o"
+
+
+def test_profiles_from_json(monkeypatch) -> None:
+    monkeypatch.setenv("EASTUS_KEY", "k2")
+    config = Settings(
+        azure_openai_endpoint="https://a.openai.azure.com/",
+        responses_deployment_name="gpt-4o",
+        api_key="k1",
+        agent_profiles=json.dumps(
+            {
+                "coder": {
+                    "instructions": "Write code.",
+                    "strategy": "weighted_round_robin",
+                    "deployments": [
+                        {"weight": 3},
+                        {"endpoint": "https://b.openai.azure.com/", "api_key_env": "EASTUS_KEY"},
+                        {"endpoint": "https://c.openai.azure.com/", "deployment_name": "gpt-4.1"},
+                    ],
+                }
+            }
+        ),
+    )
+    coder = load_profiles(config)["coder"]
+    assert coder.instructions == "Write code."
+    assert [(d.key, d.api_key, d.weight) for d in coder.deployments] == [
+        ("a.openai.azure.com/gpt-4o", "k1", 3),
+        ("b.openai.azure.com/gpt-4o", "k2", 1),
+        # Another endpoint without its own key uses Entra ID, not the default key.
+        ("c.openai.azure.com/gpt-4.1", "", 1),
+    ]
+
+
+def test_invalid_profiles_are_rejected() -> None:
+    with pytest.raises(RuntimeError, match="not valid JSON"):
+        load_profiles(Settings(agent_profiles="{nope"))
+    with pytest.raises(RuntimeError, match="strategy"):
+        load_profiles(Settings(agent_profiles='{"x": {"strategy": "random"}}'))
+
+
+def test_least_outstanding_spreads_concurrent_calls() -> None:
+    pool = _pool(1, 1, 1)
+    leases = [pool.pick().begin() for _ in range(6)]
+    assert sorted(Counter(lease.agent for lease in leases).values()) == [2, 2, 2]
+    for lease in leases:
+        lease.end()
+    # Idle deployments are tied; sequential calls still rotate.
+    assert len({pool.pick().agent for _ in range(3)}) == 3
+
+
+def test_least_outstanding_respects_weight() -> None:
+    pool = _pool(2, 1)
+    leases = [pool.pick().begin() for _ in range(6)]
+    assert Counter(lease.agent for lease in leases) == {"https://r0.openai.azure.com/": 4, "https://r1.openai.azure.com/": 2}
+
+
+def test_weighted_round_robin() -> None:
+    pool = _pool(2, 1, strategy="weighted_round_robin")
+    picks = [pool.pick().agent for _ in range(30)]
+    assert Counter(picks) == {"https://r0.openai.azure.com/": 20, "https://r1.openai.azure.com/": 10}
+    # Smooth: the heavier deployment is never picked three times in a row.
+    assert "https://r0.openai.azure.com/" * 3 not in "".join(picks)
+
+
+def test_throttled_deployment_is_routed_around() -> None:
+    pool = _pool(1, 1)
+    lease = pool.pick()
+    throttled = lease.agent
+    with pytest.raises(Throttled):
+        with lease:
+            raise Throttled(retry_after="30")
+
+    assert throttled not in {pool.pick().agent for _ in range(10)}
+    state = next(d for d in pool.snapshot()["deployments"] if not d["healthy"])
+    assert 25 < state["cooldown_s"] <= 30
+    assert "Throttled" in state["last_error"]
+
+
+def test_wrapped_transient_error_counts_and_plain_errors_do_not() -> None:
+    pool = _pool(1)
+    lease = pool.pick()
+    with pytest.raises(ValueError):
+        with lease:
+            raise ValueError("bad prompt")
+    assert pool.snapshot()["deployments"][0]["healthy"]
+
+    lease = pool.pick()
+    try:
+        with lease:
+            try:
+                raise ConnectionError("reset")
+            except ConnectionError as inner:
+                raise RuntimeError("service failed") from inner
+    except RuntimeError:
+        pass
+    # Every deployment cooling down: the pool still answers with the one that recovers first.
+    assert not pool.snapshot()["deployments"][0]["healthy"]
+    assert pool.pick().agent == "https://r0.openai.azure.com/"
+
+
+def test_conversation_affinity() -> None:
+    pool = _pool(1, 1, 1)
+    first = pool.pick("conv-1").agent
+    assert {pool.pick("conv-1").agent for _ in range(5)} == {first}
+
+    lease = pool.pick("conv-1")
+    with pytest.raises(Throttled):
+        with lease:
+            raise Throttled()
+    assert pool.pick("conv-1").agent != first
+
+
+def test_route_uses_requested_profile(client, settings_env, tmp_path) -> None:
+    settings_env(
+        AGENT_BACKEND="fake",
+        TOKEN_USAGE_DB_PATH=str(tmp_path / "usage.sqlite3"),
+        AGENT_PROFILES=json.dumps(
+            {"fast": {"deployments": [{"deployment_name": "mini-a"}, {"deployment_name": "mini-b"}]}}
+        ),
+    )
+    for _ in range(4):
+        r = client.post("/api/agent/run", json={"message": "hi", "profile": "fast"})
+        assert r.status_code == 200
+
+    profiles = {p["profile"]: p for p in client.get("/api/agent/profiles").json()["items"]}
+    assert set(profiles) == {"default", "fast"}
+    assert [d["requests"] for d in profiles["fast"]["deployments"]] == [2, 2]
+
+    r = client.post("/api/agent/run", json={"message": "hi", "profile": "missing"})
+    assert r.status_code == 400
+    assert "Unknown agent profile" in r.json()["detail"]
+
+
+def test_entra_deployment_leaves_the_default_key_in_place(settings_env, monkeypatch) -> None:
+    import os
+    import sys
+
+    from app.agents.agent_pool import AGENT_POOLS
+    from app.core import credentials
+    from app.core.settings import get_settings, reload_settings
+
+    clients = {}
+
+    class FakeResponsesClient:
+        def __init__(self, **kwargs) -> None:
+            clients[kwargs["endpoint"]] = kwargs
+
+        def create_agent(self, **kwargs):
+            return SimpleNamespace(**kwargs)
+
+    monkeypatch.setitem(sys.modules, "agent_framework", SimpleNamespace())
+    monkeypatch.setitem(sys.modules, "agent_framework.azure", SimpleNamespace(AzureOpenAIResponsesClient=FakeResponsesClient))
+    token = SimpleNamespace(token="entra-token")
+    monkeypatch.setattr(credentials, "get_shared_credential", lambda tenant_id="": SimpleNamespace(get_token=lambda *s: token))
+    settings_env(
+        AGENT_BACKEND="azure",
+        AZURE_OPENAI_ENDPOINT="https://a.openai.azure.com/",
+        AZURE_OPENAI_RESPONSES_DEPLOYMENT_NAME="gpt-4o",
+        AZURE_OPENAI_API_KEY="default-key",
+        AGENT_PROFILES=json.dumps(
+            {"default": {}, "west": {"deployments": [{"endpoint": "https://b.openai.azure.com/"}]}}
+        ),
+    )
+    AGENT_POOLS.warm_up()
+
+    assert os.environ["AZURE_OPENAI_API_KEY"] == "default-key"
+    reload_settings(load_files=False)
+    assert get_settings().auth_mode == "api_key"
+    keyed, entra = clients["https://a.openai.azure.com/"], clients["https://b.openai.azure.com/"]
+    assert keyed["api_key"] == "default-key" and "ad_token_provider" not in keyed
+    assert "api_key" not in entra and entra["ad_token_provider"]() == "entra-token"
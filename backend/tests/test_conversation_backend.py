@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.agents.context_policy import ContextPolicy
+from app.agents.conversation_backend import HttpKeyValueClient, KVConversationBackend
+from app.agents.conversation_store import ConversationStore, apply_usage, empty_stats, turn_messages
+from app.agents.fake_agent import FakeAgent, FakeAgentConfig
+from app.db.conversations import SqliteConversationBackend
+from app.db.kv_server import create_kv_app
+
+
+@pytest.fixture(params=["sqlite", "http"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SqliteConversationBackend(str(tmp_path / "conversations.sqlite3"))
+    return KVConversationBackend(HttpKeyValueClient(client=TestClient(create_kv_app())))
+
+
+def _workers(backend, n=2, **kwargs):
+    kwargs.setdefault("context_policy", ContextPolicy())
+    return [ConversationStore(backend=backend, compact_min=4, **kwargs) for _ in range(n)]
+
+
+async def _turn(store, agent, conversation_id, message):
+    checked_out = await store.checkout(conversation_id, agent)
+    result = await agent.run(message, thread=checked_out.thread)
+    usage = result.usage
+    stats = apply_usage(checked_out.stats, usage)
+    await store.commit(
+        conversation_id,
+        agent,
+        checked_out.thread,
+        stats,
+        turn_messages(message, result.text),
+        generation=checked_out.generation,
+        version=checked_out.version,
+        usage=usage,
+    )
+    return checked_out
+
+
+def test_turns_alternating_between_workers_keep_history(backend):
+    a, b = _workers(backend)
+    agent = FakeAgent(FakeAgentConfig(output_tokens=1))
+
+    async def go():
+        sources = []
+        for i in range(9):
+            store = a if i % 2 == 0 else b
+            sources.append((await _turn(store, agent, "c", f"m{i}")).source)
+        final = await a.checkout("c", agent)
+        return sources, final
+
+    sources, final = asyncio.run(go())
+    assert sources[0] == "new"
+    # Every turn follows one made on the other worker, so the cached thread is stale each time.
+    assert set(sources[1:]) == {"rebuilt"}
+    assert [m["text"] for m in final.thread.messages if m["role"] == "user"] == [f"m{i}" for i in range(9)]
+    assert final.stats["turns"] == 9
+    assert backend.count() == 1
+
+
+def test_same_worker_reuses_live_thread_while_version_is_unchanged(backend):
+    (store,) = _workers(backend, n=1)
+    agent = FakeAgent(FakeAgentConfig(output_tokens=1))
+
+    async def go():
+        return [(await _turn(store, agent, "c", f"m{i}")).source for i in range(12)]
+
+    assert asyncio.run(go())[1:] == ["live"] * 11
+    stored = backend.load("c")
+    # Compaction moved most messages into the snapshot; the log holds only the tail.
+    assert stored.snapshot is not None
+    assert len(stored.snapshot["messages"]) + len(stored.log) == 24
+
+
+def test_concurrent_writers_both_land(backend):
+    a, b = _workers(backend)
+    agent = FakeAgent(FakeAgentConfig(output_tokens=1))
+
+    async def go():
+        await _turn(a, agent, "c", "first")
+        # Both workers read the same version, then commit one after the other.
+        ca = await a.checkout("c", agent)
+        cb = await b.checkout("c", agent)
+        for store, checked_out, text in ((a, ca, "from a"), (b, cb, "from b")):
+            result = await agent.run(text, thread=checked_out.thread)
+            usage = result.usage
+            await store.commit(
+                "c",
+                agent,
+                checked_out.thread,
+                apply_usage(checked_out.stats, usage),
+                turn_messages(text, result.text),
+                generation=checked_out.generation,
+                version=checked_out.version,
+                usage=usage,
+            )
+        return await a.checkout("c", agent)
+
+    final = asyncio.run(go())
+    texts = [m["text"] for m in final.thread.messages if m["role"] == "user"]
+    assert texts == ["first", "from a", "from b"]
+    assert final.stats["turns"] == 3
+
+
+def test_window_reset_is_shared(backend):
+    a, b = _workers(backend, context_policy=ContextPolicy(mode="last_n", max_turns=2))
+    agent = FakeAgent(FakeAgentConfig(output_tokens=1))
+
+    async def go():
+        for i in range(5):
+            await _turn(a if i % 2 else b, agent, "c", f"m{i}")
+        return await a.checkout("c", agent)
+
+    final = asyncio.run(go())
+    assert [m["text"] for m in final.thread.messages if m["role"] == "user"] == ["m3", "m4"]
+    assert final.stats != empty_stats()
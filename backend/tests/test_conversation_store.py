@@ -0,0 +1,235 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.agents.context_policy import ContextPolicy
+from app.agents.conversation_store import ConversationStore, turn_messages
+from app.agents.fake_agent import FakeAgent, FakeAgentConfig
+
+
+class CountingAgent(FakeAgent):
+    def __init__(self) -> None:
+        super().__init__(FakeAgentConfig(output_tokens=2))
+        self.serializations = 0
+        self.deserializations = 0
+
+    def get_new_thread(self):
+        thread = super().get_new_thread()
+        original = thread.serialize
+
+        def serialize():
+            self.serializations += 1
+            return original()
+
+        thread.serialize = serialize
+        return thread
+
+    def deserialize_thread(self, serialized):
+        self.deserializations += 1
+        thread = self.get_new_thread()
+        thread.messages = [dict(m) for m in serialized["messages"]]
+        return thread
+
+
+class ServiceThread:
+    """Thread whose history lives on the service, like a Responses thread with `previous_response_id`."""
+
+    def __init__(self, service: dict, service_thread_id: str | None = None) -> None:
+        self.service = service
+        self.service_thread_id = service_thread_id
+        self.local: list[dict[str, str]] = []
+
+    @property
+    def messages(self) -> list[dict[str, str]]:
+        return list(self.service.get(self.service_thread_id, [])) + self.local
+
+    def serialize(self):
+        return {"service_thread_id": self.service_thread_id}
+
+    async def on_new_messages(self, new_messages) -> None:
+        if self.service_thread_id is None:
+            self.local.extend(new_messages)
+
+
+class ServiceAgent:
+    def __init__(self) -> None:
+        self.service: dict[str, list[dict[str, str]]] = {}
+
+    def get_new_thread(self):
+        return ServiceThread(self.service)
+
+    def deserialize_thread(self, serialized):
+        return ServiceThread(self.service, serialized["service_thread_id"])
+
+    async def run(self, message, *, thread):
+        # Every response gets a new id that continues the previous one.
+        response_id = f"resp_{len(self.service)}"
+        self.service[response_id] = thread.messages + turn_messages(message, "ok")
+        thread.service_thread_id, thread.local = response_id, []
+        return SimpleNamespace(text="ok")
+
+
+async def _turn(store, agent, conversation_id, message):
+    checked_out = await store.checkout(conversation_id, agent)
+    result = await agent.run(message, thread=checked_out.thread)
+    messages = turn_messages(message, result.text)
+    await store.commit(
+        conversation_id,
+        agent,
+        checked_out.thread,
+        checked_out.stats,
+        messages,
+        generation=checked_out.generation,
+        version=checked_out.version,
+    )
+    return checked_out
+
+
+def test_live_thread_is_reused_and_compaction_is_geometric():
+    store = ConversationStore(compact_min=4, max_live_threads=10)
+    agent = CountingAgent()
+
+    async def go():
+        return [(await _turn(store, agent, "c1", f"m{i}")).source for i in range(200)]
+
+    sources = asyncio.run(go())
+    assert sources[0] == "new"
+    assert set(sources[1:]) == {"live"}
+    assert agent.deserializations == 0
+    # 400 messages with a doubling threshold: a handful of snapshots, not one per turn.
+    assert agent.serializations <= 8
+    record = store.get("c1")
+    assert record.snapshot_messages + len(record.log) == 400
+
+
+def test_rebuild_after_eviction_replays_the_log():
+    store = ConversationStore(compact_min=4, max_live_threads=1)
+    agent = CountingAgent()
+
+    async def go():
+        for i in range(5):
+            await _turn(store, agent, "a", f"a{i}")
+        expected = list(store.get("a").live_thread.messages)
+        # A second conversation pushes "a"'s live thread out of the cache.
+        await _turn(store, agent, "b", "hello")
+        assert store.get("a").live_thread is None
+        return expected, await store.checkout("a", agent)
+
+    expected, checked_out = asyncio.run(go())
+    assert checked_out.source == "rebuilt"
+    assert checked_out.thread.messages == expected
+
+
+def test_concurrent_turn_does_not_compact_away_the_other_turn():
+    store = ConversationStore(compact_min=5)
+    agent = CountingAgent()
+
+    async def commit(checked_out, message):
+        result = await agent.run(message, thread=checked_out.thread)
+        await store.commit(
+            "c",
+            agent,
+            checked_out.thread,
+            checked_out.stats,
+            turn_messages(message, result.text),
+            generation=checked_out.generation,
+            version=checked_out.version,
+        )
+
+    async def go():
+        await _turn(store, agent, "c", "u1")
+        first = await store.checkout("c", agent)
+        second = await store.checkout("c", agent)
+        assert second.source == "rebuilt"
+        await commit(first, "uA")
+        # B's thread lacks A's turn: its commit must not snapshot that thread over A's messages.
+        await commit(second, "uB")
+        return await store.checkout("c", agent)
+
+    checked_out = asyncio.run(go())
+    texts = [m["text"] for m in checked_out.thread.messages]
+    assert "uA" in texts and "uB" in texts
+    assert len(texts) == 6
+
+
+def test_service_thread_is_snapshotted_every_turn():
+    store = ConversationStore(compact_min=4, max_live_threads=1)
+    agent = ServiceAgent()
+
+    async def go():
+        for i in range(5):
+            await _turn(store, agent, "a", f"a{i}")
+        # Evict "a"'s live thread so the next turn rebuilds it.
+        await _turn(store, agent, "b", "hello")
+        return await store.checkout("a", agent)
+
+    checked_out = asyncio.run(go())
+    assert checked_out.source == "rebuilt"
+    assert [m["text"] for m in checked_out.thread.messages if m["role"] == "user"] == [f"a{i}" for i in range(5)]
+    record = store.get("a")
+    assert record.log == [] and record.snapshot == {"service_thread_id": checked_out.thread.service_thread_id}
+
+
+def test_last_n_policy_keeps_prompt_bounded():
+    store = ConversationStore(compact_min=4, context_policy=ContextPolicy(mode="last_n", max_turns=3))
+    agent = CountingAgent()
+
+    async def go():
+        inputs = []
+        for i in range(20):
+            checked_out = await store.checkout("c", agent)
+            inputs.append(agent._prompt_tokens(checked_out.thread, "x"))
+            result = await agent.run(f"m{i}", thread=checked_out.thread)
+            await store.commit(
+                "c",
+                agent,
+                checked_out.thread,
+                checked_out.stats,
+                turn_messages(f"m{i}", result.text),
+                generation=checked_out.generation,
+                version=checked_out.version,
+            )
+        return inputs
+
+    inputs = asyncio.run(go())
+    assert inputs[-1] == inputs[-5]
+    assert len(store.get("c").window) == 3
+
+
+def test_summary_policy_folds_old_turns_in_background():
+    prompts = []
+
+    async def summarizer(agent, prompt):
+        prompts.append(prompt)
+        return "user likes tea"
+
+    policy = ContextPolicy(mode="summary", max_tokens=20, keep_turns=2)
+    store = ConversationStore(context_policy=policy, summarizer=summarizer)
+    agent = CountingAgent()
+
+    async def go():
+        for i in range(6):
+            await _turn(store, agent, "s", f"message number {i} with a few extra words")
+            await store.drain()
+        return await store.checkout("s", agent)
+
+    checked_out = asyncio.run(go())
+    record = store.get("s")
+    assert prompts and "message number 0" in prompts[0]
+    assert record.summary == "user likes tea"
+    assert record.summarized_turns >= 3
+    assert len(record.window) <= policy.keep_turns + 1
+    assert checked_out.source == "rebuilt"
+    assert checked_out.thread.messages[0]["text"].endswith("user likes tea")
+
+
+def test_agent_policy_attribute_overrides_store_default():
+    agent = CountingAgent()
+    agent.context_policy = ContextPolicy(mode="token_budget", max_tokens=5)
+    store = ConversationStore()
+
+    async def go():
+        for i in range(4):
+            await _turn(store, agent, "t", f"one two three four five six {i}")
+
+    asyncio.run(go())
+    assert len(store.get("t").window) == 1
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import namedtuple
+
+import pytest
+
+from app.core.credentials import CachedTokenCredential
+
+AccessToken = namedtuple("AccessToken", ["token", "expires_on"])
+SCOPE = "https://cognitiveservices.azure.com/.default"
+
+
+class FakeCredential:
+    """Counts fetches; each token lives `lifetime` seconds. Fetching takes `delay` seconds."""
+
+    def __init__(self, lifetime: float = 3600, delay: float = 0.05) -> None:
+        self.lifetime = lifetime
+        self.delay = delay
+        self.calls = 0
+        self.fail = False
+        self._lock = threading.Lock()
+
+    def get_token(self, *scopes, **kwargs):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("az login expired")
+        return AccessToken(f"token-{n}", int(time.time() + self.lifetime))
+
+
+def _wait_for(predicate, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_token_is_cached() -> None:
+    fake = FakeCredential()
+    cred = CachedTokenCredential(fake)
+    tokens = {cred.get_token(SCOPE).token for _ in range(20)}
+    assert tokens == {"token-1"}
+    assert fake.calls == 1
+
+
+def test_concurrent_cold_callers_share_one_fetch() -> None:
+    fake = FakeCredential(delay=0.2)
+    cred = CachedTokenCredential(fake)
+    results: list[str] = []
+
+    def call() -> None:
+        results.append(cred.get_token(SCOPE).token)
+
+    threads = [threading.Thread(target=call) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert fake.calls == 1
+    assert set(results) == {"token-1"}
+
+
+def test_refreshes_in_background_before_expiry() -> None:
+    # Tokens live 200s: inside the 300s refresh window but outside the 60s margin.
+    fake = FakeCredential(lifetime=200, delay=0.1)
+    cred = CachedTokenCredential(fake, refresh_margin=60, refresh_ahead=300)
+    assert cred.get_token(SCOPE).token == "token-1"
+
+    start = time.monotonic()
+    # Served from cache immediately while the refresh runs.
+    assert cred.get_token(SCOPE).token == "token-1"
+    assert cred.get_token(SCOPE).token == "token-1"
+    assert time.monotonic() - start < 0.05
+
+    _wait_for(lambda: fake.calls >= 2)
+    _wait_for(lambda: cred.get_token(SCOPE).token != "token-1")
+    assert cred.get_token(SCOPE).token == "token-2"
+
+
+def test_expiring_token_is_refreshed_before_use() -> None:
+    fake = FakeCredential(lifetime=30)
+    cred = CachedTokenCredential(fake, refresh_margin=60, refresh_ahead=300)
+    cred.get_token(SCOPE)
+    # Less than the margin left: callers wait for a new token instead of using this one.
+    assert cred.get_token(SCOPE).token == "token-2"
+
+
+def test_failed_background_refresh_keeps_valid_token() -> None:
+    fake = FakeCredential(lifetime=200)
+    cred = CachedTokenCredential(fake, refresh_margin=60, refresh_ahead=300)
+    cred.get_token(SCOPE)
+    fake.fail = True
+    assert cred.get_token(SCOPE).token == "token-1"
+    _wait_for(lambda: fake.calls >= 2)
+    time.sleep(0.1)
+    assert cred.get_token(SCOPE).token == "token-1"
+
+
+def test_cold_failure_is_raised() -> None:
+    fake = FakeCredential()
+    fake.fail = True
+    cred = CachedTokenCredential(fake)
+    with pytest.raises(RuntimeError, match="az login expired"):
+        cred.get_token(SCOPE)
+
+
+def test_claims_challenge_bypasses_cache() -> None:
+    fake = FakeCredential()
+    cred = CachedTokenCredential(fake)
+    cred.get_token(SCOPE)
+    assert cred.get_token(SCOPE, claims='{"access_token":{}}').token == "token-2"
+    assert cred.get_token(SCOPE).token == "token-1"
@@ -0,0 +1,52 @@
+import math
+
+from app.knowledge.embeddings import HashingEmbeddingProvider
+
+
+def _cosine(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+def test_hashing_provider_is_deterministic_and_normalised():
+    provider = HashingEmbeddingProvider(dim=64)
+    (v1, v2), usage = provider.embed(["invoice refund payment", "invoice refund payment"])
+    assert v1 == v2
+    assert len(v1) == 64
+    assert math.isclose(math.sqrt(sum(x * x for x in v1)), 1.0, rel_tol=1e-9)
+    assert usage["input_tokens"] == 6
+
+
+def test_hashing_provider_ranks_shared_vocabulary_closer():
+    provider = HashingEmbeddingProvider()
+    (query, near, far), _ = provider.embed(
+        ["refund an invoice payment", "invoice payment refund policy", "router firewall packet latency"]
+    )
+    assert _cosine(query, near) > _cosine(query, far)
+
+
+def test_index_and_query_with_hashing_provider(hash_store):
+    from app.db.token_usage import list_operation_usage
+    from app.knowledge.store import index_file, query_knowledge, save_upload
+
+    billing = save_upload("billing.md", b"Invoices are paid monthly. Refund requests need the invoice number.")
+    network = save_upload("network.txt", b"Router firewall rules control packet latency and socket timeouts.")
+    assert index_file(billing, source_name="billing.md")["chunks"] == 1
+    assert index_file(network, source_name="network.txt")["chunks"] == 1
+
+    hits = query_knowledge("how do I get an invoice refund", top_k=2)
+    assert [h.source for h in hits][0] == "billing.md"
+    assert hits[0].chunk_index == 0
+
+    rows = list_operation_usage(operation="knowledge:query")
+    assert rows and rows[0].model_name == "hash-embedding-256"
+
+
+def test_knowledge_bench_pdf_writer_round_trips(tmp_path):
+    from benchmarks.knowledge_bench import write_pdf
+    from app.knowledge.store import read_text_from_file
+
+    path = tmp_path / "doc.pdf"
+    write_pdf(path, [["first page (one)"], ["second page"]])
+    text = read_text_from_file(path)
+    assert "first page (one)" in text
+    assert "second page" in text
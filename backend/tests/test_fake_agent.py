@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from app.agents.af_client import set_agent_override
+from app.agents.fake_agent import FakeAgent, FakeAgentConfig
+
+
+@pytest.fixture()
+def fake_agent(tmp_path, monkeypatch):
+    monkeypatch.setenv("TOKEN_USAGE_DB_PATH", str(tmp_path / "usage.sqlite3"))
+    # Startup warm-up (benchmark harness) opens the knowledge index.
+    monkeypatch.setenv("KNOWLEDGE_DATA_DIR", str(tmp_path / "knowledge"))
+    agent = FakeAgent(FakeAgentConfig(output_tokens=3))
+    set_agent_override(agent)
+    yield agent
+    set_agent_override(None)
+
+
+def test_run_with_fake_agent_keeps_history(client, fake_agent):
+    r1 = client.post("/api/agent/run", json={"message": "hello"})
+    assert r1.status_code == 200
+    body1 = r1.json()
+    assert body1["output"] == "tok0 tok1 tok2"
+    assert body1["stats"]["turns"] == 1
+
+    r2 = client.post("/api/agent/run", json={"message": "again", "conversation_id": body1["conversation_id"]})
+    assert r2.status_code == 200
+    body2 = r2.json()
+    assert body2["stats"]["turns"] == 2
+    # The second turn sees the first exchange as prompt history.
+    assert body2["stats"]["last"]["input_tokens"] > body1["stats"]["last"]["input_tokens"]
+
+
+def test_stream_with_fake_agent(client, fake_agent):
+    res = client.post("/api/agent/stream", json={"message": "hello"})
+    assert res.status_code == 200
+    text = res.text
+    assert "event: delta" in text
+    assert "event: timing" in text
+    assert text.rstrip().split("\n\n")[-1].startswith("event: done")
+
+
+def test_agent_bench_harness_smoke(fake_agent):
+    from benchmarks._common import Lifespan
+    from benchmarks.agent_bench import run_load
+    from app.main import create_app
+
+    async def go():
+        app = create_app()
+        async with Lifespan(app):
+            return await run_load(app, endpoint="stream", requests=6, concurrency=2, turns=3)
+
+    result = asyncio.run(go())
+    assert result["requests"] == 6
+    assert result["errors"] == 0
+    assert result["latency"]["p99_ms"] >= result["latency"]["p50_ms"]
+
+
+def test_bounded_context_policy_plateaus_input_tokens(client, fake_agent):
+    from app.agents.context_policy import ContextPolicy
+
+    fake_agent.context_policy = ContextPolicy(mode="last_n", max_turns=2)
+    conversation_id = None
+    inputs = []
+    for i in range(8):
+        payload = {"message": f"turn {i}"}
+        if conversation_id:
+            payload["conversation_id"] = conversation_id
+        body = client.post("/api/agent/run", json=payload).json()
+        conversation_id = body["conversation_id"]
+        inputs.append(body["stats"]["last"]["input_tokens"])
+    assert inputs[-1] == inputs[-2] == inputs[-3]
+    assert inputs[-1] < inputs[0] + 3 * 8
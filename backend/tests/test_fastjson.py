@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from app.core import fastjson
+from app.core.fastjson import BACKENDS, FastJSONResponse
+
+PAYLOAD = {
+    "text": "你好, \"quoted\" \\ \n line",
+    "numbers": [0, -1, 2**40, 1.5],
+    "nested": {"ok": True, "none": None},
+}
+
+
+@pytest.mark.parametrize("name", sorted(BACKENDS))
+def test_backends_agree_with_stdlib(name) -> None:
+    dumps, dumpb = BACKENDS[name]
+    assert json.loads(dumps(PAYLOAD)) == PAYLOAD
+    assert json.loads(dumpb(PAYLOAD)) == PAYLOAD
+    # Non-ASCII is emitted as UTF-8, not \\u escapes.
+    assert "你好" in dumps(PAYLOAD)
+    assert dumps({1: "a"}) == '{"1":"a"}'
+
+
+def test_default_prefers_fastest_available() -> None:
+    assert fastjson._select(None) == ("orjson" if "orjson" in BACKENDS else "pydantic")
+    assert fastjson._select("json") == "json"
+    assert fastjson._select("nope") == fastjson._select(None)
+
+
+def test_fast_json_response() -> None:
+    response = FastJSONResponse({"items": [{"name": "手册.pdf", "chunk_lengths": [1, 2]}]})
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == {"items": [{"name": "手册.pdf", "chunk_lengths": [1, 2]}]}
+
+
+def test_listing_routes_use_fast_encoder(client) -> None:
+    r = client.get("/api/knowledge/uploads")
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/json"
+    assert "items" in r.json()
+
+
+def test_json_bench_smoke() -> None:
+    from benchmarks.json_bench import build_parser, run
+
+    args = build_parser().parse_args(
+        ["--frames", "50", "--files", "5", "--chunks", "10", "--usage-rows", "10", "--repeat", "2", "--requests", "2"]
+    )
+    results = run(args)
+    assert {row["label"] for row in results["backends"]} == set(BACKENDS)
+    assert len({row["uploads_bytes"] for row in results["backends"]}) == 1
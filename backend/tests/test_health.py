@@ -1,4 +1,47 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core.warmup import Warmup
+from app.main import create_app
+
+
 def test_health_ok(client):
     r = client.get("/api/health")
     assert r.status_code == 200
     assert r.json() == {"status": "ok"}
+
+
+def test_readiness_waits_for_warmup():
+    release = threading.Event()
+
+    def slow_step() -> None:
+        release.wait(5)
+
+    def broken_step() -> None:
+        raise RuntimeError("not configured")
+
+    warmup = Warmup({"slow": slow_step, "broken": broken_step})
+    with TestClient(create_app(warmup=warmup)) as client:
+        r = client.get("/api/health", params={"ready": 1})
+        assert r.status_code == 503
+        assert r.json()["status"] == "warming_up"
+        # Liveness is unaffected.
+        assert client.get("/api/health").json() == {"status": "ok"}
+
+        release.set()
+        for _ in range(100):
+            r = client.get("/api/health", params={"ready": 1})
+            if r.status_code == 200:
+                break
+            time.sleep(0.02)
+        assert r.status_code == 200
+        steps = r.json()["warmup"]["steps"]
+        assert steps["slow"]["status"] == "ok"
+        assert steps["broken"]["status"] == "failed"
+        assert "not configured" in steps["broken"]["error"]
+
+
+def test_readiness_without_lifespan_is_not_ready(client):
+    assert client.get("/api/health", params={"ready": 1}).status_code == 503
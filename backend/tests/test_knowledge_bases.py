@@ -0,0 +1,112 @@
+import pytest
+
+
+def _upload(client, name: str, text: str, kb: str | None = None):
+    params = {"kb": kb} if kb else {}
+    r = client.post("/api/knowledge/upload", params=params, files={"file": (name, text.encode(), "text/markdown")})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _query(client, question: str, bases=None, top_k: int = 4):
+    body = {"question": question, "top_k": top_k, "use_llm": False}
+    if bases is not None:
+        body["knowledge_bases"] = bases
+    return client.post("/api/knowledge/query", json=body)
+
+
+def test_knowledge_base_names() -> None:
+    from app.knowledge.store import knowledge_base_name
+
+    assert knowledge_base_name(None) == "default"
+    assert knowledge_base_name(" HR-Docs ") == "hr-docs"
+    for bad in ("../x", "a b", "-x", "x" * 49):
+        with pytest.raises(ValueError):
+            knowledge_base_name(bad)
+
+
+def test_bases_are_isolated_and_fan_out_merges_by_distance(client, hash_store, tmp_path) -> None:
+    _upload(client, "billing.md", "Invoices are paid monthly. Refund requests need the invoice number.")
+    hr = _upload(client, "leave.md", "Annual leave requests need manager approval.", kb="hr")
+    assert hr["knowledge_base"] == "hr" and hr["stats"] == {"chunks": 1}
+    assert (tmp_path / "data" / "uploads" / "hr").is_dir()
+
+    only_hr = _query(client, "invoice refund", ["hr"]).json()
+    assert [s["source"] for s in only_hr["sources"]] == ["hr/leave.md"]
+    only_default = _query(client, "invoice refund").json()
+    assert [s["source"] for s in only_default["sources"]] == ["billing.md"]
+
+    both = _query(client, "invoice refund", ["hr", "default"]).json()
+    assert [s["source"] for s in both["sources"]] == ["billing.md", "hr/leave.md"]
+    assert _query(client, "annual leave approval", ["default", "hr"], top_k=1).json()["sources"][0]["source"] == "hr/leave.md"
+
+    bases = {b["name"]: b["chunks"] for b in client.get("/api/knowledge/bases").json()["items"]}
+    assert bases == {"default": 1, "hr": 1}
+    assert [u["original_name"] for u in client.get("/api/knowledge/uploads", params={"kb": "hr"}).json()["items"]] == ["leave.md"]
+    assert client.get("/api/knowledge/stats", params={"kb": "hr"}).json() == {"chunks": 1}
+
+
+def test_unknown_and_invalid_bases(client, hash_store) -> None:
+    assert _query(client, "anything", ["nope"]).status_code == 404
+    assert _query(client, "anything", ["../etc"]).status_code == 400
+    assert client.get("/api/knowledge/stats", params={"kb": "nope"}).status_code == 404
+    assert client.get("/api/knowledge/uploads", params={"kb": "nope"}).json() == {"items": []}
+    # Listing or querying does not create bases.
+    assert [b["name"] for b in client.get("/api/knowledge/bases").json()["items"]] == ["default"]
+
+
+def test_missing_base_is_key_error_on_older_chromadb(hash_store, monkeypatch) -> None:
+    from types import SimpleNamespace
+
+    from app.knowledge import store
+
+    class OldClient:
+        # chromadb < 0.6: collection objects from list_collections, ValueError for a missing one.
+        def list_collections(self):
+            return [SimpleNamespace(name="knowledge__hr")]
+
+        def get_collection(self, name):
+            if name != "knowledge__hr":
+                raise ValueError(f"Collection {name} does not exist.")
+            return SimpleNamespace(name=name)
+
+    monkeypatch.setattr(store, "_chroma_client", lambda path: OldClient())
+    assert store._get_chroma_collection("hr", create=False).name == "knowledge__hr"
+    with pytest.raises(KeyError):
+        store._get_chroma_collection("nope", create=False)
+
+
+def test_delete_and_sync_per_base(client, hash_store) -> None:
+    from app.knowledge.sync import sync_uploads
+
+    stored = _upload(client, "leave.md", "Annual leave requests need manager approval.", kb="hr")["stored_path"]
+    name = stored.replace("\\", "/").rsplit("/", 1)[-1]
+    assert client.delete(f"/api/knowledge/uploads/{name}").status_code == 404
+
+    report = sync_uploads(kb="hr")
+    assert report.knowledge_base == "hr" and report.unchanged == [name]
+
+    r = client.delete(f"/api/knowledge/uploads/{name}", params={"kb": "hr"})
+    assert r.status_code == 200 and r.json()["stats"] == {"chunks": 0}
+
+
+def test_fanout_pool_is_created_once_under_concurrency(monkeypatch) -> None:
+    import threading
+
+    from app.knowledge import store
+
+    monkeypatch.setattr(store, "_fanout", None)
+    barrier = threading.Barrier(8)
+    pools = []
+
+    def first_query() -> None:
+        barrier.wait()
+        pools.append(store._fanout_pool())
+
+    threads = [threading.Thread(target=first_query) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(pool) for pool in pools}) == 1
+    pools[0].shutdown(wait=False)
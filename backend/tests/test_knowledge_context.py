@@ -0,0 +1,60 @@
+from app.knowledge.context import pack_context
+from app.knowledge.store import RetrievedChunk, chunk_text
+
+
+def _doc(words: int, prefix: str = "word") -> str:
+    return " ".join(f"{prefix}{i}" for i in range(words))
+
+
+def test_pack_context_merges_adjacent_chunks_without_overlap():
+    text = _doc(600)
+    pieces = chunk_text(text)
+    assert len(pieces) >= 3
+
+    hits = [
+        RetrievedChunk(text=pieces[1], source="a.md", distance=0.1, chunk_index=1),
+        RetrievedChunk(text=pieces[0], source="a.md", distance=0.2, chunk_index=0),
+    ]
+    packed = pack_context(hits)
+
+    assert len(packed.passages) == 1
+    passage = packed.passages[0]
+    assert passage.chunk_indices == (0, 1)
+    assert passage.distance == 0.1
+    assert text.startswith(passage.text)
+    assert packed.overlap_chars_removed > 0
+
+
+def test_pack_context_drops_far_and_duplicate_hits():
+    hits = [
+        RetrievedChunk(text="alpha beta gamma delta epsilon", source="a.md", distance=0.1, chunk_index=0),
+        RetrievedChunk(text="alpha beta gamma delta epsilon", source="copy.md", distance=0.12, chunk_index=0),
+        RetrievedChunk(text="completely unrelated", source="b.md", distance=1.9, chunk_index=4),
+    ]
+    packed = pack_context(hits, max_distance=1.0)
+
+    assert [p.source for p in packed.passages] == ["a.md"]
+    reasons = {d["source"]: d["reason"] for d in packed.dropped}
+    assert reasons == {"copy.md": "duplicate", "b.md": "distance"}
+
+
+def test_pack_context_respects_token_budget():
+    hits = [
+        RetrievedChunk(text=_doc(200, prefix=f"d{i}w"), source=f"doc{i}.md", distance=0.1 * i, chunk_index=0)
+        for i in range(4)
+    ]
+    packed = pack_context(hits, max_tokens=500)
+
+    assert packed.tokens <= 500
+    assert packed.passages
+    assert any(d["reason"] == "budget" for d in packed.dropped)
+    assert packed.report()["passages"] == len(packed.passages)
+
+
+def test_pack_context_truncates_single_oversized_passage():
+    hits = [RetrievedChunk(text=_doc(400), source="big.md", distance=0.1, chunk_index=0)]
+    packed = pack_context(hits, max_tokens=50)
+
+    assert len(packed.passages) == 1
+    assert packed.passages[0].truncated
+    assert packed.tokens <= 50
@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+from app.knowledge.embeddings import HashingEmbeddingProvider
+
+
+class CountingProvider(HashingEmbeddingProvider):
+    def __init__(self) -> None:
+        super().__init__()
+        self.texts = 0
+
+    def embed(self, texts):
+        self.texts += len(texts)
+        return super().embed(texts)
+
+
+pytestmark = pytest.mark.parametrize("hash_store", [CountingProvider], indirect=True)
+
+
+@pytest.fixture()
+def store(hash_store):
+    from app.knowledge import store as knowledge_store
+
+    return knowledge_store, hash_store
+
+
+def _upload(store, name: str, text: str):
+    path = store.save_upload(name, text.encode())
+    info = store.index_file(path, source_name=name)
+    store.write_upload_metadata(
+        path,
+        original_name=name,
+        size_bytes=len(text),
+        chunks_indexed=info["chunks"],
+        chunk_lengths=info["chunk_lengths"],
+        content_hash=info["content_hash"],
+    )
+    return path
+
+
+def _sources(store) -> dict[str, int]:
+    out: dict[str, int] = {}
+    for meta in store._get_chroma_collection().get(include=["metadatas"])["metadatas"]:
+        out[meta["source"]] = out.get(meta["source"], 0) + 1
+    return out
+
+
+def test_reindex_replaces_chunks(store) -> None:
+    store, _ = store
+    path = _upload(store, "a.md", "word " * 600)
+    assert _sources(store) == {"a.md": 4}
+    path.write_text("short now")
+    assert store.index_file(path, source_name="a.md")["chunks"] == 1
+    assert _sources(store) == {"a.md": 1}
+
+
+def test_delete_upload_removes_file_metadata_and_vectors(store, client) -> None:
+    store, _ = store
+    keep = _upload(store, "keep.md", "Invoices are paid monthly.")
+    gone = _upload(store, "gone.md", "Router firewall rules.")
+
+    r = client.delete(f"/api/knowledge/uploads/{gone.name}")
+    assert r.status_code == 200
+    assert r.json()["chunks_deleted"] == 1
+    assert r.json()["stats"]["chunks"] == 1
+    assert not gone.exists() and not os.path.exists(str(gone) + ".meta.json")
+    assert keep.exists() and _sources(store) == {"keep.md": 1}
+
+    assert client.delete(f"/api/knowledge/uploads/{gone.name}").status_code == 404
+    assert client.delete(f"/api/knowledge/uploads/{keep.name}.meta.json").status_code == 404
+
+
+def test_sync_only_reembeds_changes(store) -> None:
+    from app.knowledge.sync import sync_uploads
+
+    store, provider = store
+    same = _upload(store, "same.md", "Invoices are paid monthly.")
+    touched = _upload(store, "touched.md", "Refund requests need the invoice number.")
+    edited = _upload(store, "edited.md", "Old text.")
+    removed = _upload(store, "removed.md", "Router firewall rules.")
+
+    os.utime(touched, ns=(touched.stat().st_atime_ns, touched.stat().st_mtime_ns + 10**9))
+    edited.write_text("New text about sockets.")
+    os.utime(edited, ns=(edited.stat().st_atime_ns, edited.stat().st_mtime_ns + 10**9))
+    removed.unlink()
+    new = store.save_upload("new.md", b"Packet latency.")
+
+    dry = sync_uploads(dry_run=True)
+    assert sorted(dry.indexed) == sorted([edited.name, new.name])
+    assert dry.removed == [removed.name]
+
+    provider.texts = 0
+    report = sync_uploads()
+    assert report.unchanged == [same.name]
+    assert report.touched == [touched.name]
+    assert sorted(report.indexed) == sorted([edited.name, new.name])
+    assert report.removed == [removed.name] and report.chunks_deleted == 1
+    assert provider.texts == 2
+    # A file copied in without a sidecar is listed under its file name.
+    assert _sources(store) == {"same.md": 1, "touched.md": 1, "edited.md": 1, new.name: 1}
+
+    provider.texts = 0
+    again = sync_uploads()
+    assert len(again.unchanged) == 4 and not again.indexed and not again.touched
+    assert provider.texts == 0
+
+
+def test_sync_migrates_chunks_without_source_id(store) -> None:
+    from app.knowledge.sync import sync_uploads
+
+    store, _ = store
+    legacy = store.save_upload("legacy.md", b"Invoices are paid monthly.")
+    store.write_upload_metadata(legacy, original_name="legacy.md", size_bytes=26, chunks_indexed=1)
+    collection = store._get_chroma_collection()
+    (vector,), _ = HashingEmbeddingProvider().embed(["x"])
+    # As indexed by older versions: random ids, only the display name, no sidecar hash.
+    collection.add(ids=["u1"], documents=["Invoices"], embeddings=[vector], metadatas=[{"source": "legacy.md", "chunk_index": 0}])
+    collection.add(ids=["u2"], documents=["Gone"], embeddings=[vector], metadatas=[{"source": "deleted.md", "chunk_index": 0}])
+
+    report = sync_uploads()
+    assert report.indexed == [legacy.name]
+    assert report.removed == ["deleted.md"]
+    metas = collection.get(include=["metadatas"])["metadatas"]
+    assert [(m["source"], m["source_id"]) for m in metas] == [("legacy.md", legacy.name)]
@@ -0,0 +1,40 @@
+from app.core.metrics import HTTP_REQUEST_SECONDS, MetricsRegistry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    hist = registry.histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1.0))
+    hist.observe(0.05, "/a")
+    hist.observe(0.5, "/a")
+    hist.observe(5.0, "/a")
+
+    text = registry.render()
+    assert "# TYPE demo_seconds histogram" in text
+    assert 'demo_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{route="/a"} 3' in text
+
+
+def test_counter_and_callback_gauge():
+    registry = MetricsRegistry()
+    counter = registry.counter("demo_total", "Demo.", ("kind",))
+    counter.inc("x")
+    counter.inc("x", amount=2)
+    registry.gauge("demo_size", "Demo.", callback=lambda: 7)
+
+    text = registry.render()
+    assert 'demo_total{kind="x"} 3' in text
+    assert "demo_size 7" in text
+
+
+def test_metrics_endpoint_reports_route_latency(client):
+    before = HTTP_REQUEST_SECONDS.count("GET", "/api/hello", "200")
+    assert client.get("/api/hello").status_code == 200
+    assert HTTP_REQUEST_SECONDS.count("GET", "/api/hello", "200") == before + 1
+
+    res = client.get("/api/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/hello",status="200"}' in res.text
+    assert "agent_conversation_store_size" in res.text
@@ -0,0 +1,98 @@
+import json
+
+from app.agents.model_router import MODEL_ROUTER, ModelRouter, RoutingRules
+
+
+def _router(**rules) -> ModelRouter:
+    return ModelRouter(RoutingRules(small_profile="mini", large_profile="big", **rules))
+
+
+def test_disabled_and_explicit_are_not_routed() -> None:
+    router = ModelRouter(RoutingRules())
+    decision = router.decide(prompt_tokens=10, turns=0)
+    assert (decision.route, decision.profile, decision.routed) == ("default", None, False)
+    assert decision.model_label("gpt-4o") == "gpt-4o"
+
+    decision = _router().decide(prompt_tokens=10, turns=0, requested_profile="coder")
+    assert (decision.route, decision.profile) == ("explicit", "coder")
+
+
+def test_routes_by_prompt_size_and_turns() -> None:
+    router = _router(small_max_tokens=100, small_max_turns=3)
+    small = router.decide(prompt_tokens=100, turns=2)
+    assert (small.route, small.profile, small.reason) == ("small", "mini", "short")
+    assert small.model_label("gpt-4o-mini") == "small:gpt-4o-mini"
+
+    assert router.decide(prompt_tokens=101, turns=0).reason == "prompt_tokens"
+    large = router.decide(prompt_tokens=5, turns=3)
+    assert (large.route, large.profile, large.reason) == ("large", "big", "turns")
+
+
+def test_conversation_stays_large() -> None:
+    router = ModelRouter(RoutingRules(small_profile="mini", small_max_tokens=100), sticky_size=2)
+    assert router.decide(prompt_tokens=500, turns=0, conversation_id="a").route == "large"
+    assert router.decide(prompt_tokens=5, turns=1, conversation_id="a").reason == "sticky"
+    assert router.decide(prompt_tokens=5, turns=1, conversation_id="b").route == "small"
+
+    # Bounded: the oldest sticky conversation is forgotten.
+    router.decide(prompt_tokens=500, turns=0, conversation_id="c")
+    router.decide(prompt_tokens=500, turns=0, conversation_id="d")
+    assert router.decide(prompt_tokens=5, turns=1, conversation_id="a").route == "small"
+
+
+def test_observe_and_report() -> None:
+    router = _router()
+    decision = router.decide(prompt_tokens=40, turns=0)
+    router.observe(decision, 0.2, {"input_tokens": 30, "output_tokens": 10})
+    router.observe(decision, 0.4, {"input_tokens": 50, "output_tokens": 30})
+    router.observe(decision, 1.0, None)
+
+    report = router.report()
+    assert report["enabled"] and report["rules"]["small_profile"] == "mini"
+    small = report["routes"]["small"]
+    assert (small["calls"], small["errors"]) == (3, 1)
+    assert small["avg_input_tokens"] == 40 and small["avg_output_tokens"] == 20
+    assert small["p50_ms"] == 400.0
+
+
+def test_rules_follow_settings_reload(settings_env) -> None:
+    settings_env(AGENT_ROUTE_SMALL_PROFILE="", AGENT_ROUTE_SMALL_MAX_TOKENS="")
+    assert not MODEL_ROUTER.rules.enabled
+
+    settings_env(AGENT_ROUTE_SMALL_PROFILE="mini", AGENT_ROUTE_SMALL_MAX_TOKENS="200")
+    rules = MODEL_ROUTER.rules
+    assert (rules.small_profile, rules.large_profile, rules.small_max_tokens) == ("mini", "default", 200)
+    assert MODEL_ROUTER.decide(prompt_tokens=150, turns=0).route == "small"
+
+    # Rules passed in are not replaced by a reload.
+    router = _router()
+    settings_env(AGENT_ROUTE_SMALL_PROFILE="other")
+    assert router.rules.small_profile == "mini"
+
+
+def test_run_route_is_routed(client, settings_env, monkeypatch, tmp_path) -> None:
+    from app.api.routes import agent as agent_routes
+
+    settings_env(
+        AGENT_BACKEND="fake",
+        TOKEN_USAGE_DB_PATH=str(tmp_path / "usage.sqlite3"),
+        AGENT_PROFILES=json.dumps({"mini": {"deployments": [{"deployment_name": "gpt-4o-mini"}]}}),
+    )
+    router = ModelRouter(RoutingRules(small_profile="mini", small_max_tokens=50))
+    monkeypatch.setattr(agent_routes, "MODEL_ROUTER", router)
+
+    r = client.post("/api/agent/run", json={"message": "hi"})
+    assert r.status_code == 200
+    conversation_id = r.json()["conversation_id"]
+    r = client.post("/api/agent/run", json={"message": "long " * 200, "conversation_id": conversation_id})
+    assert r.status_code == 200
+    r = client.post("/api/agent/run", json={"message": "hi", "conversation_id": conversation_id})
+    assert r.status_code == 200
+
+    routes = client.get("/api/agent/routing").json()["routes"]
+    assert routes["small"]["calls"] == 1
+    assert routes["large"]["calls"] == 2
+
+    profiles = {p["profile"]: p for p in client.get("/api/agent/profiles").json()["items"]}
+    assert profiles["mini"]["deployments"][0]["requests"] == 1
+    assert profiles["default"]["deployments"][0]["requests"] == 2
@@ -0,0 +1,169 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.core.metrics import UPSTREAM_HEDGES
+from app.core.resilience import CircuitBreaker, CircuitOpen, ResilientCaller
+from app.knowledge.store import AzureEmbeddingProvider
+
+
+class FakeEmbeddingServer:
+    """Azure OpenAI embeddings endpoint that plays a script of faults, one step per request.
+
+    Steps: ("ok",), ("delay", seconds), ("status", code). Once the script runs out every
+    request succeeds (or repeats `default`).
+    """
+
+    def __init__(self, script: list[tuple] | None = None, default: tuple = ("ok",)) -> None:
+        self.script = list(script or [])
+        self.default = default
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                length = int(self.headers.get("content-length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                    step = server.script.pop(0) if server.script else server.default
+                if step[0] == "delay":
+                    time.sleep(step[1])
+                elif step[0] == "status":
+                    self._send(step[1], {"error": {"message": "injected", "code": str(step[1])}})
+                    return
+                inputs = body.get("input") or []
+                self._send(
+                    200,
+                    {
+                        "object": "list",
+                        "data": [{"object": "embedding", "index": i, "embedding": [0.1, 0.2]} for i in range(len(inputs))],
+                        "model": "fake",
+                        "usage": {"prompt_tokens": 3, "total_tokens": 3},
+                    },
+                )
+
+            def _send(self, status: int, payload: dict) -> None:
+                data = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("content-type", "application/json")
+                    self.send_header("content-length", str(len(data)))
+                    if status == 429:
+                        self.send_header("retry-after", "0")
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up (timeout or lost hedge).
+                    pass
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture()
+def fake_server(settings_env):
+    servers: list[FakeEmbeddingServer] = []
+
+    def start(script=None, default=("ok",)) -> FakeEmbeddingServer:
+        server = FakeEmbeddingServer(script, default)
+        servers.append(server)
+        settings_env(
+            AZURE_OPENAI_ENDPOINT=server.url,
+            AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME="embed",
+            AZURE_OPENAI_API_KEY="test-key",
+            AZURE_OPENAI_API_VERSION="2024-06-01",
+        )
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def _provider(**kwargs) -> AzureEmbeddingProvider:
+    kwargs.setdefault("base_delay", 0.01)
+    return AzureEmbeddingProvider(ResilientCaller("test_embedding", **kwargs))
+
+
+def test_transient_errors_are_retried(fake_server) -> None:
+    server = fake_server([("status", 500), ("status", 429)])
+    vectors, usage = _provider(max_attempts=3).embed(["hello"])
+    assert vectors == [[0.1, 0.2]]
+    assert usage["total_tokens"] == 3
+    assert server.requests == 3
+
+
+def test_client_errors_are_not_retried(fake_server) -> None:
+    server = fake_server([("status", 400)])
+    with pytest.raises(Exception) as exc_info:
+        _provider(max_attempts=3).embed(["hello"])
+    assert getattr(exc_info.value, "status_code", None) == 400
+    assert server.requests == 1
+
+
+def test_slow_attempt_times_out_and_is_retried(fake_server) -> None:
+    server = fake_server([("delay", 2.0)])
+    start = time.monotonic()
+    vectors, _ = _provider(attempt_timeout=0.3, max_attempts=2).embed(["hello"])
+    assert vectors == [[0.1, 0.2]]
+    assert time.monotonic() - start < 1.5
+    assert server.requests == 2
+
+
+def test_deadline_bounds_the_whole_call(fake_server) -> None:
+    fake_server(default=("delay", 2.0))
+    start = time.monotonic()
+    # Either the last attempt's timeout or DeadlineExceeded, whichever comes first.
+    with pytest.raises(Exception):
+        _provider(deadline=0.5, attempt_timeout=0.3, max_attempts=5).embed(["hello"])
+    assert time.monotonic() - start < 1.2
+
+
+def test_hedged_request_wins_over_slow_primary(fake_server) -> None:
+    server = fake_server([("delay", 2.0)])
+    start = time.monotonic()
+    vectors, _ = _provider(hedge=True, hedge_delay=0.1, attempt_timeout=5.0).embed(["question"])
+    assert vectors == [[0.1, 0.2]]
+    assert time.monotonic() - start < 1.0
+    assert server.requests == 2
+    assert UPSTREAM_HEDGES.value("test_embedding", "hedge") >= 1
+
+
+def test_large_batches_are_not_hedged(fake_server) -> None:
+    server = fake_server([("delay", 0.3)])
+    _provider(hedge=True, hedge_delay=0.05).embed(["a", "b", "c"])
+    assert server.requests == 1
+
+
+def test_circuit_breaker_fails_fast_then_recovers(fake_server) -> None:
+    server = fake_server([("status", 503), ("status", 503)])
+    breaker = CircuitBreaker("test_breaker", failure_threshold=2, reset_after=0.2)
+    provider = _provider(max_attempts=1, breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(Exception):
+            provider.embed(["hello"])
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpen):
+        provider.embed(["hello"])
+    assert server.requests == 2
+
+    time.sleep(0.25)
+    vectors, _ = provider.embed(["hello"])
+    assert vectors == [[0.1, 0.2]]
+    assert breaker.state == "closed"
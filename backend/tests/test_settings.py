@@ -0,0 +1,52 @@
+import app.core.settings as settings_module
+from app.core.settings import env_float, env_int, get_settings, on_reload, reload_settings
+
+
+def test_snapshot_is_stable_until_reload(monkeypatch):
+    before = get_settings()
+    monkeypatch.setenv("AZURE_OPENAI_RESPONSES_DEPLOYMENT_NAME", "changed-deploy")
+    # Hot paths read the snapshot; the environment is not consulted again.
+    assert get_settings() is before
+
+    try:
+        new, changed = reload_settings(load_files=False)
+        assert new.responses_deployment_name == "changed-deploy"
+        assert "responses_deployment_name" in changed
+        assert get_settings() is new
+        # Anyone still holding the old snapshot keeps a consistent view.
+        assert before.responses_deployment_name != "changed-deploy"
+    finally:
+        monkeypatch.undo()
+        reload_settings(load_files=False)
+
+
+def test_reload_endpoint_requires_token_and_notifies(client, settings_env, monkeypatch):
+    assert client.post("/api/admin/reload").status_code == 403
+
+    settings_env(ADMIN_TOKEN="s3cret", AGENT_NAME="Before")
+    assert client.post("/api/admin/reload", headers={"X-Admin-Token": "wrong"}).status_code == 401
+
+    seen: list[tuple[str, str]] = []
+    monkeypatch.setattr(settings_module, "_callbacks", [])
+    # The endpoint re-reads the env files; keep a local config/azure_openai.env out of it.
+    monkeypatch.setattr(settings_module, "ENV_FILES", ())
+    on_reload(lambda old, new: seen.append((old.agent_name, new.agent_name)))
+
+    monkeypatch.setenv("AGENT_NAME", "After")
+    res = client.post("/api/admin/reload", headers={"X-Admin-Token": "s3cret"})
+    assert res.status_code == 200
+    assert res.json()["changed"] == ["agent_name"]
+    assert seen == [("Before", "After")]
+    assert get_settings().agent_name == "After"
+
+
+def test_env_number_helpers_fall_back_on_blank_or_invalid(monkeypatch):
+    monkeypatch.setenv("TEST_ENV_INT", " 12 ")
+    monkeypatch.setenv("TEST_ENV_FLOAT", "1.5")
+    assert env_int("TEST_ENV_INT", 3) == 12
+    assert env_float("TEST_ENV_FLOAT", None) == 1.5
+    monkeypatch.setenv("TEST_ENV_INT", "  ")
+    monkeypatch.setenv("TEST_ENV_FLOAT", "fast")
+    assert env_int("TEST_ENV_INT", 3) == 3
+    assert env_float("TEST_ENV_FLOAT", None) is None
+    assert env_int("TEST_ENV_UNSET", 7) == 7
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.metrics import SINGLEFLIGHT_CALLS
+from app.core.singleflight import SingleFlight
+
+
+def _count(name: str, result: str) -> float:
+    return SINGLEFLIGHT_CALLS.value(name, result)
+
+
+def test_concurrent_calls_share_one_computation() -> None:
+    flight = SingleFlight("test_share")
+    calls = 0
+    release = threading.Event()
+
+    def work(x: int) -> dict:
+        nonlocal calls
+        calls += 1
+        release.wait(5)
+        return {"x": x}
+
+    async def main() -> list:
+        tasks = [asyncio.create_task(flight.run("k", work, 1)) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        assert flight.inflight() == 1
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert all(r is results[0] for r in results)
+    assert _count("test_share", "leader") == 1
+    assert _count("test_share", "coalesced") == 4
+    assert flight.inflight() == 0
+
+
+def test_different_keys_and_later_calls_run_separately() -> None:
+    flight = SingleFlight("test_keys")
+    calls: list[int] = []
+
+    async def work(x: int) -> int:
+        calls.append(x)
+        await asyncio.sleep(0.01)
+        return x
+
+    async def main() -> list:
+        first = await asyncio.gather(flight.run(1, work, 1), flight.run(2, work, 2))
+        again = await flight.run(1, work, 1)
+        return [*first, again]
+
+    assert asyncio.run(main()) == [1, 2, 1]
+    assert calls == [1, 2, 1]
+
+
+def test_exception_is_shared() -> None:
+    flight = SingleFlight("test_error")
+    calls = 0
+
+    async def work() -> None:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main() -> list:
+        return await asyncio.gather(flight.run("k", work), flight.run("k", work), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_cancelled_leader_does_not_cancel_followers() -> None:
+    flight = SingleFlight("test_cancel")
+
+    async def work() -> str:
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main() -> str:
+        leader = asyncio.create_task(flight.run("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.run("k", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == "done"
@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.startup_bench import parse_importtime, top_imports
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+_PROBE = """
+import sys
+import app.main
+paths = app.main.app.openapi()["paths"]
+print("chromadb" in sys.modules, "/api/knowledge/query" in paths, "/api/agent/run" in paths)
+"""
+
+
+def _probe(**env: str) -> list[str]:
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=BACKEND_DIR,
+        env={**os.environ, **env},
+        capture_output=True,
+        text=True,
+        timeout=120,
+        check=True,
+    )
+    return out.stdout.split()
+
+
+def test_app_import_does_not_load_chromadb() -> None:
+    assert _probe(KNOWLEDGE_ENABLED="1") == ["False", "True", "True"]
+
+
+def test_chat_only_worker_skips_knowledge_routes() -> None:
+    assert _probe(KNOWLEDGE_ENABLED="0") == ["False", "False", "True"]
+
+
+def test_chat_only_warmup_skips_knowledge_steps(settings_env) -> None:
+    from app.core.warmup import Warmup
+
+    settings_env(KNOWLEDGE_ENABLED="0")
+    assert set(Warmup().steps) == {"tokenizer", "agent"}
+    settings_env(KNOWLEDGE_ENABLED="1")
+    assert {"knowledge_index", "embeddings"} <= set(Warmup().steps)
+
+
+def test_parse_importtime() -> None:
+    stderr = "\n".join(
+        [
+            "import time: self [us] | cumulative | imported package",
+            "import time:       120 |        120 |   _io",
+            "import time:      2000 |       5000 | site",
+            "import time:       300 |        300 |     app.core.settings",
+            "import time:       400 |       9000 |   app.api.router",
+            "import time:      1000 |      12000 | app.main",
+            "unrelated warning",
+        ]
+    )
+    rows = parse_importtime(stderr)
+    assert [r["module"] for r in rows] == ["_io", "site", "app.core.settings", "app.api.router", "app.main"]
+    assert [r["depth"] for r in rows] == [1, 0, 2, 1, 0]
+    assert [r["label"] for r in top_imports(rows, 2)] == ["app.api.router", "site"]
+
+
+_ENV_FILE_PROBE = """
+import sys
+from pathlib import Path
+import app.core.settings as settings
+settings.ENV_FILES = (Path(sys.argv[1]),)
+import app.main
+from app.api.routes.agent import _conversations
+from app.core.admission import AGENT_ADMISSION
+from app.core.fastjson import BACKEND
+print(AGENT_ADMISSION.max_concurrent, BACKEND, _conversations.context_policy.mode)
+"""
+
+
+def test_env_files_apply_before_route_modules_import(tmp_path) -> None:
+    env_file = tmp_path / "azure_openai.env"
+    env_file.write_text("AGENT_MAX_CONCURRENCY=3\nJSON_BACKEND=json\nAGENT_CONTEXT_POLICY=last_n\n")
+    env = {k: v for k, v in os.environ.items() if k not in {"AGENT_MAX_CONCURRENCY", "JSON_BACKEND", "AGENT_CONTEXT_POLICY"}}
+    out = subprocess.run(
+        [sys.executable, "-c", _ENV_FILE_PROBE, str(env_file)],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+        check=True,
+    )
+    assert out.stdout.split() == ["3", "json", "last_n"]
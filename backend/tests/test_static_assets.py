@@ -0,0 +1,160 @@
+import gzip
+import os
+import re
+import time
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core.static_assets import IMMUTABLE, StaticAssets, choose_encoding
+
+JS = "console.log('hello');\n" * 50
+
+
+@pytest.fixture()
+def site(tmp_path):
+    (tmp_path / "app.js").write_text(JS, encoding="utf-8")
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG" + bytes(500))
+    (tmp_path / "index.html").write_text(
+        '<html><script src="/static/app.js?v=6"></script><img src="/static/logo.png"></html>',
+        encoding="utf-8",
+    )
+    assets = StaticAssets(tmp_path, reload_interval=0.005)
+    return tmp_path, assets, _client(assets)
+
+
+def _client(assets: StaticAssets) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/static/{path:path}")
+    def static(path: str, request: Request):
+        return assets.response(request, path)
+
+    @app.get("/")
+    def index(request: Request):
+        return assets.response(request, "index.html")
+
+    return TestClient(app)
+
+
+def test_index_references_hashed_urls(site) -> None:
+    _, assets, client = site
+    r = client.get("/", headers={"accept-encoding": "identity"})
+    assert r.status_code == 200
+    assert r.headers["cache-control"] == "no-cache"
+    urls = re.findall(r'src="([^"]+)"', r.text)
+    assert urls == [assets.url("app.js"), assets.url("logo.png")]
+    assert re.fullmatch(r"/static/app\.[0-9a-f]{12}\.js", urls[0])
+
+
+def test_hashed_asset_is_immutable_and_compressed(site) -> None:
+    _, assets, client = site
+    r = client.get(assets.url("app.js"), headers={"accept-encoding": "gzip, deflate"})
+    assert r.status_code == 200
+    assert r.headers["cache-control"] == IMMUTABLE
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["vary"] == "Accept-Encoding"
+    assert int(r.headers["content-length"]) < len(JS)
+    assert r.text == JS  # the client decodes gzip
+
+    raw = client.get(assets.url("app.js"), headers={"accept-encoding": "identity"})
+    assert "content-encoding" not in raw.headers
+    assert raw.headers["etag"] != r.headers["etag"]
+
+    # Binary files are not compressed.
+    png = client.get(assets.url("logo.png"), headers={"accept-encoding": "gzip"})
+    assert "content-encoding" not in png.headers
+
+
+def test_etag_revalidation(site) -> None:
+    _, _, client = site
+    first = client.get("/")
+    r = client.get("/", headers={"if-none-match": first.headers["etag"]})
+    assert r.status_code == 304
+    assert r.content == b""
+    # Unhashed URLs revalidate too.
+    plain = client.get("/static/app.js")
+    assert plain.headers["cache-control"] == "no-cache"
+    assert client.get("/static/app.js", headers={"if-none-match": plain.headers["etag"]}).status_code == 304
+
+
+def test_unknown_asset_is_404(site) -> None:
+    _, _, client = site
+    assert client.get("/static/missing.js").status_code == 404
+    assert client.get("/static/../app/main.py").status_code == 404
+
+
+def test_edited_file_gets_new_hash(site) -> None:
+    root, assets, client = site
+    old_url = assets.url("app.js")
+    path = root / "app.js"
+    path.write_text(JS + "// v2\n", encoding="utf-8")
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 1_000_000))
+    time.sleep(0.01)
+
+    html = client.get("/").text
+    assert assets.url("app.js") != old_url
+    assert assets.url("app.js") in html
+    assert client.get(old_url).status_code == 404
+
+
+def test_cache_is_bounded(tmp_path) -> None:
+    for i in range(5):
+        (tmp_path / f"f{i}.js").write_text(f"var x{i} = 1;\n" * 200, encoding="utf-8")
+    assets = StaticAssets(tmp_path, cache_bytes=4000, reload_interval=0)
+    assert assets.stats()["cached_bytes"] <= 4000
+    # Evicted entries are rebuilt from disk on demand.
+    asset, _ = assets.resolve("f0.js")
+    assert gzip.decompress(assets.body(asset, "gzip")) == (tmp_path / "f0.js").read_bytes()
+
+
+def test_new_file_is_picked_up(site) -> None:
+    root, assets, client = site
+    (root / "extra.css").write_text("body { color: red; }\n", encoding="utf-8")
+    time.sleep(0.01)
+
+    r = client.get("/static/extra.css")
+    assert r.status_code == 200
+    assert r.text == "body { color: red; }\n"
+    assert assets.url("extra.css") != "/static/extra.css"
+
+
+def test_cache_miss_rehashes_instead_of_serving_new_bytes_under_old_url(tmp_path) -> None:
+    for i in range(5):
+        (tmp_path / f"f{i}.js").write_text(f"var x{i} = 1;\n" * 200, encoding="utf-8")
+    # Reloading off: only the cache miss can notice the edit.
+    assets = StaticAssets(tmp_path, cache_bytes=4000, reload_interval=0)
+    client = _client(assets)
+    old_url = assets.url("f0.js")
+    (tmp_path / "f0.js").write_text("var edited = 1;\n" * 200, encoding="utf-8")
+
+    assert client.get(old_url, headers={"accept-encoding": "identity"}).status_code == 404
+    new_url = assets.url("f0.js")
+    assert new_url != old_url
+    r = client.get(new_url, headers={"accept-encoding": "identity"})
+    assert r.headers["cache-control"] == IMMUTABLE
+    assert r.text == "var edited = 1;\n" * 200
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        ("gzip, deflate, br", "br"),
+        ("gzip;q=1.0, br;q=0.5", "gzip"),
+        ("br;q=0, gzip", "gzip"),
+        ("*", "br"),
+        ("identity", "identity"),
+        ("", "identity"),
+    ],
+)
+def test_choose_encoding(header, expected) -> None:
+    assert choose_encoding(header, ["br", "gzip"]) == expected
+
+
+def test_app_serves_frontend(client) -> None:
+    r = client.get("/")
+    assert r.status_code == 200
+    js = re.search(r'src="(/static/app\.[0-9a-f]+\.js)"', r.text)
+    assert js is not None
+    assert client.get(js.group(1)).headers["cache-control"] == IMMUTABLE
@@ -0,0 +1,64 @@
+import json
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.timing import TimingMiddleware, phase
+
+
+def _app(slow_threshold_ms: float) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(TimingMiddleware, slow_threshold_ms=slow_threshold_ms)
+
+    @app.get("/async")
+    async def async_endpoint() -> dict:
+        with phase("load"):
+            pass
+        with phase("load"):
+            pass
+        return {"ok": True}
+
+    @app.get("/sync")
+    def sync_endpoint() -> dict:
+        # Sync endpoints run in a worker thread; the timing context must follow them there.
+        with phase("compute"):
+            pass
+        return {"ok": True}
+
+    return app
+
+
+def test_server_timing_header_lists_phases():
+    client = TestClient(_app(slow_threshold_ms=10_000))
+
+    header = client.get("/async").headers["server-timing"]
+    names = [part.split(";")[0].strip() for part in header.split(",")]
+    assert names == ["load", "total"]
+
+    assert "compute;dur=" in client.get("/sync").headers["server-timing"]
+
+
+def test_phase_is_noop_outside_requests():
+    with phase("anything"):
+        value = 1
+    assert value == 1
+
+
+def test_slow_requests_are_logged(caplog):
+    client = TestClient(_app(slow_threshold_ms=0))
+
+    with caplog.at_level(logging.WARNING, logger="app.slow_requests"):
+        assert client.get("/sync").status_code == 200
+
+    records = [json.loads(r.getMessage()) for r in caplog.records if r.name == "app.slow_requests"]
+    assert records
+    assert records[-1]["event"] == "slow_request"
+    assert records[-1]["path"] == "/sync"
+    assert "compute" in records[-1]["phases"]
+
+
+def test_app_sends_server_timing(client):
+    res = client.get("/api/health")
+    assert res.status_code == 200
+    assert "total;dur=" in res.headers["server-timing"]
@@ -1,4 +1,13 @@
-from app.db.token_usage import list_turn_usage, record_turn_usage, summarize_usage
+from concurrent.futures import ThreadPoolExecutor
+
+from app.db.token_usage import (
+    list_operation_usage,
+    list_turn_usage,
+    record_next_turn_usage,
+    record_operation_usage,
+    record_turn_usage,
+    summarize_usage,
+)
 
 
 def test_record_and_list_turn_usage(tmp_path):
@@ -24,3 +33,43 @@ def test_record_and_list_turn_usage(tmp_path):
 
     summary = summarize_usage("conv-1", db_path=db_path)
     assert summary == {"turns": 2, "input_tokens": 5, "output_tokens": 9, "total_tokens": 14}
+
+
+def test_record_next_turn_usage_assigns_sequential_indexes(tmp_path):
+    db_path = str(tmp_path / "usage.sqlite3")
+
+    usage = {"input_tokens": 1, "output_tokens": 0, "total_tokens": 1}
+    assert record_next_turn_usage("knowledge:upload:a.md", usage, db_path=db_path) == 1
+    assert record_next_turn_usage("knowledge:upload:a.md", usage, db_path=db_path) == 2
+    assert record_next_turn_usage("knowledge:upload:b.md", usage, db_path=db_path) == 1
+
+
+def test_record_next_turn_usage_is_race_free(tmp_path):
+    db_path = str(tmp_path / "usage.sqlite3")
+    usage = {"input_tokens": 1, "output_tokens": 0, "total_tokens": 1}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        indexes = list(pool.map(lambda _: record_next_turn_usage("conv-x", usage, db_path=db_path), range(40)))
+
+    assert sorted(indexes) == list(range(1, 41))
+    assert [r.turn_index for r in list_turn_usage("conv-x", db_path=db_path)] == list(range(1, 41))
+
+
+def test_record_operation_usage_rolls_up_per_hour(tmp_path):
+    db_path = str(tmp_path / "usage.sqlite3")
+
+    for _ in range(3):
+        record_operation_usage(
+            "knowledge:query",
+            {"input_tokens": 5, "output_tokens": 0, "total_tokens": 5},
+            "embed-deploy",
+            db_path=db_path,
+        )
+
+    rows = list_operation_usage("knowledge:query", db_path=db_path)
+    assert len(rows) == 1
+    assert rows[0].calls == 3
+    assert rows[0].total_tokens == 15
+    assert rows[0].model_name == "embed-deploy"
+    # The hot key no longer produces raw per-call rows.
+    assert list_turn_usage("knowledge:query", db_path=db_path) == []
@@ -0,0 +1,49 @@
+import csv
+import io
+import json
+
+from app.db.token_usage import iter_turn_usage_export, record_turn_usage
+
+
+def _seed(db_path: str, count: int = 25) -> None:
+    for i in range(count):
+        conv = "knowledge:upload:a.md" if i % 5 == 0 else f"conv-{i % 3}"
+        record_turn_usage(conv, i + 1, {"input_tokens": i, "output_tokens": 1, "total_tokens": i + 1}, db_path=db_path)
+
+
+def test_iter_export_batches_and_resumes(tmp_path):
+    db_path = str(tmp_path / "usage.sqlite3")
+    _seed(db_path)
+
+    batches = list(iter_turn_usage_export(batch_size=10, db_path=db_path))
+    assert [len(b) for b in batches] == [10, 10, 5]
+    ids = [row[0] for b in batches for row in b]
+    assert ids == sorted(ids)
+
+    resumed = [row[0] for b in iter_turn_usage_export(after_id=ids[9], db_path=db_path) for row in b]
+    assert resumed == ids[10:]
+
+    knowledge = [row for b in iter_turn_usage_export(conversation_prefix="knowledge:", db_path=db_path) for row in b]
+    assert len(knowledge) == 5
+    assert all(row[1].startswith("knowledge:") for row in knowledge)
+
+
+def test_usage_export_endpoint_formats(client, tmp_path, monkeypatch):
+    db_path = str(tmp_path / "usage.sqlite3")
+    monkeypatch.setenv("TOKEN_USAGE_DB_PATH", db_path)
+    _seed(db_path)
+
+    res = client.get("/api/usage/export", params={"conversation_prefix": "conv-", "limit": 7})
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in res.text.splitlines()]
+    assert len(lines) == 7
+    assert all(item["conversation_id"].startswith("conv-") for item in lines)
+
+    res = client.get("/api/usage/export", params={"format": "csv", "after_id": lines[-1]["id"]})
+    assert res.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(res.text)))
+    assert rows
+    assert int(rows[0]["id"]) > lines[-1]["id"]
+
+    assert client.get("/api/usage/export", params={"format": "xml"}).status_code == 400
@@ -0,0 +1,62 @@
+from app.db.token_usage import (
+    rebuild_usage_rollups,
+    record_next_turn_usage,
+    record_operation_usage,
+    record_turn_usage,
+    summarize_usage_buckets,
+)
+
+
+def _seed(db_path: str) -> None:
+    record_turn_usage("conv-1", 1, {"input_tokens": 3, "output_tokens": 5, "total_tokens": 8}, "gpt", db_path=db_path)
+    record_turn_usage("conv-2", 1, {"input_tokens": 1, "output_tokens": 1, "total_tokens": 2}, "gpt", db_path=db_path)
+    record_next_turn_usage(
+        "knowledge:upload:a.md", {"input_tokens": 10, "output_tokens": 0, "total_tokens": 10}, "embed", db_path=db_path
+    )
+    record_operation_usage(
+        "knowledge:query", {"input_tokens": 4, "output_tokens": 0, "total_tokens": 4}, "embed", db_path=db_path
+    )
+
+
+def test_rollups_are_maintained_incrementally(tmp_path):
+    db_path = str(tmp_path / "usage.sqlite3")
+    _seed(db_path)
+
+    by_class = summarize_usage_buckets(granularity="day", group_by=("conversation_class",), db_path=db_path)
+    totals = {r["conversation_class"]: (r["turns"], r["total_tokens"]) for r in by_class}
+    assert totals == {"chat": (2, 10), "knowledge": (2, 14)}
+
+    by_model = summarize_usage_buckets(granularity="minute", group_by=("model_name",), db_path=db_path)
+    assert sum(r["total_tokens"] for r in by_model if r["model_name"] == "gpt") == 10
+
+
+def test_rebuild_matches_incremental_rollups(tmp_path):
+    db_path = str(tmp_path / "usage.sqlite3")
+    _seed(db_path)
+
+    granularities = ("minute", "hour", "day")
+    group_by = ("model_name", "conversation_class")
+    before = {g: summarize_usage_buckets(granularity=g, group_by=group_by, db_path=db_path) for g in granularities}
+    assert rebuild_usage_rollups(db_path=db_path) > 0
+    after = {g: summarize_usage_buckets(granularity=g, group_by=group_by, db_path=db_path) for g in granularities}
+    assert after == before
+    assert any(r["model_name"] == "embed" and r["conversation_class"] == "knowledge" for r in after["minute"])
+
+
+def test_usage_summary_endpoint(client, tmp_path, monkeypatch):
+    db_path = str(tmp_path / "usage.sqlite3")
+    monkeypatch.setenv("TOKEN_USAGE_DB_PATH", db_path)
+    _seed(db_path)
+
+    res = client.get("/api/usage/summary", params={"granularity": "day", "group_by": "conversation_class"})
+    assert res.status_code == 200
+    data = res.json()
+    assert data["group_by"] == ["conversation_class"]
+    assert {item["conversation_class"] for item in data["items"]} == {"chat", "knowledge"}
+
+    res = client.get("/api/usage/summary", params={"from": "2999-01-01T00:00:00Z"})
+    assert res.status_code == 200
+    assert res.json()["items"] == []
+
+    assert client.get("/api/usage/summary", params={"granularity": "week"}).status_code == 400
+    assert client.get("/api/usage/summary", params={"group_by": "conversation_id"}).status_code == 400